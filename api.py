@@ -1,23 +1,135 @@
 import requests
-import json
+import time
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-# Charger la configuration
-with open("config/config.json", "r") as config_file:
-    CONFIG = json.load(config_file)
+from gcode_pipeline import default_pipeline
+from metrics import LOGGER, METRICS, timed
+from printer_state import PrinterStateCache, PushListener
+from settings import CONFIG
 
 # GLOBAL VARIABLES
 URL = CONFIG["url"]
 API_KEY = CONFIG["api_key"]
+HTTP_CONFIG = CONFIG.get("http", {})
+STREAM_CONFIG = CONFIG.get("streaming", {})
+STATE_CONFIG = CONFIG.get("state", {})
+PREPROCESS_CONFIG = CONFIG.get("preprocess", {})
 
-def connect_printer():
+
+class OctoPrintClient:
+    """
+    Client HTTP OctoPrint partagé : une seule session requests avec connexions
+    persistantes (keep-alive), en-têtes par défaut, timeouts et relances.
+    """
+
+    def __init__(self, url, api_key, timeout=10, retries=3, backoff=0.3, pool_size=4, state_ttl=1.0):
+        """
+        :param url: URL de base d'OctoPrint (ex. http://192.168.1.10).
+        :param api_key: Clé API OctoPrint.
+        :param timeout: Timeout (s) appliqué à chaque requête.
+        :param retries: Nombre de relances sur erreur de connexion ou 502/503/504.
+        :param backoff: Facteur de temporisation exponentielle entre relances (s).
+        :param pool_size: Nombre de connexions gardées ouvertes dans le pool.
+        :param state_ttl: Durée de validité (s) de l'état imprimante en cache.
+        """
+        self.url = url.rstrip("/")
+        self.api_key = api_key
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        self.session.headers.update({"X-Api-Key": api_key})
+
+        # Les relances sur lecture/statut ne concernent que les GET : un POST de
+        # G-code déjà reçu par OctoPrint ne doit pas être rejoué.
+        retry = Retry(
+            total=retries, backoff_factor=backoff,
+            status_forcelist=(502, 503, 504), allowed_methods=frozenset({"GET", "HEAD"}),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.state = PrinterStateCache(lambda: fetch_printer_state(self), ttl=state_ttl)
+        # File de commandes asynchrone, créée à la demande (command_queue.get_queue)
+        self.queue = None
+
+    def request(self, method, path, **kwargs):
+        """
+        Envoie une requête via la session partagée.
+        :param method: Méthode HTTP (str).
+        :param path: Chemin relatif à l'URL d'OctoPrint ou URL absolue.
+        :return: Objet requests.Response.
+        """
+        url = path if path.startswith(("http://", "https://")) else self.url + path
+        kwargs.setdefault("timeout", self.timeout)
+        if not METRICS.enabled:
+            return self.session.request(method, url, **kwargs)
+
+        endpoint = _endpoint(path)
+        try:
+            with METRICS.span("octoprint_http_request", method=method, endpoint=endpoint):
+                response = self.session.request(method, url, **kwargs)
+        except requests.RequestException:
+            METRICS.count("octoprint_http_failures_total", method=method, endpoint=endpoint, status="error")
+            raise
+        status = str(response.status_code)
+        METRICS.count("octoprint_http_requests_total", method=method, endpoint=endpoint, status=status)
+        if response.status_code >= 400:
+            METRICS.count("octoprint_http_failures_total", method=method, endpoint=endpoint, status=status)
+        try:
+            sent = len(response.request.body or b"")
+        except TypeError:
+            # Corps en flux (téléversement multipart) : taille annoncée par l'en-tête
+            sent = int(response.request.headers.get("Content-Length") or 0)
+        METRICS.count("octoprint_http_sent_bytes_total", sent, endpoint=endpoint)
+        METRICS.count("octoprint_http_received_bytes_total",
+                      int(response.headers.get("Content-Length") or 0), endpoint=endpoint)
+        return response
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request("DELETE", path, **kwargs)
+
+    def close(self):
+        """
+        Vide la file de commandes puis ferme les connexions du pool.
+        """
+        if self.queue is not None:
+            self.queue.close()
+        self.session.close()
+
+
+def _endpoint(path):
+    # Étiquette de métrique : chemin sans requête ni identifiants de session SockJS
+    path = path.split("?", 1)[0]
+    if "://" in path:
+        path = "/" + path.split("://", 1)[1].partition("/")[2]
+    return "/sockjs" if path.startswith("/sockjs/") else path
+
+
+CLIENT = OctoPrintClient(
+    URL, API_KEY,
+    timeout=HTTP_CONFIG.get("timeout", 10),
+    retries=HTTP_CONFIG.get("retries", 3),
+    backoff=HTTP_CONFIG.get("backoff", 0.3),
+    pool_size=HTTP_CONFIG.get("pool_size", 4),
+    state_ttl=STATE_CONFIG.get("ttl", 1.0)
+)
+STATE_CACHE = CLIENT.state
+
+def connect_printer(client=None):
     """
     Se connecte à l'imprimante via OctoPrint.
+    :param client: OctoPrintClient à utiliser (client global par défaut).
     """
-    url = URL + "/api/connection"
-    headers = {
-        "X-Api-Key": API_KEY,
-        "Content-Type": "application/json"
-    }
+    client = client or CLIENT
     data = {
         "command": "connect",
         "port": "AUTO",
@@ -26,7 +138,7 @@ def connect_printer():
     }
 
     try:
-        response = requests.post(url, json=data, headers=headers)
+        response = client.post("/api/connection", json=data)
         if response.status_code == 204:
             print("Successfully connected to the printer.")
         else:
@@ -34,17 +146,16 @@ def connect_printer():
     except requests.RequestException as e:
         print(f"Error during connection request: {e}")
 
-def is_printer_connected():
+def is_printer_connected(client=None):
     """
     Vérifie si l'imprimante est connectée.
+    :param client: OctoPrintClient à utiliser (client global par défaut).
     :return: True si connectée, False sinon.
     """
-    url = URL + "/printer"
-    headers = {"X-Api-Key": API_KEY}
-
+    client = client or CLIENT
     try:
-        print("Checking printer connection to ", url)
-        response = requests.get(url, headers=headers)
+        print("Checking printer connection to ", client.url + "/printer")
+        response = client.get("/printer")
         if response.status_code == 200:
             state = response.json().get("state", {}).get("flags", {})
             return state.get("operational", False)
@@ -56,14 +167,15 @@ def is_printer_connected():
         return False
 
 
-def get_printer_state():
+def fetch_printer_state(client=None):
     """
-    Vérifie l'état de l'imprimante.
+    Lit l'état de l'imprimante via l'API REST, sans passer par le cache.
+    :param client: OctoPrintClient à utiliser (client global par défaut).
     :return: État de l'imprimante (str)
     """
-    headers = {"X-Api-Key": API_KEY}
+    client = client or CLIENT
     try:
-        response = requests.get(URL + "/api/printer", headers=headers)
+        response = client.get("/api/printer")
         if response.status_code == 200:
             state = response.json().get("state", {}).get("text", "Unknown")
             return state
@@ -74,49 +186,292 @@ def get_printer_state():
         print(f"Error during state request: {e}")
         return "Unknown"
 
-def send_gcode_command(command):
+def get_printer_state(client=None):
+    """
+    Vérifie l'état de l'imprimante en consultant le cache d'état.
+    :param client: OctoPrintClient à utiliser (client global par défaut).
+    :return: État de l'imprimante (str)
+    """
+    return (client or CLIENT).state.get()
+
+def start_push_listener(client=None):
+    """
+    Démarre l'écoute du socket push d'OctoPrint pour tenir l'état à jour sans requêtes.
+    :param client: OctoPrintClient à utiliser (client global par défaut).
+    :return: PushListener démarré.
+    """
+    client = client or CLIENT
+    listener = client.state.listener
+    if listener is None:
+        listener = PushListener(client, client.state)
+    listener.start()
+    return listener
+
+def _drain_queue(client):
+    # Un envoi direct ne doit pas doubler les commandes encore dans la file asynchrone
+    if client.queue is not None:
+        client.queue.flush()
+
+def send_gcode_command(command, client=None, wait=True):
     """
     Envoie une commande G-code à OctoPrint.
     :param command: Commande G-code à envoyer (str)
+    :param client: OctoPrintClient à utiliser (client global par défaut).
+    :param wait: False pour confier la commande à la file asynchrone et rendre la main aussitôt.
+    :return: True si OctoPrint a accepté la commande, False sinon ; si wait est False,
+             Future de la commande (True une fois acceptée par OctoPrint).
     """
+    client = client or CLIENT
+    if not wait:
+        # Import local : command_queue dépend de ce module
+        from command_queue import get_queue
+        return get_queue(client).submit(command)
+    _drain_queue(client)
 
-    state = get_printer_state()
+    state = get_printer_state(client)
     if state != "Operational":
         print(f"Printer is not operational. Current state: {state}")
-        return
+        return False
 
-    headers = {
-        "X-Api-Key": API_KEY,
-        "Content-Type": "application/json"
-    }
     data = {
         "command": command
     }
     
     try:
-        response = requests.post(URL + "/api/printer/command", json=data, headers=headers)
+        response = client.post("/api/printer/command", json=data)
         if response.status_code == 204:
-            print(f"Command '{command}' sent successfully.")
-        else:
-            print(f"Failed to send command. Status code: {response.status_code}, Response: {response.text}")
+            METRICS.count("gcode_commands_total")
+            LOGGER.info("Command '%s' sent successfully.", command)
+            return True
+        # 409 : l'imprimante n'est plus opérationnelle, l'état en cache est périmé
+        client.state.invalidate()
+        METRICS.count("gcode_command_failures_total")
+        print(f"Failed to send command. Status code: {response.status_code}, Response: {response.text}")
+    except requests.RequestException as e:
+        METRICS.count("gcode_command_failures_total")
+        print(f"Error during API request: {e}")
+    return False
+
+def send_gcode_commands(commands, client=None):
+    """
+    Envoie plusieurs commandes G-code à OctoPrint en une seule requête,
+    après celles encore dans la file asynchrone.
+    :param commands: Liste de commandes G-code (list[str])
+    :param client: OctoPrintClient à utiliser (client global par défaut).
+    :return: True si OctoPrint a accepté le lot, False sinon.
+    """
+    client = client or CLIENT
+    _drain_queue(client)
+    return post_gcode_commands(commands, client)
+
+def post_gcode_commands(commands, client):
+    """
+    Envoie un lot de commandes en une requête, sans attendre la file asynchrone.
+    :param commands: Liste de commandes G-code (list[str])
+    :param client: OctoPrintClient à utiliser.
+    :return: True si OctoPrint a accepté le lot, False sinon.
+    """
+    try:
+        commands = list(commands)
+        response = client.post("/api/printer/command", json={"commands": commands})
+        if response.status_code == 204:
+            METRICS.count("gcode_commands_total", len(commands))
+            return True
+        client.state.invalidate()
+        METRICS.count("gcode_command_failures_total", len(commands))
+        print(f"Failed to send commands. Status code: {response.status_code}, Response: {response.text}")
+        return False
     except requests.RequestException as e:
+        METRICS.count("gcode_command_failures_total", len(commands))
         print(f"Error during API request: {e}")
+        return False
+
+def chunk_commands(commands, batch_size, max_bytes):
+    """
+    Regroupe un flux de commandes en lots limités en nombre de lignes et en octets.
+    :param commands: Itérable de commandes G-code (str)
+    :param batch_size: Nombre maximal de commandes par lot (int)
+    :param max_bytes: Taille maximale d'un lot en octets (int)
+    :return: Générateur de listes de commandes.
+    """
+    batch = []
+    size = 0
+    for command in commands:
+        # +4 : guillemets, virgule et espace ajoutés dans le tableau JSON
+        length = len(command.encode("utf-8")) + 4
+        if batch and (len(batch) >= batch_size or size + length > max_bytes):
+            yield batch
+            batch = []
+            size = 0
+        batch.append(command)
+        size += length
+    if batch:
+        yield batch
+
+# Travail d'une ligne dont la fin, visible par /api/job, signale la fin des mouvements
+IDLE_JOB_NAME = "_wait_for_idle.gcode"
+
+
+def _wait_idle_job(client, deadline, poll, max_poll):
+    # Option state.idle_job : M400 imprimé comme un travail. OctoPrint ne termine un travail
+    # (Finishing -> Operational) qu'une fois sa dernière ligne acquittée, donc M400 fini.
+    from print_job import ACTIVE_JOB_STATES
+
+    _drain_queue(client)
+    try:
+        response = client.post(
+            "/api/files/local", files={"file": (IDLE_JOB_NAME, b"M400\n")},
+            data={"select": "true", "print": "true"}
+        )
+    except requests.RequestException as e:
+        print(f"Error during idle job upload: {e}")
+        return False
+    if response.status_code != 201:
+        print(f"Failed to start idle job. Status code: {response.status_code}")
+        return False
+
+    try:
+        delay = poll
+        while True:
+            try:
+                response = client.get("/api/job")
+                job = response.json() if response.status_code == 200 else {}
+            except (requests.RequestException, ValueError) as e:
+                print(f"Error during job request: {e}")
+                job = {}
+            name = ((job.get("job") or {}).get("file") or {}).get("name")
+            state = job.get("state", "Unknown")
+            if name == IDLE_JOB_NAME and not state.startswith(ACTIVE_JOB_STATES):
+                if state.startswith("Operational"):
+                    return True
+                print(f"Idle job ended in state: {state}")
+                return False
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                print(f"Timeout: printer still moving after the idle job deadline (state: {state}).")
+                return False
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, max_poll)
+    finally:
+        # Le fichier du travail ne doit pas s'accumuler dans le stockage d'OctoPrint
+        try:
+            client.delete(f"/api/files/local/{IDLE_JOB_NAME}")
+        except requests.RequestException as e:
+            print(f"Error during idle job removal: {e}")
 
-def send_gcode_file(filepath):
+@timed("wait_for_idle")
+def wait_for_idle(timeout=60.0, poll=0.05, max_poll=1.0, client=None, idle_job=None):
     """
-    Envoie un fichier G-code ligne par ligne à OctoPrint.
+    Attend la fin des mouvements en cours, sans délai fixe.
+    Envoie M400 (attente de la file de mouvements) puis M114 par /api/printer/command,
+    sans créer de travail d'impression.
+    Socket push activé (state.push) et connecté : le rapport de position poussé par
+    OctoPrint après cet envoi signifie que la machine est immobile.
+    Sinon, l'état est relu par REST jusqu'à ce qu'OctoPrint soit Operational et que le
+    firmware ne se déclare plus occupé ; la réponse à M114 n'étant pas visible par REST,
+    state.push (ou idle_job) donne le signal de fin de mouvement le plus sûr.
+    :param timeout: Délai maximal d'attente (s)
+    :param poll: Intervalle initial de vérification (s), doublé à chaque tour
+    :param max_poll: Intervalle maximal de vérification (s)
+    :param client: OctoPrintClient à utiliser (client global par défaut).
+    :param idle_job: Lancer M400 comme un travail d'une ligne et attendre sa fin via
+                     /api/job (fichier supprimé ensuite) ; défaut : state.idle_job.
+    :return: True si la machine est immobile, False en cas d'échec ou de dépassement.
+    """
+    client = client or CLIENT
+    cache = client.state
+    deadline = time.monotonic() + timeout
+    if idle_job is None:
+        idle_job = STATE_CONFIG.get("idle_job", False)
+    if idle_job:
+        return _wait_idle_job(client, deadline, poll, max_poll)
+
+    listener = None
+    if STATE_CONFIG.get("push", False):
+        listener = start_push_listener(client)
+        connect_deadline = min(deadline, time.monotonic() + 2.0)
+        while not listener.connected and listener.last_error is None \
+                and time.monotonic() < connect_deadline:
+            time.sleep(poll)
+
+    sent_at = time.monotonic()
+    if not send_gcode_commands(["M400", "M114"], client):
+        return False
+
+    delay = poll
+    while True:
+        if listener is not None and listener.connected:
+            if cache.position_time > sent_at:
+                return True
+            state = cache.get()
+        else:
+            # Relecture REST : l'état en cache peut dater d'avant l'envoi
+            cache.invalidate()
+            state = cache.get()
+            if state == "Operational" and not cache.is_busy():
+                return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            print(f"Timeout: printer still moving after {timeout:.1f}s (state: {state}).")
+            return False
+        cache.wait_for_update(min(delay, remaining))
+        delay = min(delay * 2, max_poll)
+
+@timed("send_gcode_file")
+def send_gcode_file(filepath, batch_size=None, max_bytes=None, state_interval=None, pipeline=None,
+                    client=None):
+    """
+    Envoie un fichier G-code à OctoPrint par lots de commandes.
     :param filepath: Chemin vers le fichier G-code (str)
+    :param batch_size: Nombre maximal de lignes par requête (int)
+    :param max_bytes: Taille maximale d'une requête en octets (int)
+    :param state_interval: Délai minimal (s) entre deux vérifications d'état ;
+                           0 pour vérifier avant chaque lot.
+    :param pipeline: GcodePipeline appliqué aux lignes avant envoi ; par défaut
+                     la chaîne standard si "preprocess.enabled" est vrai, avec
+                     fusion des segments alignés si "preprocess.merge_collinear" est vrai.
+    :param client: OctoPrintClient à utiliser (client global par défaut).
+    :return: Nombre de lignes envoyées (int)
     """
-    state = get_printer_state()
-    if state != "Operational":
-        print(f"Printer is not operational. Current state: {state}")
-        return
+    client = client or CLIENT
+    if pipeline is None and PREPROCESS_CONFIG.get("enabled", True):
+        # Fusion des segments alignés (avec perte) seulement sur demande
+        merge = PREPROCESS_CONFIG.get("merge_collinear", False)
+        pipeline = default_pipeline(merge_tolerance=PREPROCESS_CONFIG.get("merge_tolerance", 0.01) if merge else None)
+    if batch_size is None:
+        batch_size = STREAM_CONFIG.get("batch_size", 50)
+    if max_bytes is None:
+        max_bytes = STREAM_CONFIG.get("max_bytes", 4096)
+    if state_interval is None:
+        state_interval = STREAM_CONFIG.get("state_interval", 1.0)
 
+    sent = 0
+    start = time.perf_counter()
+    last_check = None
     try:
         with open(filepath, "r") as file:
-            for line in file:
-                command = line.strip()
-                if command:
-                    send_gcode_command(command)
+            if pipeline is not None:
+                commands = pipeline.process(file)
+            else:
+                commands = (c for c in (line.strip() for line in file) if c)
+            for batch in chunk_commands(commands, batch_size, max_bytes):
+                now = time.monotonic()
+                if last_check is None or now - last_check >= state_interval:
+                    state = get_printer_state(client)
+                    last_check = now
+                    if state != "Operational":
+                        print(f"Printer is not operational. Current state: {state}")
+                        break
+                if not send_gcode_commands(batch, client):
+                    break
+                sent += len(batch)
     except FileNotFoundError:
-        print(f"File not found: {filepath}")
\ No newline at end of file
+        print(f"File not found: {filepath}")
+        return sent
+
+    elapsed = time.perf_counter() - start
+    rate = sent / elapsed if elapsed > 0 else 0.0
+    print(f"Sent {sent} lines from {filepath} in {elapsed:.2f}s ({rate:.1f} lines/s).")
+    if pipeline is not None:
+        pipeline.report()
+    return sent
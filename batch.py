@@ -0,0 +1,329 @@
+import argparse
+import json
+import queue
+import shlex
+import subprocess
+import threading
+import time
+
+from api import send_gcode_commands, wait_for_idle
+from calibration import get_calibration
+from camera_analysis import detect_outline, grab_frame
+from frame import Frame
+from metrics import METRICS
+from mjpeg_stream import MJPEGStreamReader
+from settings import SCREWS_REAL_COORDS
+from tools import transform_coordinates
+from toolpath import contour_toolpath
+
+# Fin du flux de pièces, transmise d'une étape à la suivante
+_STOP = object()
+
+# Initialisation de la machine, comme au début de analyze_object_and_move
+HOMING = ["G28", "M92 E4000 T0", "M83"]
+
+
+class BatchPipeline:
+    """
+    Chaîne d'étapes exécutées en parallèle : chaque étape a ses threads et lit
+    une file bornée alimentée par l'étape précédente. Pendant que la dernière étape
+    traite la pièce N, les précédentes avancent déjà sur les pièces suivantes ;
+    une file pleine bloque l'étape en amont (pas d'accumulation sans limite).
+    """
+
+    def __init__(self, stages, queue_size=2):
+        """
+        :param stages: Liste de (nom, fonction(item) -> item, nombre de threads).
+        :param queue_size: Capacité des files entre les étapes.
+        """
+        self.stages = stages
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+        self.stats = {name: {"items": 0, "errors": 0, "busy": 0.0, "workers": workers}
+                      for name, _, workers in stages}
+        self.results = []
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def _worker(self, index, remaining):
+        name, function, _ = self.stages[index]
+        source, target = self.queues[index], self.queues[index + 1]
+        stats = self.stats[name]
+        while True:
+            item = source.get()
+            if item is _STOP:
+                # Rendu aux autres threads de l'étape ; le dernier prévient l'étape suivante
+                source.put(_STOP)
+                with self._lock:
+                    remaining[index] -= 1
+                    last = remaining[index] == 0
+                if last:
+                    target.put(_STOP)
+                return
+            if item.get("error") is None:
+                start = time.perf_counter()
+                try:
+                    with METRICS.span("batch_stage", stage=name):
+                        item = function(item)
+                except Exception as e:
+                    item["error"] = f"{name}: {e}"
+                busy = time.perf_counter() - start
+                with self._lock:
+                    stats["items"] += 1
+                    stats["busy"] += busy
+                    stats["errors"] += item.get("error") is not None
+            target.put(item)
+
+    def run(self, items):
+        """
+        Fait passer les éléments dans toutes les étapes.
+        :param items: Itérable de dictionnaires ; une étape qui échoue renseigne "error"
+                      et les étapes suivantes laissent passer l'élément.
+        :return: Éléments sortis de la dernière étape, dans leur ordre d'arrivée.
+        """
+        remaining = [workers for _, _, workers in self.stages]
+        threads = [
+            threading.Thread(target=self._worker, args=(index, remaining), name=f"batch-{name}-{n}", daemon=True)
+            for index, (name, _, workers) in enumerate(self.stages)
+            for n in range(workers)
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+
+        def feed():
+            for item in items:
+                self.queues[0].put(item)
+            self.queues[0].put(_STOP)
+
+        feeder = threading.Thread(target=feed, name="batch-feed", daemon=True)
+        feeder.start()
+        output = self.queues[-1]
+        while (item := output.get()) is not _STOP:
+            self.results.append(item)
+        self.elapsed = time.perf_counter() - start
+        return self.results
+
+    def report(self):
+        """
+        Affiche le débit (pièces/heure) et l'utilisation de chaque étape.
+        :return: Rapport (dict).
+        """
+        done = sum(1 for item in self.results if item.get("error") is None)
+        rate = done / self.elapsed * 3600 if self.elapsed else 0.0
+        stages = {}
+        print(f"{done}/{len(self.results)} pièces en {self.elapsed:.1f} s ({rate:.1f} pièces/heure)")
+        for name, stats in self.stats.items():
+            # Part du temps total où les threads de l'étape travaillaient
+            utilisation = stats["busy"] / (self.elapsed * stats["workers"]) if self.elapsed else 0.0
+            mean = stats["busy"] / stats["items"] * 1000 if stats["items"] else 0.0
+            stages[name] = {**stats, "utilisation": utilisation, "mean_ms": mean}
+            print(f"  {name:<10} {stats['items']:>4} pièces  {utilisation:6.1%} occupé  "
+                  f"{mean:9.1f} ms/pièce  {stats['errors']} erreurs")
+        return {"total": len(self.results), "done": done, "elapsed_s": self.elapsed,
+                "parts_per_hour": rate, "stages": stages}
+
+
+def operator_trigger(part):
+    """
+    Déclencheur par défaut : l'opérateur confirme que la pièce est en place.
+    :param part: Pièce à capturer ("name", "slot").
+    """
+    input(f"Placez {part['name']} dans l'emplacement {part['slot'] + 1} puis appuyez sur Entrée.")
+
+
+def command_trigger(command):
+    """
+    Déclencheur externe (capteur, chargeur) : une commande qui rend la main, avec le
+    code 0, une fois la pièce en place. {slot} et {name} y sont remplacés.
+    :param command: Ligne de commande (str), ex. "python attendre_capteur.py {slot}".
+    :return: Fonction déclencheur(part).
+    """
+    def trigger(part):
+        arguments = [word.format(slot=part["slot"], name=part["name"]) for word in shlex.split(command)]
+        if subprocess.run(arguments).returncode != 0:
+            raise RuntimeError("pièce non mise en place")
+    return trigger
+
+
+def make_trigger(job):
+    """
+    Déclencheur de mise en place décrit par le travail : "trigger" vaut "operator"
+    (défaut) ou {"command": "..."} (voir command_trigger).
+    """
+    trigger = job.get("trigger", "operator")
+    if isinstance(trigger, dict) and "command" in trigger:
+        return command_trigger(trigger["command"])
+    if trigger == "operator":
+        return operator_trigger
+    raise ValueError(f"Déclencheur inconnu : {trigger}")
+
+
+def analyze_stages(job, reader=None, trigger=None):
+    """
+    Étapes du traitement sans intervention d'une pièce : capture, vision, tracé.
+    Les pièces capturées à la caméra sont posées dans les emplacements du plateau
+    ("slots") : la pièce suivante est capturée et analysée dans un emplacement libre
+    pendant que la précédente est tracée dans le sien.
+    :param job: Fichier de travail chargé (voir load_job).
+    :param reader: MJPEGStreamReader démarré, ou None.
+    :param trigger: Fonction(part) rendant la main une fois la pièce en place
+                    (défaut : make_trigger(job)).
+    :return: Liste d'étapes pour BatchPipeline.
+    """
+    toolpath = {key: job[key] for key in ("offset", "z", "feedrate", "extrusion", "tolerance", "travel_z")
+                if key in job}
+    slots = job.get("slots") or [None]
+    trigger = trigger or make_trigger(job)
+    homed = threading.Event()
+    # Emplacements occupés : {emplacement: pièce capturée dont le tracé n'est pas terminé}
+    occupied = {}
+    slots_changed = threading.Condition()
+
+    def finish(part):
+        with slots_changed:
+            if occupied.get(part.get("slot")) is part:
+                del occupied[part["slot"]]
+                slots_changed.notify_all()
+
+    def capture(part):
+        image = part.get("image")
+        try:
+            if image is None:
+                # Caméra : l'emplacement n'est libre qu'une fois la pièce qui l'occupait tracée,
+                # puis la nouvelle pièce doit y être posée avant la capture
+                slot = part.setdefault("slot", 0)
+                with slots_changed:
+                    slots_changed.wait_for(lambda: slot not in occupied)
+                    occupied[slot] = part
+                trigger(part)
+            # Image enregistrée (rejeu hors ligne) ou image du flux postérieure à la mise en place
+            image = image or grab_frame(None, reader, after=time.monotonic())
+            part["frame"] = Frame.load(image) if image is not None else None
+            if part["frame"] is None:
+                raise RuntimeError("capture impossible")
+        except Exception:
+            finish(part)
+            raise
+        return part
+
+    def analyze(part):
+        frame = part.pop("frame")
+        calibration = get_calibration(frame, job.get("screws_real_coords", SCREWS_REAL_COORDS))
+        if calibration is None:
+            raise RuntimeError("calibration impossible")
+        roi = slots[part["slot"]] if "slot" in part else None
+        if roi is None:
+            outline = detect_outline(frame, None)
+        else:
+            # Seul l'emplacement de la pièce est analysé : les autres peuvent être occupés
+            x, y, width, height = roi
+            outline = detect_outline(Frame(frame.image[y:y + height, x:x + width]), None)
+            outline = [(px + x, py + y) for px, py in outline or []]
+        if not outline:
+            raise RuntimeError("aucun contour détecté")
+        options = {**toolpath, **part.get("toolpath", {})}
+        if "offset" in part:
+            options["offset"] = part["offset"]
+        part["commands"] = contour_toolpath(transform_coordinates(outline, calibration.matrix), **options)
+        if part["commands"] is None:
+            raise RuntimeError("pièce trop petite pour le décalage")
+        return part
+
+    def vision(part):
+        try:
+            return analyze(part)
+        except Exception:
+            finish(part)
+            raise
+
+    def motion(part):
+        try:
+            if job.get("home", True) and not homed.is_set():
+                # Prise d'origine au premier tracé : capture et vision avancent pendant ce temps
+                if not send_gcode_commands(HOMING):
+                    raise RuntimeError("prise d'origine refusée")
+                if not wait_for_idle(timeout=120):
+                    raise RuntimeError("prise d'origine non terminée")
+                homed.set()
+            if not send_gcode_commands(part["commands"]):
+                raise RuntimeError("envoi refusé")
+            if not wait_for_idle(timeout=job.get("timeout", 120)):
+                raise RuntimeError("mouvement non terminé")
+            part["finished"] = time.time()
+            return part
+        finally:
+            finish(part)
+
+    return [
+        ("capture", capture, 1),
+        ("vision", vision, job.get("vision_workers", 1)),
+        ("motion", motion, 1),
+    ]
+
+
+def load_job(path):
+    """
+    Charge un fichier de travail :
+    {"parts": [{"name": "pièce 1", "image": "img/p1.jpg"}, ...], "home": true, "offset": 2,
+     "z": 6, "feedrate": 400, "extrusion": 0.02, "queue_size": 2, "vision_workers": 1,
+     "slots": [[0, 0, 640, 360], [0, 360, 640, 360]], "trigger": "operator"}
+    Les réglages du tracé absents reprennent la section toolpath de la configuration.
+    "image" est facultatif (sinon capture sur la caméra) ; "offset" et "toolpath" peuvent être
+    précisés par pièce. "slots" liste les emplacements du plateau (x, y, largeur, hauteur en
+    pixels, défaut : l'image entière) ; les pièces capturées les occupent à tour de rôle,
+    sauf "slot" (indice) précisé par pièce. "trigger" : voir make_trigger.
+    :return: Dictionnaire du travail.
+    """
+    with open(path, "r") as job_file:
+        job = json.load(job_file)
+    slots = len(job.get("slots") or [None])
+    camera_parts = 0
+    for index, part in enumerate(job.get("parts", [])):
+        part.setdefault("name", f"part-{index + 1}")
+        if "image" not in part:
+            part.setdefault("slot", camera_parts % slots)
+            camera_parts += 1
+    return job
+
+
+def run_batch(job, reader=None, trigger=None):
+    """
+    Traite toutes les pièces d'un travail sans intervention.
+    :param trigger: Déclencheur de mise en place des pièces (voir analyze_stages).
+    :return: (pièces traitées, rapport)
+    """
+    pipeline = BatchPipeline(analyze_stages(job, reader, trigger), job.get("queue_size", 2))
+    parts = pipeline.run(dict(part) for part in job.get("parts", []))
+    for part in parts:
+        if part.get("error"):
+            print(f"{part['name']} : échec ({part['error']})")
+    report = pipeline.report()
+    park = job.get("park", [250, 250, 50])
+    if park:
+        send_gcode_commands([f"G1 X{park[0]} Y{park[1]} Z{park[2]} F10000"])
+    return parts, report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyse et tracé de pièces en lot, sans intervention")
+    parser.add_argument("job", help="Fichier de travail (JSON)")
+    parser.add_argument("--stream", action="store_true", help="Lire les images sur le flux MJPEG")
+    parser.add_argument("--report", help="Fichier JSON où écrire le rapport et les pièces")
+    args = parser.parse_args()
+
+    job = load_job(args.job)
+    reader = None
+    if args.stream:
+        from api import CLIENT
+        reader = MJPEGStreamReader(CLIENT)
+        reader.start()
+    try:
+        parts, report = run_batch(job, reader)
+    finally:
+        if reader is not None:
+            reader.stop()
+    if args.report:
+        for part in parts:
+            part.pop("commands", None)
+        with open(args.report, "w") as report_file:
+            json.dump({**report, "parts": parts}, report_file, indent=4)
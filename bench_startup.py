@@ -0,0 +1,62 @@
+import argparse
+import re
+import statistics
+import subprocess
+import sys
+
+# Modules importés par chaque sous-commande de cli.py
+PATHS = {
+    "send": ["api"],
+    "files": ["print_job"],
+    "estimate": ["gcode_sim"],
+    "pe": ["pe"],
+    "analyze": ["main"],
+}
+# Chemins qui ne doivent charger ni OpenCV ni NumPy
+LIGHT_PATHS = ("send", "files")
+HEAVY_MODULES = ("cv2", "numpy")
+
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_times(modules):
+    """
+    Lance un interpréteur neuf avec -X importtime et importe cli puis les modules donnés.
+    :return: (temps cumulé des imports de premier niveau (ms), ensemble des modules chargés)
+    """
+    code = "import cli; " + "; ".join(f"import {module}" for module in modules)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            capture_output=True, text=True, check=True)
+    total, loaded = 0, set()
+    for match in IMPORT_LINE.finditer(result.stderr):
+        _, cumulative, indent, name = match.groups()
+        loaded.add(name)
+        # Un seul espace : import de premier niveau (les autres sont comptés dans son cumul)
+        if len(indent) == 1:
+            total += int(cumulative)
+    return total / 1000, loaded
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Temps d'import des sous-commandes de cli.py (-X importtime)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=250.0, help="Budget du chemin send (ms)")
+    args = parser.parse_args()
+
+    failed = False
+    for path, modules in PATHS.items():
+        samples, loaded = [], set()
+        for _ in range(args.repeat):
+            total, loaded = import_times(modules)
+            samples.append(total)
+        median = statistics.median(samples)
+        heavy = [module for module in HEAVY_MODULES if module in loaded]
+        line = f"{path:<10} médiane {median:7.1f} ms  min {min(samples):7.1f} ms  {', '.join(heavy) or '-'}"
+        if path in LIGHT_PATHS and heavy:
+            line += "  ÉCHEC : import lourd"
+            failed = True
+        if path == "send" and median > args.budget:
+            line += f"  ÉCHEC : budget de {args.budget:.0f} ms dépassé"
+            failed = True
+        print(line)
+    sys.exit(1 if failed else 0)
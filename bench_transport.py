@@ -0,0 +1,193 @@
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import requests
+
+from api import HTTP_CONFIG, STATE_CONFIG, OctoPrintClient, send_gcode_command, send_gcode_file
+from benchutil import git_commit
+from fake_octoprint import FakeOctoPrint
+from print_job import upload_and_print
+
+
+def _serve(connection, options):
+    # Processus du faux serveur : le client mesuré ne partage pas son GIL
+    fake = FakeOctoPrint(**options)
+    connection.send(fake.url)
+    fake.server.serve_forever()
+
+
+def start_server(options):
+    """
+    Lance le faux OctoPrint dans un processus séparé.
+    :param options: Arguments de FakeOctoPrint.
+    :return: (processus, URL du serveur)
+    """
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=_serve, args=(child, options), daemon=True)
+    process.start()
+    return process, parent.recv()
+
+
+def server_stats(url):
+    return requests.get(url + "/_fake/stats", timeout=5).json()
+
+
+def stats_delta(before, after):
+    # Requêtes, commandes et erreurs injectées pendant une mesure
+    return {key: after[key] - before[key] for key in ("requests", "commands", "errors", "resets")}
+
+
+def write_gcode(path, lines, seed=0):
+    """
+    Écrit un programme G-code de test : zigzag extrudé, commentaires et changements de couche.
+    :param lines: Nombre de lignes.
+    """
+    rng = np.random.default_rng(seed)
+    x = np.round(rng.uniform(20, 230, lines), 3)
+    y = np.round(rng.uniform(20, 230, lines), 3)
+    e = np.round(np.cumsum(rng.uniform(0.01, 0.1, lines)), 5)
+    with open(path, "w") as file:
+        for i in range(lines):
+            if i % 500 == 0:
+                file.write(f";LAYER:{i // 500}\nG1 Z{0.2 + 0.2 * (i // 500):.2f} F600\n")
+            else:
+                file.write(f"G1 X{x[i]} Y{y[i]} E{e[i]} F1800\n")
+
+
+def latency_stats(samples):
+    samples = np.asarray(samples) * 1000
+    return {
+        "median_ms": float(np.median(samples)),
+        "p95_ms": float(np.percentile(samples, 95)),
+        "max_ms": float(samples.max()),
+    }
+
+
+def bench_commands(client, url, count):
+    """
+    send_gcode_command appelé count fois : latence par commande et débit.
+    """
+    before = server_stats(url)
+    latencies = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        for i in range(count):
+            t = time.perf_counter()
+            send_gcode_command(f"G1 X{10 + i % 200} F3000", client=client)
+            latencies.append(time.perf_counter() - t)
+        elapsed = time.perf_counter() - start
+    return {
+        **stats_delta(before, server_stats(url)),
+        "elapsed_s": elapsed,
+        "calls": count,
+        "commands_per_s": count / elapsed,
+        **latency_stats(latencies),
+    }
+
+
+def bench_file(client, url, path, lines):
+    """
+    send_gcode_file sur un fichier de lines lignes : débit de bout en bout
+    (lecture, prétraitement, découpage en lots et envoi).
+    """
+    before = server_stats(url)
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        sent = send_gcode_file(path, client=client)
+        elapsed = time.perf_counter() - start
+    return {
+        "lines": lines,
+        "sent": sent,
+        **stats_delta(before, server_stats(url)),
+        "elapsed_s": elapsed,
+        # Lignes du fichier traitées par seconde : n'a de sens que si l'envoi est allé
+        # au bout (send_gcode_file s'arrête à la première erreur d'un POST)
+        "lines_per_s": lines / elapsed,
+        "sent_per_s": sent / elapsed,
+    }
+
+
+def bench_upload(client, url, path, lines):
+    """
+    upload_and_print : débit du téléversement multipart en flux.
+    """
+    before = server_stats(url)
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        accepted = upload_and_print(path, client=client)
+        elapsed = time.perf_counter() - start
+    after = server_stats(url)
+    uploaded = after["uploaded_bytes"] - before["uploaded_bytes"]
+    return {
+        "lines": lines,
+        "accepted": accepted,
+        **stats_delta(before, after),
+        "uploaded_bytes": uploaded,
+        "elapsed_s": elapsed,
+        "mib_per_s": uploaded / elapsed / (1 << 20),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark du transport G-code contre un faux OctoPrint")
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000", help="Tailles des fichiers (lignes)")
+    parser.add_argument("--commands", type=int, default=1000, help="Appels à send_gcode_command")
+    parser.add_argument("--latency", type=float, default=0.0, help="Latence du serveur (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Gigue du serveur (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--reset-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_transport.json")
+    args = parser.parse_args()
+
+    options = {"latency": args.latency, "jitter": args.jitter, "error_rate": args.error_rate,
+               "reset_rate": args.reset_rate, "seed": args.seed}
+    process, url = start_server(options)
+    client = OctoPrintClient(url, "benchmark", **HTTP_CONFIG, state_ttl=STATE_CONFIG.get("ttl", 1.0))
+    report = {
+        "commit": git_commit(),
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "requests": requests.__version__,
+        "server": options,
+        "http": HTTP_CONFIG,
+        "results": {},
+    }
+    try:
+        result = bench_commands(client, url, args.commands)
+        report["results"]["send_gcode_command"] = result
+        print(f"send_gcode_command : {result['commands_per_s']:.0f} commandes/s, "
+              f"médiane {result['median_ms']:.2f} ms, p95 {result['p95_ms']:.2f} ms "
+              f"({result['commands']}/{args.commands} reçues, {result['errors']} erreurs injectées)")
+
+        with tempfile.TemporaryDirectory() as folder:
+            for lines in (int(size) for size in args.sizes.split(",")):
+                path = os.path.join(folder, f"bench_{lines}.gcode")
+                write_gcode(path, lines, args.seed)
+
+                result = bench_file(client, url, path, lines)
+                report["results"][f"send_gcode_file_{lines}"] = result
+                print(f"send_gcode_file {lines:>8} lignes : {result['lines_per_s']:10.0f} lignes/s, "
+                      f"{result['sent']} commandes envoyées ({result['sent_per_s']:.0f}/s) "
+                      f"en {result['requests']} requêtes, {result['errors'] + result['resets']} erreurs injectées")
+
+                result = bench_upload(client, url, path, lines)
+                report["results"][f"upload_and_print_{lines}"] = result
+                print(f"upload_and_print {lines:>7} lignes : {result['mib_per_s']:10.1f} Mio/s "
+                      f"({result['uploaded_bytes']} octets)")
+    finally:
+        client.close()
+        process.terminate()
+
+    with open(args.output, "w") as output_file:
+        json.dump(report, output_file, indent=4)
+    print(f"Résultats enregistrés dans {args.output}")
@@ -0,0 +1,182 @@
+import argparse
+import contextlib
+import io
+import json
+import platform
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import cv2
+import numpy as np
+
+from benchutil import git_commit
+from camera_analysis import analyze_image, detect_screws
+from frame import Frame
+from settings import SCREWS_REAL_COORDS
+from tools import compute_pixel_to_mm_transformation, order_screws, transform_coordinates
+from vision_cache import VISION_CACHE
+
+
+def make_variants(image, scales=(0.5, 1.0, 1.5, 2.0), noise=(5, 15), angles=(3, 10), seed=0):
+    """
+    Variantes synthétiques de l'image de référence.
+    :param scales: Facteurs d'échelle (résolution).
+    :param noise: Écarts types du bruit gaussien ajouté.
+    :param angles: Rotations (degrés) autour du centre.
+    :return: Dictionnaire {nom: image}
+    """
+    rng = np.random.default_rng(seed)
+    height, width = image.shape[:2]
+    variants = {}
+    for scale in scales:
+        size = (int(width * scale), int(height * scale))
+        variants[f"scale_{scale:g}"] = image if scale == 1 else cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    for sigma in noise:
+        noisy = image.astype(np.float32) + rng.normal(0, sigma, image.shape).astype(np.float32)
+        variants[f"noise_{sigma}"] = np.clip(noisy, 0, 255).astype(np.uint8)
+    for angle in angles:
+        matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+        variants[f"rotate_{angle}"] = cv2.warpAffine(image, matrix, (width, height), borderMode=cv2.BORDER_REPLICATE)
+    return variants
+
+
+def measure(function, warmup=3, repeat=30):
+    """
+    Chronomètre une fonction sans argument après quelques appels de chauffe, puis
+    mesure le pic de mémoire Python (tracemalloc) sur un appel séparé.
+    :return: (statistiques en ms et Kio, dernier résultat)
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(warmup):
+            function()
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = function()
+            times.append(time.perf_counter() - start)
+
+        # Mesure mémoire hors chronométrage (tracemalloc ralentit les allocations)
+        tracemalloc.start()
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    times = np.array(times) * 1000
+    return {
+        "median_ms": float(np.median(times)),
+        "p95_ms": float(np.percentile(times, 95)),
+        "mean_ms": float(times.mean()),
+        "min_ms": float(times.min()),
+        "peak_kib": peak / 1024,
+        "repeat": repeat,
+    }, result
+
+
+def bench_image(image, warmup=3, repeat=30):
+    """
+    Mesure chaque étape de la chaîne de vision puis la chaîne complète.
+    Les détecteurs reçoivent un Frame neuf à chaque appel : aucun plan n'est réutilisé.
+    :return: Dictionnaire {étape: statistiques}
+    """
+    results = {}
+    # Détecteurs mesurés sans le cache de vision (seule l'étape cache_hit l'utilise)
+    with VISION_CACHE.scope(enabled=False):
+        results["detect_screws"], screws = measure(lambda: detect_screws(Frame(image), None, mode="full"), warmup, repeat)
+        results["detect_screws_fast"], _ = measure(lambda: detect_screws(Frame(image), None, mode="fast"), warmup, repeat)
+        results["analyze_image"], corners = measure(lambda: analyze_image(Frame(image), None), warmup, repeat)
+        results["detect_screws"]["found"] = len(screws or [])
+        results["analyze_image"]["found"] = len(corners or [])
+
+        # Les étapes géométriques ne sont mesurées que si la détection a abouti
+        if screws and len(screws) == 4:
+            results["order_screws"], ordered = measure(lambda: order_screws(screws), warmup, repeat)
+            results["compute_pixel_to_mm_transformation"], matrix = measure(
+                lambda: compute_pixel_to_mm_transformation(ordered, SCREWS_REAL_COORDS), warmup, repeat
+            )
+            if corners:
+                results["transform_coordinates"], _ = measure(
+                    lambda: transform_coordinates(corners, matrix), warmup, repeat
+                )
+
+        def end_to_end():
+            # Un seul Frame : les plans dérivés sont partagés comme dans main.py
+            frame = Frame(image)
+            found = detect_screws(frame, None)
+            if not found or len(found) != 4:
+                return None
+            matrix = compute_pixel_to_mm_transformation(order_screws(found), SCREWS_REAL_COORDS)
+            found_corners = analyze_image(frame, None)
+            return transform_coordinates(found_corners, matrix) if found_corners else None
+
+        results["end_to_end"], _ = measure(end_to_end, warmup, repeat)
+
+    # Image inchangée : empreinte de la miniature puis lecture du cache
+    VISION_CACHE.clear()
+    try:
+        with VISION_CACHE.scope(enabled=True):
+            with contextlib.redirect_stdout(io.StringIO()):
+                analyze_image(Frame(image), None)
+            results["cache_hit"], _ = measure(lambda: analyze_image(Frame(image), None), warmup, repeat)
+    finally:
+        VISION_CACHE.clear()
+    return results
+
+
+def compare(current, previous_path, threshold=0.10):
+    """
+    Compare les médianes à celles d'un rapport précédent et signale les régressions.
+    :param threshold: Hausse relative au-delà de laquelle une étape est signalée.
+    """
+    with open(previous_path, "r") as previous_file:
+        previous = json.load(previous_file)
+    print(f"Comparaison avec {previous_path} ({previous.get('commit')}) :")
+    for variant, stages in current["results"].items():
+        for stage, stats in stages.items():
+            old = previous.get("results", {}).get(variant, {}).get(stage)
+            if not old:
+                continue
+            ratio = stats["median_ms"] / old["median_ms"] if old["median_ms"] else float("inf")
+            flag = "  RÉGRESSION" if ratio > 1 + threshold else ""
+            print(f"  {variant:<12} {stage:<36} {old['median_ms']:8.3f} -> {stats['median_ms']:8.3f} ms"
+                  f"  x{ratio:.2f}{flag}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de la chaîne de vision")
+    parser.add_argument("--image", default="snapshot.jpg")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--output", default="bench_vision.json")
+    parser.add_argument("--compare", help="Rapport JSON précédent à comparer")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Hausse relative signalée (0.10 : +10 %%)")
+    args = parser.parse_args()
+
+    reference = cv2.imread(args.image)
+    if reference is None:
+        raise SystemExit(f"Erreur : Impossible de charger l'image {args.image}")
+
+    report = {
+        "commit": git_commit(),
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "opencv_threads": cv2.getNumThreads(),
+        "results": {},
+    }
+    for name, image in make_variants(reference).items():
+        results = bench_image(image, args.warmup, args.repeat)
+        report["results"][name] = results
+        print(f"=== {name} ({image.shape[1]}x{image.shape[0]})")
+        for stage, stats in results.items():
+            print(f"  {stage:<36} médiane {stats['median_ms']:8.3f} ms  p95 {stats['p95_ms']:8.3f} ms"
+                  f"  pic {stats['peak_kib']:8.1f} Kio")
+
+    with open(args.output, "w") as output_file:
+        json.dump(report, output_file, indent=4)
+    print(f"Résultats enregistrés dans {args.output}")
+
+    if args.compare:
+        compare(report, args.compare, args.threshold)
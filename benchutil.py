@@ -0,0 +1,14 @@
+import subprocess
+
+
+def git_commit():
+    """
+    Commit courant du dépôt, noté dans les rapports de benchmark.
+    :return: Hash abrégé (str), ou None hors d'un dépôt git.
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,192 @@
+import hashlib
+import json
+import os
+
+import cv2
+import numpy as np
+from camera_analysis import SNAPSHOT_URL, detect_screws
+from frame import Frame
+from metrics import timed
+from settings import CONFIG
+from tools import compute_pixel_to_mm_transformation, order_screws
+from vision_cache import memoize
+
+# GLOBAL VAR
+CALIBRATION_CONFIG = CONFIG.get("calibration", {})
+CALIBRATION_PATH = CALIBRATION_CONFIG.get("path", "config/calibration.npz")
+
+
+class Calibration:
+    """
+    Calibration pixel -> mm : positions des vis dans l'image, homographie et
+    vignettes autour de chaque vis servant au contrôle de dérive.
+    """
+
+    def __init__(self, key, screws, real_coords, matrix, patches):
+        """
+        :param key: Clé (str) de la caméra et de la configuration.
+        :param screws: Vis ordonnées dans l'image (pixels) [(x, y), ...].
+        :param real_coords: Coordonnées réelles des vis (mm).
+        :param matrix: Matrice de transformation 3x3 (pixels -> mm).
+        :param patches: Vignettes en niveaux de gris centrées sur chaque vis.
+        """
+        self.key = key
+        self.screws = [(int(round(x)), int(round(y))) for x, y in screws]
+        self.real_coords = [tuple(map(float, point)) for point in real_coords]
+        self.matrix = np.asarray(matrix, dtype=np.float64)
+        self.patches = patches
+
+    def save(self, path=CALIBRATION_PATH):
+        """
+        Sauvegarde la calibration sur disque.
+        :param path: Fichier .npz de destination.
+        """
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            np.savez(
+                path, key=np.array(self.key), screws=np.array(self.screws),
+                real_coords=np.array(self.real_coords), matrix=self.matrix,
+                patches=np.stack(self.patches)
+            )
+        except OSError as e:
+            print(f"Erreur lors de la sauvegarde de la calibration : {e}")
+
+    @classmethod
+    def load(cls, key, path=CALIBRATION_PATH):
+        """
+        Recharge une calibration si elle correspond à la clé demandée.
+        :param key: Clé attendue (caméra et configuration).
+        :param path: Fichier .npz de la calibration.
+        :return: Calibration ou None (absente, illisible ou d'une autre configuration).
+        """
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                if str(data["key"]) != key:
+                    return None
+                return cls(key, data["screws"], data["real_coords"], data["matrix"], list(data["patches"]))
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Erreur lors de la lecture de la calibration : {e}")
+            return None
+
+
+def calibration_key(image_shape, real_coords, camera=SNAPSHOT_URL):
+    """
+    Clé identifiant une calibration : caméra, résolution et coordonnées réelles des vis.
+    :param image_shape: Dimensions de l'image capturée.
+    :param real_coords: Coordonnées réelles des vis (mm).
+    :param camera: URL de la caméra.
+    :return: Empreinte (str).
+    """
+    description = json.dumps({
+        "camera": camera,
+        "shape": list(image_shape[:2]),
+        "real_coords": [list(map(float, point)) for point in real_coords],
+    }, sort_keys=True)
+    return hashlib.sha1(description.encode("utf-8")).hexdigest()
+
+
+def extract_patches(gray, screws, radius):
+    """
+    Découpe une vignette carrée de côté 2 * radius + 1 autour de chaque vis.
+    :return: Liste des vignettes, ou None si une vis est trop près du bord.
+    """
+    height, width = gray.shape[:2]
+    patches = []
+    for x, y in screws:
+        x, y = int(round(x)), int(round(y))
+        if not (radius <= x < width - radius and radius <= y < height - radius):
+            return None
+        patches.append(gray[y - radius:y + radius + 1, x - radius:x + radius + 1].copy())
+    return patches
+
+
+@timed("check_drift")
+def check_drift(frame, calibration, max_shift=3, min_score=0.8):
+    """
+    Vérifie que les vis sont toujours là où la calibration les attend, par
+    corrélation des vignettes dans une petite fenêtre autour de chaque vis.
+    :param frame: Frame de l'image courante.
+    :param calibration: Calibration à contrôler.
+    :param max_shift: Décalage maximal toléré (pixels).
+    :param min_score: Score de corrélation normalisée minimal.
+    :return: True si la calibration est toujours valable.
+    """
+    gray = frame.gray
+    height, width = gray.shape[:2]
+    for (x, y), patch in zip(calibration.screws, calibration.patches):
+        radius = patch.shape[0] // 2
+        # Fenêtre de recherche : la vignette plus une marge de 2 * max_shift + 1 positions
+        margin = radius + max_shift + 1
+        if not (margin <= x < width - margin and margin <= y < height - margin):
+            return False
+        window = gray[y - margin:y + margin + 1, x - margin:x + margin + 1]
+        scores = cv2.matchTemplate(window, patch, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (dx, dy) = cv2.minMaxLoc(scores)
+        shift = max(abs(dx - max_shift - 1), abs(dy - max_shift - 1))
+        if score < min_score or shift > max_shift:
+            print(f"Dérive détectée sur la vis {(x, y)} : score {score:.2f}, décalage {shift} px")
+            return False
+    return True
+
+
+@timed("calibrate")
+def calibrate(frame, real_coords, key, patch_radius=16, annotated_path=None, rois=None):
+    """
+    Calibration complète : détection des vis puis calcul de l'homographie.
+    :param rois: Positions attendues des vis (détection rapide), ex. calibration précédente.
+    :return: Calibration ou None si les vis ne sont pas détectées.
+    """
+    # Centres sous-pixel : homographie plus précise
+    screws = detect_screws(frame, annotated_path, rois=rois, subpixel=True)
+    if not screws or len(screws) < 4:
+        print("Échec de la détection des vis ou vis insuffisantes détectées.")
+        return None
+    screws = order_screws(screws)
+    matrix = compute_pixel_to_mm_transformation(screws, real_coords)
+    patches = extract_patches(frame.gray, screws, patch_radius)
+    if patches is None:
+        print("Vis trop proches du bord de l'image : calibration non mémorisée.")
+        patches = []
+    return Calibration(key, screws, real_coords, matrix, patches)
+
+
+@memoize("homography", bypass="force", annotated=None)
+@timed("get_calibration")
+def get_calibration(image, real_coords, path=CALIBRATION_PATH, force=False, annotated_path=None):
+    """
+    Retourne la calibration pixel -> mm en réutilisant celle du disque tant que
+    le contrôle de dérive la valide ; sinon les vis sont redétectées. Pour une
+    image inchangée, la calibration est reprise du cache de vision sans contrôle.
+    :param image: Chemin, image décodée ou Frame.
+    :param real_coords: Coordonnées réelles des vis (mm), dans l'ordre de order_screws.
+    :param path: Fichier de la calibration mémorisée.
+    :param force: Ignorer la calibration mémorisée.
+    :param annotated_path: Image annotée des vis en cas de redétection (None : aucune).
+    :return: Calibration ou None.
+    """
+    frame = Frame.load(image)
+    if frame is None:
+        print("Erreur : Impossible de charger l'image.")
+        return None
+
+    key = calibration_key(frame.shape, real_coords)
+    calibration = Calibration.load(key, path)
+    if not force:
+        if calibration is not None and calibration.patches and check_drift(
+            frame, calibration,
+            CALIBRATION_CONFIG.get("max_shift", 3), CALIBRATION_CONFIG.get("min_score", 0.8)
+        ):
+            print("Calibration mémorisée réutilisée.")
+            return calibration
+
+    print("Calibration : détection des vis...")
+    # Les vis ont peu bougé : la calibration précédente sert de régions d'intérêt
+    rois = calibration.screws if calibration is not None else None
+    calibration = calibrate(
+        frame, real_coords, key, CALIBRATION_CONFIG.get("patch_radius", 16), annotated_path, rois
+    )
+    if calibration is not None and calibration.patches:
+        calibration.save(path)
+    return calibration
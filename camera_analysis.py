@@ -1,54 +1,210 @@
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import cv2
 import numpy as np
 import requests
-from api import CONFIG
+from api import CLIENT
+from frame import Frame
+from metrics import timed
+from settings import CONFIG
+from vision_cache import memoize
 # GLOBAL VAR
-SNAPSHOT_URL = CONFIG.get("url", "").rstrip("/") + "/webcam/?action=snapshot"
+SNAPSHOT_PATH = "/webcam/?action=snapshot"
+SNAPSHOT_URL = CONFIG.get("url", "").rstrip("/") + SNAPSHOT_PATH
+SCREWS_CONFIG = CONFIG.get("screws", {})
+CORNERS_CONFIG = CONFIG.get("corners", {})
+PARTS_CONFIG = CONFIG.get("parts", {})
+# Paramètres des détecteurs, réglables dans la configuration (voir tuner.py)
+# Vis : flou médian puis HoughCircles (rayon de 4 à 10 px à pleine résolution)
+SCREW_PARAMS = {
+    "ksize": 5, "dp": 1.2, "minDist": 200, "param1": 60, "param2": 16, "minRadius": 4, "maxRadius": 10,
+    **SCREWS_CONFIG.get("params", {})
+}
+# Coins : flou gaussien, Canny puis approximation polygonale (epsilon en fraction du périmètre) ;
+# contour complet : lissage de outline_epsilon pixels seulement
+CORNER_PARAMS = {
+    "ksize": 5, "threshold1": 50, "threshold2": 150, "epsilon": 0.02, "outline_epsilon": 1.0,
+    **CORNERS_CONFIG.get("params", {})
+}
+
+# Tampon de réception réutilisé d'une capture à l'autre (un par thread)
+_BUFFERS = threading.local()
+# Écritures d'audit sur disque, hors du chemin critique
+_WRITER = ThreadPoolExecutor(max_workers=1, thread_name_prefix="snapshot-writer")
+
+
+def _hough_screws(plane, params, **overrides):
+    hough = {key: value for key, value in params.items() if key != "ksize"}
+    circles = cv2.HoughCircles(plane, cv2.HOUGH_GRADIENT, **{**hough, **overrides})
+    return [] if circles is None else [tuple(map(float, circle[:3])) for circle in circles[0]]
+
+
+def screw_candidates(frame, level=1, param2=8, params=SCREW_PARAMS):
+    """
+    Passe grossière : cercles cherchés sur l'image égalisée réduite par la pyramide.
+    Le seuil est volontairement bas, les faux positifs sont écartés à pleine résolution.
+    :param frame: Frame de l'image.
+    :param level: Niveau de la pyramide (chaque niveau divise la taille par 2).
+    :param param2: Seuil de l'accumulateur de Hough sur l'image réduite.
+    :param params: Paramètres de détection des vis à pleine résolution.
+    :return: Centres candidats en pixels pleine résolution [(x, y), ...].
+    """
+    scale = 2 ** level
+    circles = _hough_screws(
+        frame.pyramid(level), params, dp=1, minDist=params["minDist"] / (2 * scale), param2=param2,
+        minRadius=max(1, params["minRadius"] // scale),
+        maxRadius=-(-params["maxRadius"] // scale)
+    )
+    return [(int(round(x * scale)), int(round(y * scale))) for x, y, _ in circles]
+
+
+def refine_circle(plane, x, y, r, param1=SCREW_PARAMS["param1"]):
+    """
+    Affinage sous-pixel du centre : cercle ajusté aux moindres carrés sur les
+    contours de Canny proches du cercle trouvé par Hough.
+    :param plane: Image floutée (niveaux de gris) contenant le cercle.
+    :param param1: Seuil haut de Canny (celui de HoughCircles).
+    :return: Centre (x, y) affiné, ou inchangé si l'ajustement n'est pas fiable.
+    """
+    edges = cv2.Canny(plane, param1 // 2, param1)
+    ys, xs = np.nonzero(edges)
+    keep = np.abs(np.hypot(xs - x, ys - y) - r) <= max(2.0, 0.3 * r)
+    if np.count_nonzero(keep) < 8:
+        return x, y
+    xs, ys = xs[keep].astype(np.float64), ys[keep].astype(np.float64)
+    # x² + y² + D x + E y + F = 0
+    system = np.column_stack([xs, ys, np.ones_like(xs)])
+    (d, e, _), *_ = np.linalg.lstsq(system, -(xs ** 2 + ys ** 2), rcond=None)
+    cx, cy = -d / 2, -e / 2
+    if np.hypot(cx - x, cy - y) > r / 2:
+        return x, y
+    return float(cx), float(cy)
+
+
+def _search_roi(frame, x, y, radius, params):
+    """
+    Cherche une vis dans la fenêtre carrée centrée sur (x, y), à pleine résolution.
+    :return: Cercle (x, y, r) affiné en coordonnées image, ou None.
+    """
+    height, width = frame.shape[:2]
+    x0, y0 = max(0, x - radius), max(0, y - radius)
+    x1, y1 = min(width, x + radius + 1), min(height, y + radius + 1)
+    if x1 - x0 <= 2 * params["minRadius"] or y1 - y0 <= 2 * params["minRadius"]:
+        return None
+    # Le flou médian de l'image entière coûte moins que quatre flous de fenêtres
+    # (coût fixe élevé de medianBlur), et il est mémorisé par le Frame
+    blurred = np.ascontiguousarray(frame.median(params["ksize"])[y0:y1, x0:x1])
+
+    circles = _hough_screws(blurred, params)
+    if not circles:
+        return None
+    cx, cy, r = circles[0]
+    cx, cy = refine_circle(blurred, cx, cy, r, params["param1"])
+    return cx + x0, cy + y0, r
+
+
+def _select_screws(circles, max_radius, count=4):
+    """
+    Écarte les doublons (fenêtres qui se recouvrent) ; s'il reste plus de count
+    cercles, les vis sont celles qui délimitent le plus grand quadrilatère
+    (elles sont aux coins du plateau).
+    """
+    kept = []
+    for circle in circles:
+        if all(np.hypot(circle[0] - k[0], circle[1] - k[1]) > 2 * max_radius for k in kept):
+            kept.append(circle)
+    if len(kept) <= count:
+        return kept
+    return list(max(
+        itertools.combinations(kept, count),
+        key=lambda group: cv2.contourArea(cv2.convexHull(np.float32([c[:2] for c in group])))
+    ))
+
+
+def detect_screws_fast(frame, rois=None, roi_radius=24, level=1, coarse_param2=8, params=SCREW_PARAMS):
+    """
+    Détection rapide : recherche à pleine résolution limitée à de petites fenêtres,
+    centrées sur les positions attendues (rois) ou sur les candidats de la passe
+    grossière, puis affinage sous-pixel.
+    :param frame: Frame de l'image.
+    :param rois: Centres attendus des vis [(x, y), ...] ; None : passe grossière.
+    :param roi_radius: Demi-côté (pixels) des fenêtres de recherche.
+    :param level: Niveau de pyramide de la passe grossière.
+    :param coarse_param2: Seuil de l'accumulateur de la passe grossière.
+    :param params: Paramètres de détection des vis (voir SCREW_PARAMS).
+    :return: Cercles (x, y, r) en flottants.
+    """
+    centers = rois if rois else screw_candidates(frame, level, coarse_param2, params)
+    circles = []
+    for x, y in centers:
+        circle = _search_roi(frame, int(round(x)), int(round(y)), roi_radius, params)
+        if circle is not None:
+            circles.append(circle)
+    return _select_screws(circles, params["maxRadius"])
 
 
-def detect_screws(image_path, annotated_path="img/screws_detected.jpg"):
+@memoize("screws")
+@timed("detect_screws")
+def detect_screws(image, annotated_path="img/screws_detected.jpg", mode=None, rois=None, subpixel=False,
+                  params=None):
     """
     Détecte les vis (cercles) sur l'image et sauvegarde une copie annotée.
-    :param image_path: Chemin vers l'image capturée.
-    :param annotated_path: Chemin pour sauvegarder l'image annotée.
+    :param image: Chemin vers l'image capturée, image déjà décodée ou Frame.
+    :param annotated_path: Chemin pour sauvegarder l'image annotée (None : pas d'annotation).
+    :param mode: "fast" (fenêtres autour des vis puis affinage) ou "full" (image entière) ;
+                 par défaut screws.mode de la configuration.
+    :param rois: Centres attendus des vis pour le mode rapide ; par défaut screws.rois.
+    :param subpixel: Retourner les centres affinés en flottants (mode rapide).
+    :param params: Paramètres remplaçant ceux de SCREW_PARAMS (ksize, dp, minDist, param1, param2,
+                   minRadius, maxRadius).
     :return: Liste des coordonnées des vis détectées (X, Y).
     """
+    params = {**SCREW_PARAMS, **(params or {})}
     try:
         # Charger l'image
-        image = cv2.imread(image_path)
-        if image is None:
+        frame = Frame.load(image)
+        if frame is None:
             print("Erreur : Impossible de charger l'image.")
             return None
 
-        # Convertir en niveaux de gris
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-
-        # Augmenter le contraste avec l'égalisation d'histogramme
-        gray = cv2.equalizeHist(gray)
+        circles = None
+        mode = mode or SCREWS_CONFIG.get("mode", "full")
+        if mode == "fast":
+            fast = detect_screws_fast(
+                frame, rois if rois is not None else SCREWS_CONFIG.get("rois"),
+                SCREWS_CONFIG.get("roi_radius", 24), SCREWS_CONFIG.get("pyramid_level", 1),
+                SCREWS_CONFIG.get("coarse_param2", 8), params
+            )
+            if len(fast) >= 4 or not SCREWS_CONFIG.get("fallback", True):
+                circles = fast
+                screw_coordinates = [
+                    (x, y) if subpixel else (int(round(x)), int(round(y))) for x, y, _ in circles
+                ]
+            else:
+                print("Détection rapide incomplète, recherche sur l'image entière.")
 
-        # Appliquer un flou pour réduire le bruit
-        blurred = cv2.medianBlur(gray, 5)
+        if circles is None:
+            # Niveaux de gris égalisés puis flou médian (plans partagés via Frame)
+            blurred = frame.median(params["ksize"])
 
-        # Détection des cercles avec la transformation de Hough
-        circles = cv2.HoughCircles(
-            blurred, cv2.HOUGH_GRADIENT, dp=1.2, minDist=200,
-            param1=60, param2=16, minRadius=4, maxRadius=10
-        )
+            # Détection des cercles avec la transformation de Hough
+            circles = np.round(_hough_screws(blurred, params)).astype("int")
+            screw_coordinates = [(x, y) for (x, y, r) in circles]
 
-        # Annoter l'image avec les cercles détectés
-        annotated_image = image.copy()
-        screw_coordinates = []
-        if circles is not None:
-            circles = np.round(circles[0, :]).astype("int")
+        if annotated_path:
+            # Annoter l'image avec les cercles détectés
+            annotated_image = frame.image.copy()
             for (x, y, r) in circles:
+                center = (int(round(x)), int(round(y)))
                 # Dessiner le cercle et son centre
-                cv2.circle(annotated_image, (x, y), r, (255, 0, 0), 4)  # Cercle bleu
-                cv2.circle(annotated_image, (x, y), 2, (0, 255, 0), 3)  # Centre vert
-                screw_coordinates.append((x, y))
+                cv2.circle(annotated_image, center, int(round(r)), (255, 0, 0), 4)  # Cercle bleu
+                cv2.circle(annotated_image, center, 2, (0, 255, 0), 3)  # Centre vert
 
-        # Sauvegarder l'image annotée
-        cv2.imwrite(annotated_path, annotated_image)
-        print(f"Image annotée avec les vis détectées sauvegardée sous : {annotated_path}")
+            # Sauvegarder l'image annotée
+            cv2.imwrite(annotated_path, annotated_image)
+            print(f"Image annotée avec les vis détectées sauvegardée sous : {annotated_path}")
         print(f"Vis détectées : {screw_coordinates}")
         return screw_coordinates
     except Exception as e:
@@ -56,48 +212,132 @@ def detect_screws(image_path, annotated_path="img/screws_detected.jpg"):
         return None
 
 
-def capture_image(save_path="img/snapshot.jpg"):
+@timed("capture", mode="file")
+def capture_image(save_path="img/snapshot.jpg", client=None):
     """
     Capture une image de la caméra connectée à OctoPrint.
     :param save_path: Chemin pour sauvegarder l'image.
+    :param client: OctoPrintClient à utiliser (client global par défaut).
     """
     try:
-        response = requests.get(SNAPSHOT_URL, stream=True)
-        if response.status_code == 200:
-            with open(save_path, "wb") as file:
-                for chunk in response.iter_content(1024):
-                    file.write(chunk)
-            print(f"Image capturée et sauvegardée sous : {save_path}")
-            return save_path
-        else:
-            print(f"Erreur lors de la capture de l'image. Code : {response.status_code}")
-            return None
+        with (client or CLIENT).get(SNAPSHOT_PATH, stream=True) as response:
+            if response.status_code == 200:
+                with open(save_path, "wb") as file:
+                    for chunk in response.iter_content(1024):
+                        file.write(chunk)
+                print(f"Image capturée et sauvegardée sous : {save_path}")
+                return save_path
+            else:
+                print(f"Erreur lors de la capture de l'image. Code : {response.status_code}")
+                return None
+    except requests.RequestException as e:
+        print(f"Erreur lors de la requête à la caméra : {e}")
+        return None
+
+def _write_snapshot(save_path, data):
+    try:
+        with open(save_path, "wb") as file:
+            file.write(data)
+    except OSError as e:
+        print(f"Erreur lors de l'écriture de la capture {save_path} : {e}")
+
+
+def _read_into_buffer(response):
+    """
+    Lit le corps de la réponse dans le tampon du thread, agrandi si nécessaire.
+    :return: Vue mémoire sur les octets reçus.
+    """
+    expected = int(response.headers.get("Content-Length") or 0)
+    buffer = getattr(_BUFFERS, "data", None)
+    if buffer is None or len(buffer) < expected:
+        buffer = bytearray(max(expected, 1 << 18))
+    size = 0
+    while True:
+        if size == len(buffer):
+            buffer.extend(bytes(len(buffer)))
+        read = response.raw.readinto(memoryview(buffer)[size:])
+        if not read:
+            break
+        size += read
+    _BUFFERS.data = buffer
+    return memoryview(buffer)[:size]
+
+
+@timed("capture", mode="memory")
+def capture_frame(save_path=None, client=None):
+    """
+    Capture une image de la caméra et la décode directement en mémoire, sans
+    passer par le disque.
+    :param save_path: Chemin où écrire le JPEG reçu en tâche de fond (audit), optionnel.
+    :param client: OctoPrintClient à utiliser (client global par défaut).
+    :return: Image BGR (numpy.ndarray) ou None.
+    """
+    try:
+        with (client or CLIENT).get(SNAPSHOT_PATH, stream=True) as response:
+            if response.status_code != 200:
+                print(f"Erreur lors de la capture de l'image. Code : {response.status_code}")
+                return None
+            data = _read_into_buffer(response)
     except requests.RequestException as e:
         print(f"Erreur lors de la requête à la caméra : {e}")
         return None
 
-def analyze_image(image_path, annotated_path="img/annotated_image.jpg"):
+    frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        print("Erreur : Impossible de décoder l'image capturée.")
+        return None
+    if save_path:
+        # Copie : le tampon sera réutilisé par la prochaine capture
+        _WRITER.submit(_write_snapshot, save_path, bytes(data))
+    return frame
+
+@timed("grab_frame")
+def grab_frame(save_path=None, reader=None, after=None, timeout=5.0):
+    """
+    Récupère une image récente : sur le flux MJPEG si un lecteur est fourni,
+    sinon par une capture ponctuelle.
+    :param save_path: Chemin où écrire le JPEG en tâche de fond (audit), optionnel.
+    :param reader: MJPEGStreamReader démarré, ou None.
+    :param after: Instant (time.monotonic) après lequel l'image doit avoir été reçue.
+    :param timeout: Attente maximale (s) d'une image sur le flux.
+    :return: Image BGR (numpy.ndarray) ou None.
+    """
+    if reader is None:
+        return capture_frame(save_path)
+    frame = reader.frame_after(after, timeout) if after is not None else reader.latest(timeout)
+    if frame is None:
+        print("Aucune image reçue sur le flux, capture ponctuelle.")
+        return capture_frame(save_path)
+    if save_path:
+        _WRITER.submit(_write_snapshot, save_path, frame.data)
+    return frame.image
+
+def _approx_corners(contour, epsilon=CORNER_PARAMS["epsilon"]):
+    # Approximation polygonale pour détecter les coins
+    approx = cv2.approxPolyDP(contour, epsilon * cv2.arcLength(contour, True), True)
+    return [(int(point[0][0]), int(point[0][1])) for point in approx]
+
+
+@memoize("corners")
+@timed("detect_corners")
+def analyze_image(image, annotated_path="img/annotated_image.jpg", params=None):
     """
     Analyse l'image pour détecter les coins et sauvegarde une copie annotée.
-    :param image_path: Chemin vers l'image capturée.
-    :param annotated_path: Chemin pour sauvegarder l'image annotée.
+    :param image: Chemin vers l'image capturée, image déjà décodée ou Frame.
+    :param annotated_path: Chemin pour sauvegarder l'image annotée (None : pas d'annotation).
+    :param params: Paramètres remplaçant ceux de CORNER_PARAMS (ksize, threshold1, threshold2, epsilon).
     :return: Liste des coordonnées des coins (X, Y).
     """
+    params = {**CORNER_PARAMS, **(params or {})}
     try:
         # Charger l'image
-        image = cv2.imread(image_path)
-        if image is None:
+        frame = Frame.load(image)
+        if frame is None:
             print("Erreur : Impossible de charger l'image.")
             return None
 
-        # Convertir en niveaux de gris pour le traitement
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-
-        # Appliquer un flou pour réduire le bruit
-        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-
-        # Détection des bords avec Canny
-        edges = cv2.Canny(blurred, 50, 150)
+        # Niveaux de gris, flou gaussien puis détection des bords avec Canny
+        edges = frame.edges(params["threshold1"], params["threshold2"], params["ksize"])
 
         # Trouver les contours
         contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
@@ -105,30 +345,120 @@ def analyze_image(image_path, annotated_path="img/annotated_image.jpg"):
         # Trouver le plus grand contour (supposé être la pièce)
         largest_contour = max(contours, key=cv2.contourArea)
 
-        # Approximations polygonales pour détecter les coins
-        epsilon = 0.02 * cv2.arcLength(largest_contour, True)
-        approx = cv2.approxPolyDP(largest_contour, epsilon, True)
-
         # Extraire les coordonnées des coins
-        corners = [(int(point[0][0]), int(point[0][1])) for point in approx]
-
-        # Annoter l'image avec des points rouges aux coins détectés
-        annotated_image = image.copy()
-        for idx, (x, y) in enumerate(corners):
-            # Dessiner un cercle rouge à chaque coin
-            cv2.circle(annotated_image, (x, y), 10, (0, 0, 255), -1)  # Point rouge
-            # Ajouter la numérotation des coins
-            cv2.putText(
-                annotated_image, str(idx + 1), (x + 15, y - 15),  # Position du texte
-                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2  # Style du texte
-            )
+        corners = _approx_corners(largest_contour, params["epsilon"])
 
-        # Sauvegarder l'image annotée
-        cv2.imwrite(annotated_path, annotated_image)
-        print(f"Image annotée sauvegardée sous : {annotated_path}")
+        if annotated_path:
+            # Annoter l'image avec des points rouges aux coins détectés
+            annotated_image = frame.image.copy()
+            for idx, (x, y) in enumerate(corners):
+                # Dessiner un cercle rouge à chaque coin
+                cv2.circle(annotated_image, (x, y), 10, (0, 0, 255), -1)  # Point rouge
+                # Ajouter la numérotation des coins
+                cv2.putText(
+                    annotated_image, str(idx + 1), (x + 15, y - 15),  # Position du texte
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2  # Style du texte
+                )
+
+            # Sauvegarder l'image annotée
+            cv2.imwrite(annotated_path, annotated_image)
+            print(f"Image annotée sauvegardée sous : {annotated_path}")
 
         print(f"Coins détectés : {corners}")
         return corners
     except Exception as e:
         print(f"Erreur lors de l'analyse de l'image : {e}")
-        return None
\ No newline at end of file
+        return None
+
+@memoize("outline")
+@timed("detect_outline")
+def detect_outline(image, annotated_path="img/outline_detected.jpg", params=None):
+    """
+    Détecte le contour complet de l'objet (plus grand contour), sans le réduire à ses coins :
+    le contour brut est seulement lissé de outline_epsilon pixels (escaliers de pixels),
+    les courbes sont conservées pour le tracé en arcs (voir toolpath.py).
+    :param image: Chemin vers l'image capturée, image déjà décodée ou Frame.
+    :param annotated_path: Chemin pour sauvegarder l'image annotée (None : pas d'annotation).
+    :param params: Paramètres remplaçant ceux de CORNER_PARAMS (ksize, threshold1, threshold2, outline_epsilon).
+    :return: Liste des points (X, Y) du contour, en pixels.
+    """
+    params = {**CORNER_PARAMS, **(params or {})}
+    try:
+        frame = Frame.load(image)
+        if frame is None:
+            print("Erreur : Impossible de charger l'image.")
+            return None
+
+        edges = frame.edges(params["threshold1"], params["threshold2"], params["ksize"])
+        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
+        largest_contour = max(contours, key=cv2.contourArea)
+        outline = cv2.approxPolyDP(largest_contour, params["outline_epsilon"], True)
+        points = [(int(point[0][0]), int(point[0][1])) for point in outline]
+
+        if annotated_path:
+            annotated_image = frame.image.copy()
+            cv2.polylines(annotated_image, [np.int32(points)], True, (0, 0, 255), 2)
+            cv2.imwrite(annotated_path, annotated_image)
+            print(f"Image annotée avec le contour détecté sauvegardée sous : {annotated_path}")
+
+        print(f"Contour détecté : {len(points)} points")
+        return points
+    except Exception as e:
+        print(f"Erreur lors de la détection du contour : {e}")
+        return None
+
+@memoize("parts")
+@timed("detect_parts")
+def detect_parts(image, min_area=None, corners=None, annotated_path="img/parts_detected.jpg", params=None):
+    """
+    Détecte toutes les pièces posées sur le plateau en une seule analyse.
+    :param image: Chemin vers l'image capturée, image déjà décodée ou Frame.
+    :param min_area: Aire minimale (pixels²) d'un contour de pièce ; par défaut parts.min_area.
+    :param corners: Nombre de coins attendu (None : tous les polygones sont gardés) ;
+                    par défaut parts.corners.
+    :param annotated_path: Chemin pour sauvegarder l'image annotée (None : pas d'annotation).
+    :param params: Paramètres remplaçant ceux de CORNER_PARAMS.
+    :return: Liste des pièces, chacune étant la liste de ses coins (X, Y), de la plus grande à la plus petite.
+    """
+    params = {**CORNER_PARAMS, **(params or {})}
+    try:
+        frame = Frame.load(image)
+        if frame is None:
+            print("Erreur : Impossible de charger l'image.")
+            return None
+        if min_area is None:
+            min_area = PARTS_CONFIG.get("min_area", 2000)
+        if corners is None:
+            corners = PARTS_CONFIG.get("corners", 4)
+
+        edges = frame.edges(params["threshold1"], params["threshold2"], params["ksize"])
+        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        contours = sorted(
+            (c for c in contours if cv2.contourArea(c) >= min_area), key=cv2.contourArea, reverse=True
+        )
+
+        parts = []
+        for contour in contours:
+            part = _approx_corners(contour, params["epsilon"])
+            if corners and len(part) != corners:
+                print(f"Contour ignoré : {len(part)} coins au lieu de {corners}")
+                continue
+            parts.append(part)
+
+        if annotated_path:
+            annotated_image = frame.image.copy()
+            for number, part in enumerate(parts):
+                cv2.polylines(annotated_image, [np.int32(part)], True, (0, 0, 255), 2)
+                x, y = part[0]
+                cv2.putText(
+                    annotated_image, str(number + 1), (x + 15, y - 15),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2
+                )
+            cv2.imwrite(annotated_path, annotated_image)
+            print(f"Image annotée avec les pièces détectées sauvegardée sous : {annotated_path}")
+
+        print(f"Pièces détectées : {len(parts)}")
+        return parts
+    except Exception as e:
+        print(f"Erreur lors de la détection des pièces : {e}")
+        return None
@@ -0,0 +1,142 @@
+import argparse
+import sys
+
+# Les sous-commandes importent leurs modules à l'exécution : envoyer une commande
+# ne charge ni OpenCV ni NumPy (voir bench_startup.py pour le budget de démarrage).
+
+
+def cmd_send(args):
+    from api import send_gcode_command, send_gcode_commands
+
+    if len(args.commands) == 1:
+        return 0 if send_gcode_command(args.commands[0]) else 1
+    return 0 if send_gcode_commands(args.commands) else 1
+
+
+def cmd_state(args):
+    from api import get_printer_state
+
+    print(get_printer_state())
+    return 0
+
+
+def cmd_connect(args):
+    from api import connect_printer, is_printer_connected
+
+    connect_printer()
+    return 0 if is_printer_connected() else 1
+
+
+def cmd_files(args):
+    from print_job import list_gcode_files
+
+    for name in list_gcode_files():
+        print(name)
+    return 0
+
+
+def cmd_file(args):
+    if args.upload:
+        from print_job import upload_and_print, wait_for_job
+
+        if not upload_and_print(args.path):
+            return 1
+        if args.wait:
+            wait_for_job()
+        return 0
+    from api import send_gcode_file
+
+    return 0 if send_gcode_file(args.path) else 1
+
+
+def cmd_estimate(args):
+    from gcode_sim import Kinematics, simulate
+    from settings import CONFIG
+
+    simulate(args.path, Kinematics.from_config(CONFIG.get("kinematics", {}))).summary()
+    return 0
+
+
+def cmd_analyze(args):
+    import main
+
+    if args.tray:
+        main.analyze_tray_and_print()
+    else:
+        main.analyze_object_and_move()
+    return 0
+
+
+def cmd_batch(args):
+    from batch import load_job, run_batch
+
+    parts, _ = run_batch(load_job(args.job))
+    return 0 if all(part.get("error") is None for part in parts) else 1
+
+
+def cmd_pe(args):
+    from pe import pe_program
+    from print_job import wait_for_job
+
+    runs = pe_program(mode=args.mode, pause=args.pause if args.pause is not None else True,
+                      randomize=args.randomize, replicates=args.replicates, seed=args.seed)
+    if runs is None:
+        return 1
+    if args.mode == "upload" and args.wait:
+        wait_for_job()
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Pilotage OctoPrint en ligne de commande")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("send", help="Envoyer une ou plusieurs commandes G-code")
+    command.add_argument("commands", nargs="+", help="Commandes G-code (ex. \"G28\" \"G1 X10 F3000\")")
+    command.set_defaults(func=cmd_send)
+
+    command = commands.add_parser("state", help="Afficher l'état de l'imprimante")
+    command.set_defaults(func=cmd_state)
+
+    command = commands.add_parser("connect", help="Connecter l'imprimante")
+    command.set_defaults(func=cmd_connect)
+
+    command = commands.add_parser("files", help="Lister les fichiers G-code du dossier configuré")
+    command.set_defaults(func=cmd_files)
+
+    command = commands.add_parser("file", help="Envoyer un fichier G-code")
+    command.add_argument("path")
+    command.add_argument("--upload", action="store_true", help="Téléverser et imprimer plutôt que diffuser")
+    command.add_argument("--wait", action="store_true", help="Suivre l'impression jusqu'à sa fin")
+    command.set_defaults(func=cmd_file)
+
+    command = commands.add_parser("estimate", help="Estimer la durée d'un fichier G-code")
+    command.add_argument("path")
+    command.set_defaults(func=cmd_estimate)
+
+    command = commands.add_parser("analyze", help="Analyser l'objet et déplacer la buse (interactif)")
+    command.add_argument("--tray", action="store_true", help="Toutes les pièces du plateau")
+    command.set_defaults(func=cmd_analyze)
+
+    command = commands.add_parser("batch", help="Traiter un fichier de travail sans intervention")
+    command.add_argument("job")
+    command.set_defaults(func=cmd_batch)
+
+    command = commands.add_parser("pe", help="Lancer la PE compilée en un seul programme")
+    command.add_argument("--mode", choices=["upload", "stream", "dry"], default="upload")
+    command.add_argument("--pause", type=float, default=None, help="Pause G4 entre deux essais (s), M0 par défaut")
+    command.add_argument("--randomize", action="store_true")
+    command.add_argument("--replicates", type=int, default=1)
+    command.add_argument("--seed", type=int, default=None)
+    command.add_argument("--wait", action="store_true", help="Suivre l'impression jusqu'à sa fin")
+    command.set_defaults(func=cmd_pe)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
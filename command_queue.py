@@ -0,0 +1,202 @@
+import collections
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import api
+from metrics import METRICS
+from settings import CONFIG
+
+QUEUE_CONFIG = CONFIG.get("queue", {})
+# Création des files par client (get_queue)
+_QUEUES_LOCK = threading.Lock()
+
+
+class CommandQueue:
+    """
+    File de commandes G-code côté client, vidée par un thread d'envoi.
+    Chaque commande reçoit un Future (True une fois acceptée par OctoPrint).
+    Les commandes en attente sont regroupées en lots, l'ordre est conservé et
+    une commande pas encore partie peut être annulée.
+    Contre-pression : submit bloque au-delà de high_water commandes en attente,
+    et l'envoi est suspendu tant qu'OctoPrint n'est pas Operational ou que
+    le firmware se déclare occupé (busy: processing).
+    """
+
+    def __init__(self, client, high_water=200, batch_size=50, max_bytes=4096, busy_hold=2.0,
+                 state_timeout=30.0, poll=0.1):
+        """
+        :param client: OctoPrintClient utilisé pour l'envoi.
+        :param high_water: Nombre maximal de commandes en attente avant blocage de submit.
+        :param batch_size: Nombre maximal de commandes par requête.
+        :param max_bytes: Taille maximale d'une requête en octets.
+        :param busy_hold: Durée (s) pendant laquelle un message busy du firmware suspend l'envoi.
+        :param state_timeout: Attente maximale (s) d'une imprimante disponible avant abandon.
+        :param poll: Intervalle (s) de vérification de l'état pendant une suspension.
+        """
+        self.client = client
+        self.high_water = high_water
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.busy_hold = busy_hold
+        self.state_timeout = state_timeout
+        self.poll = poll
+        self._pending = collections.deque()
+        self._in_flight = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._thread = threading.Thread(target=self._run, name="gcode-sender", daemon=True)
+        self._thread.start()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def submit(self, command, timeout=None):
+        """
+        Ajoute une commande à la file.
+        :param command: Commande G-code (str).
+        :param timeout: Attente maximale (s) d'une place dans la file (None : sans limite).
+        :return: Future de la commande.
+        """
+        return self.submit_many([command], timeout)[0]
+
+    def submit_many(self, commands, timeout=None):
+        """
+        Ajoute plusieurs commandes, dans l'ordre.
+        :raise queue.Full: si la file reste pleine au-delà de timeout.
+        :return: Liste des Future.
+        """
+        futures = []
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._changed:
+            for command in commands:
+                while len(self._pending) >= self.high_water and not self._closed:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise queue.Full(f"command queue above high-water mark ({self.high_water})")
+                    self._changed.wait(remaining)
+                if self._closed:
+                    raise RuntimeError("command queue is closed")
+                future = Future()
+                self._pending.append((command, future))
+                futures.append(future)
+            self._changed.notify_all()
+        return futures
+
+    def cancel_all(self):
+        """
+        Annule toutes les commandes qui ne sont pas encore parties.
+        :return: Nombre de commandes annulées.
+        """
+        with self._changed:
+            pending, self._pending = self._pending, collections.deque()
+            self._changed.notify_all()
+        return sum(future.cancel() for _, future in pending)
+
+    def flush(self, timeout=None):
+        """
+        Attend que toutes les commandes en file aient été envoyées.
+        :return: True si la file est vide, False si le délai a expiré.
+        """
+        with self._changed:
+            return self._changed.wait_for(lambda: not self._pending and not self._in_flight, timeout)
+
+    def close(self, cancel=False):
+        """
+        Arrête le thread d'envoi après avoir vidé la file (ou l'avoir annulée),
+        puis la détache du client : le prochain get_queue en crée une nouvelle.
+        """
+        if cancel:
+            self.cancel_all()
+        with self._changed:
+            self._closed = True
+            self._changed.notify_all()
+        self._thread.join()
+        with _QUEUES_LOCK:
+            if self.client.queue is self:
+                self.client.queue = None
+
+    def _ready(self):
+        # Imprimante prête : Operational et pas de message busy récent
+        cache = self.client.state
+        deadline = time.monotonic() + self.state_timeout
+        while True:
+            state = cache.get()
+            if state == "Operational" and not cache.is_busy(self.busy_hold):
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                print(f"Printer not ready after {self.state_timeout:.0f}s. Current state: {state}")
+                return False
+            cache.wait_for_update(min(self.poll, remaining))
+
+    def _take_batch(self):
+        # Commandes en tête de file dans la limite du lot ; les annulées sont sautées
+        batch, size = [], 0
+        with self._changed:
+            while self._pending and len(batch) < self.batch_size:
+                command, future = self._pending[0]
+                length = len(command.encode("utf-8")) + 4
+                if batch and size + length > self.max_bytes:
+                    break
+                self._pending.popleft()
+                if future.set_running_or_notify_cancel():
+                    batch.append((command, future))
+                    size += length
+            self._in_flight = len(batch)
+            self._changed.notify_all()
+        return batch
+
+    def _fail_pending(self):
+        # Après un échec, les commandes suivantes ne partent pas : l'ordre des mouvements primerait
+        with self._changed:
+            pending, self._pending = self._pending, collections.deque()
+            self._in_flight = 0
+            self._changed.notify_all()
+        for _, future in pending:
+            if future.set_running_or_notify_cancel():
+                future.set_result(False)
+
+    def _run(self):
+        while True:
+            with self._changed:
+                self._changed.wait_for(lambda: self._pending or self._closed)
+                if not self._pending:
+                    return
+            if not self._ready():
+                self._fail_pending()
+                continue
+            batch = self._take_batch()
+            if not batch:
+                continue
+            METRICS.count("command_queue_batches_total")
+            sent = api.post_gcode_commands([command for command, _ in batch], self.client)
+            for _, future in batch:
+                future.set_result(sent)
+            with self._changed:
+                self._in_flight = 0
+                self._changed.notify_all()
+            if not sent:
+                self._fail_pending()
+
+
+def get_queue(client):
+    """
+    File de commandes associée au client, créée au premier appel.
+    :param client: OctoPrintClient.
+    :return: CommandQueue
+    """
+    with _QUEUES_LOCK:
+        if client.queue is None:
+            client.queue = CommandQueue(
+                client,
+                high_water=QUEUE_CONFIG.get("high_water", 200),
+                batch_size=api.STREAM_CONFIG.get("batch_size", 50),
+                max_bytes=api.STREAM_CONFIG.get("max_bytes", 4096),
+                busy_hold=QUEUE_CONFIG.get("busy_hold", 2.0),
+                state_timeout=QUEUE_CONFIG.get("state_timeout", 30.0)
+            )
+        return client.queue
+
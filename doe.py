@@ -0,0 +1,247 @@
+import argparse
+import itertools
+import json
+import os
+import random
+
+import numpy as np
+
+from api import send_gcode_file
+from gcode_pipeline import format_number
+from gcode_sim import Kinematics, estimate_time
+from metrics import timed
+from print_job import upload_and_print
+from settings import CONFIG
+
+# GLOBAL VAR
+DOE_CONFIG = CONFIG.get("doe", {})
+# Zone de travail autorisée (mm), bornes exclues comme dans pe_verif (qui s'appuie sur check_work_area)
+WORK_AREA = {"x": [50, 250], "y": [10, 250], "z": [0, 200], **CONFIG.get("work_area", {})}
+PROGRAM_PATH = DOE_CONFIG.get("path", "gcode/pe_doe.gcode")
+
+# Initialisation de la machine, comme au début de pe()
+HEADER = ["G28", "M92 E4000 T0", "M83"]
+# Facteurs reconnus par le motif de la PE ; les autres sont seulement notés dans le plan
+PATTERN_FACTORS = ("feedrate", "extrusion", "z", "length", "temperature")
+# Valeurs des paramètres du motif qui ne sont pas des facteurs de l'expérience
+PATTERN_DEFAULTS = {"feedrate": 400, "extrusion": 0.75, "z": 0.2, "length": 50}
+
+
+def full_factorial(factors):
+    """
+    Plan factoriel complet en ordre standard (Yates : le premier facteur varie le plus vite).
+    :param factors: Dictionnaire {nom: [niveaux]}.
+    :return: Tableau (essais, facteurs) des indices de niveau.
+    """
+    sizes = [len(levels) for levels in factors.values()]
+    grid = itertools.product(*(range(size) for size in reversed(sizes)))
+    return np.array([combination[::-1] for combination in grid], dtype=np.int64).reshape(-1, len(sizes))
+
+
+def fractional_factorial(factors, generators):
+    """
+    Plan factoriel fractionnaire à deux niveaux : les facteurs générés sont
+    confondus avec une interaction des facteurs de base (ex. {"temperature": "feedrate*z"},
+    préfixe "-" pour la fraction complémentaire).
+    :param factors: Dictionnaire {nom: [niveau bas, niveau haut]}.
+    :param generators: Dictionnaire {facteur généré: "a*b*..."}.
+    :return: Tableau (essais, facteurs) des indices de niveau.
+    """
+    names = list(factors)
+    if any(len(levels) != 2 for levels in factors.values()):
+        raise ValueError("Un plan fractionnaire n'accepte que des facteurs à deux niveaux")
+    base = [name for name in names if name not in generators]
+    # Niveaux codés -1 / +1 des facteurs de base, en ordre standard
+    coded = {name: 2 * column - 1 for name, column in zip(base, full_factorial({n: factors[n] for n in base}).T)}
+    for name, generator in generators.items():
+        if name not in factors:
+            raise ValueError(f"Facteur généré inconnu : {name}")
+        sign = -1 if generator.startswith("-") else 1
+        terms = generator.lstrip("+-").split("*")
+        if any(term not in base for term in terms):
+            raise ValueError(f"Générateur invalide pour {name} : {generator}")
+        coded[name] = sign * np.prod([coded[term] for term in terms], axis=0)
+    return np.column_stack([(coded[name] + 1) // 2 for name in names])
+
+
+def build_design(factors, generators=None, replicates=1, randomize=True, seed=None):
+    """
+    Construit le plan d'expérience : essais répliqués et, au besoin, dans un ordre aléatoire.
+    :param factors: Dictionnaire {nom: [niveaux]}.
+    :param generators: Générateurs d'un plan fractionnaire (None : plan complet).
+    :param replicates: Nombre de répétitions de chaque essai.
+    :param randomize: Tirer l'ordre d'exécution au hasard.
+    :param seed: Graine du tirage.
+    :return: Liste d'essais {"run", "standard", "replicate", "levels", "values"} dans l'ordre d'exécution.
+    """
+    matrix = fractional_factorial(factors, generators) if generators else full_factorial(factors)
+    names = list(factors)
+    runs = [
+        {
+            "standard": standard + 1,
+            "replicate": replicate + 1,
+            "levels": dict(zip(names, map(int, row))),
+            "values": {name: factors[name][level] for name, level in zip(names, row)},
+        }
+        for replicate in range(replicates)
+        for standard, row in enumerate(matrix)
+    ]
+    if randomize:
+        random.Random(seed).shuffle(runs)
+    for index, run in enumerate(runs):
+        run["run"] = index + 1
+    return runs
+
+
+def pattern_moves(runs, start=(100, 15), step=(0, 10), travel_z=7, defaults=None):
+    """
+    Calcule en une passe les positions de tous les essais (motif de pe_pos et pe_col) :
+    placement à la hauteur z, segment extrudé, segment à vide puis dégagement.
+    Le i-ème essai exécuté est décalé de i * step.
+    :param runs: Essais de build_design.
+    :param start: Position (x, y) du premier essai (mm).
+    :param step: Décalage (x, y) entre deux essais (mm).
+    :param travel_z: Hauteur de dégagement en fin d'essai (mm).
+    :param defaults: Valeurs des paramètres qui ne sont pas des facteurs.
+    :return: (positions (essais, 4, 3), paramètres {nom: tableau par essai})
+    """
+    defaults = {**PATTERN_DEFAULTS, **(defaults or {})}
+    params = {
+        name: np.array([run["values"].get(name, defaults.get(name, np.nan)) for run in runs], dtype=np.float64)
+        for name in PATTERN_FACTORS
+    }
+    index = np.arange(len(runs))
+    x = start[0] + index * step[0]
+    y = start[1] + index * step[1]
+    length, z = params["length"], params["z"]
+
+    positions = np.empty((len(runs), 4, 3))
+    positions[:, :, 0] = x[:, None] + np.outer(length, [0, 1, 2, 2])
+    positions[:, :, 1] = y[:, None]
+    positions[:, :3, 2] = z[:, None]
+    positions[:, 3, 2] = travel_z
+    return positions, params
+
+
+def check_work_area(positions, area=None):
+    """
+    Vérifie tous les mouvements du programme contre la zone de travail, en une opération.
+    Les bornes sont exclues : un mouvement exactement sur une borne est refusé.
+    :param positions: Positions (essais, mouvements, 3) de pattern_moves.
+    :param area: Bornes {"x": [min, max], "y": ..., "z": ...} (WORK_AREA par défaut).
+    :return: True si tous les mouvements sont dans la zone, False sinon.
+    """
+    area = area or WORK_AREA
+    lower = np.array([area[axis][0] for axis in "xyz"])
+    upper = np.array([area[axis][1] for axis in "xyz"])
+    outside = (positions <= lower) | (positions >= upper)
+    if not outside.any():
+        return True
+    for run, move, axis in zip(*np.nonzero(outside)):
+        value = positions[run, move, axis]
+        print(f"Essai {run + 1}, mouvement {move + 1} : {'XYZ'[axis]}={value:.2f} mm "
+              f"en dehors de la zone de travail ]{lower[axis]:g}, {upper[axis]:g}[")
+    return False
+
+
+def experiment_program(runs, positions, params, travel_feedrate=2000, pause=None, header=True):
+    """
+    Écrit le programme G-code complet de l'expérience.
+    :param runs: Essais de build_design.
+    :param positions: Positions de pattern_moves.
+    :param params: Paramètres par essai de pattern_moves.
+    :param travel_feedrate: Vitesse des placements et dégagements (mm/min).
+    :param pause: Pause entre deux essais : durée (s) pour G4, True pour M0
+                  (attente d'une validation sur l'imprimante), None pour enchaîner.
+    :param header: Ajouter l'initialisation (prise d'origine, pas E, extrusion relative).
+    :return: Liste de commandes G-code.
+    """
+    def xyz(point):
+        return " ".join(f"{axis}{format_number(value)}" for axis, value in zip("XYZ", point))
+
+    extrusion = params["extrusion"] * params["length"]
+    commands = list(HEADER) if header else []
+    for i, run in enumerate(runs):
+        values = ", ".join(f"{name}={value}" for name, value in run["values"].items())
+        commands.append(f";RUN {run['run']} (standard {run['standard']}, replicate {run['replicate']}): {values}")
+        if not np.isnan(params["temperature"][i]):
+            commands.append(f"M109 S{format_number(params['temperature'][i])}")
+        feedrate = format_number(params["feedrate"][i])
+        start, extruded, dry, lift = positions[i]
+        commands.append(f"G1 {xyz(start)} F{travel_feedrate}")
+        commands.append(f"G1 {xyz(extruded)} E{format_number(extrusion[i])} F{feedrate}")
+        commands.append(f"G1 {xyz(dry)} F{feedrate}")
+        commands.append(f"G1 {xyz(lift)} F{travel_feedrate}")
+        if pause and i < len(runs) - 1:
+            commands.append("M0 Essai suivant" if pause is True else f"G4 S{format_number(pause)}")
+    return commands
+
+
+def write_program(commands, path=PROGRAM_PATH):
+    """
+    Enregistre le programme dans un fichier G-code.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as file:
+        file.write("\n".join(commands) + "\n")
+    return path
+
+
+@timed("experiment")
+def run_experiment(factors, generators=None, replicates=1, randomize=True, seed=None, mode="upload",
+                   path=PROGRAM_PATH, start=(100, 15), step=(0, 10), travel_z=7, pause=None, defaults=None,
+                   area=None, client=None):
+    """
+    Génère, vérifie et envoie en une fois le programme d'un plan d'expérience.
+    :param factors: Dictionnaire {nom: [niveaux]} ; feedrate, extrusion, z, length et
+                    temperature pilotent le motif, les autres facteurs sont seulement notés.
+    :param mode: "upload" (téléversement puis impression), "stream" (envoi par lots)
+                 ou "dry" (programme écrit sans envoi).
+    :param path: Fichier G-code généré.
+    :param client: OctoPrintClient à utiliser (client global par défaut).
+    :return: Essais exécutés (liste), ou None si le programme sort de la zone de travail
+             ou n'a pas pu être envoyé.
+    """
+    runs = build_design(factors, generators, replicates, randomize, seed)
+    positions, params = pattern_moves(runs, start, step, travel_z, defaults)
+    if not check_work_area(positions, area):
+        return None
+
+    commands = experiment_program(runs, positions, params, pause=pause)
+    write_program(commands, path)
+    duration = estimate_time(commands, Kinematics.from_config(CONFIG.get("kinematics", {})))
+    print(f"{len(runs)} essais, {len(commands)} commandes, durée estimée {duration / 60:.1f} min -> {path}")
+
+    for run, position in zip(runs, positions):
+        run["x"], run["y"] = float(position[0, 0]), float(position[0, 1])
+    if mode == "upload":
+        if not upload_and_print(path, client=client):
+            return None
+    elif mode == "stream":
+        if send_gcode_file(path, client=client) == 0:
+            return None
+    return runs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plan d'expérience compilé en un seul programme G-code")
+    parser.add_argument("factors", help='Facteurs en JSON, ex. \'{"feedrate": [200, 600], "z": [0.1, 1]}\'')
+    parser.add_argument("--generators", help='Plan fractionnaire, ex. \'{"temperature": "feedrate*z"}\'')
+    parser.add_argument("--replicates", type=int, default=1)
+    parser.add_argument("--no-randomize", action="store_true", help="Ordre standard")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--mode", choices=["upload", "stream", "dry"], default="dry")
+    parser.add_argument("--pause", type=float, default=None, help="Pause G4 entre deux essais (s)")
+    parser.add_argument("--wait", action="store_true", help="Attente M0 entre deux essais")
+    parser.add_argument("--output", default=PROGRAM_PATH)
+    parser.add_argument("--design", help="Fichier JSON où écrire le plan exécuté")
+    args = parser.parse_args()
+
+    runs = run_experiment(
+        json.loads(args.factors), json.loads(args.generators) if args.generators else None,
+        args.replicates, not args.no_randomize, args.seed, args.mode, args.output,
+        pause=True if args.wait else args.pause
+    )
+    if runs and args.design:
+        with open(args.design, "w") as design_file:
+            json.dump(runs, design_file, indent=4)
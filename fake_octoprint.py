@@ -0,0 +1,264 @@
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+# Image renvoyée par /webcam/?action=snapshot
+SNAPSHOT_FILE = "snapshot.jpg"
+
+
+class FakeOctoPrint:
+    """
+    Serveur HTTP imitant les routes d'OctoPrint utilisées par api.py et print_job.py,
+    avec latence, gigue et injection d'erreurs configurables. Sans dépendance :
+    permet de mesurer le transport hors ligne.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, error_rate=0.0,
+                 error_status=500, reset_rate=0.0, job_time=0.0, snapshot=SNAPSHOT_FILE, seed=None):
+        """
+        :param host: Adresse d'écoute.
+        :param port: Port d'écoute (0 : port libre choisi par le système).
+        :param latency: Délai (s) ajouté à chaque réponse.
+        :param jitter: Gigue (s) : délai supplémentaire tiré uniformément dans [0, jitter].
+        :param error_rate: Probabilité qu'une requête reçoive le statut error_status.
+        :param error_status: Code HTTP des erreurs injectées.
+        :param reset_rate: Probabilité que la connexion soit coupée sans réponse.
+        :param job_time: Durée (s) d'une impression lancée par téléversement.
+        :param snapshot: Fichier JPEG servi comme capture de la caméra.
+        :param seed: Graine du tirage des erreurs et de la gigue.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.reset_rate = reset_rate
+        self.job_time = job_time
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.connected = True
+        self.job = None
+        self.stats = {"requests": 0, "commands": 0, "command_requests": 0, "uploaded_bytes": 0,
+                      "errors": 0, "resets": 0}
+        try:
+            with open(snapshot, "rb") as file:
+                self.snapshot = file.read()
+        except OSError:
+            self.snapshot = b""
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """
+        Démarre le serveur dans un thread d'arrière-plan.
+        :return: self
+        """
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fake-octoprint", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Arrête le serveur.
+        """
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset_stats(self):
+        with self.lock:
+            for key in self.stats:
+                self.stats[key] = 0
+
+    def _count(self, key, value=1):
+        with self.lock:
+            self.stats[key] += value
+
+    def _fault(self):
+        # Tirage sous verrou : Random n'est pas partagé sans risque entre threads
+        with self.lock:
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+            draw = self.random.random()
+        if delay:
+            time.sleep(delay)
+        if draw < self.reset_rate:
+            return "reset"
+        if draw < self.reset_rate + self.error_rate:
+            return "error"
+        return None
+
+    def _printer_state(self):
+        if self.job is not None and time.monotonic() - self.job["started"] < self.job_time:
+            return "Printing"
+        return "Operational" if self.connected else "Closed"
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, body=b"", content_type="application/json"):
+                if isinstance(body, (dict, list)):
+                    body = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _body(self):
+                return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+            def _begin(self):
+                # Latence et erreurs injectées ; False si la requête ne doit pas être traitée
+                fake._count("requests")
+                fault = fake._fault()
+                if fault == "reset":
+                    fake._count("resets")
+                    self.close_connection = True
+                    self.connection.close()
+                    return False
+                if fault == "error":
+                    fake._count("errors")
+                    self._body()
+                    self._send(fake.error_status, {"error": "Injected error"})
+                    return False
+                return True
+
+            def do_GET(self):
+                path = urlsplit(self.path).path
+                if path == "/_fake/stats":
+                    # Compteurs du serveur, hors latence et erreurs injectées
+                    with fake.lock:
+                        self._send(200, dict(fake.stats))
+                    return
+                if not self._begin():
+                    return
+                if path in ("/api/printer", "/printer"):
+                    state = fake._printer_state()
+                    if state == "Closed":
+                        self._send(409, {"error": "Printer is not operational"})
+                        return
+                    self._send(200, {
+                        "state": {"text": state, "flags": {"operational": True, "printing": state == "Printing"}},
+                        "temperature": {"tool0": {"actual": 210.0, "target": 210.0},
+                                        "bed": {"actual": 60.0, "target": 60.0}},
+                    })
+                elif path == "/api/connection":
+                    self._send(200, {"current": {"state": fake._printer_state(), "port": "/dev/ttyFAKE",
+                                                 "baudrate": 115200}})
+                elif path == "/api/job":
+                    job = fake.job
+                    state = fake._printer_state()
+                    if job is None:
+                        self._send(200, {"job": {"file": {"name": None}}, "progress": {"completion": None},
+                                         "state": state})
+                        return
+                    elapsed = time.monotonic() - job["started"]
+                    completion = 100.0 if not fake.job_time else min(100.0, 100.0 * elapsed / fake.job_time)
+                    self._send(200, {
+                        "job": {"file": {"name": job["name"], "size": job["size"]}},
+                        "progress": {"completion": completion, "printTime": elapsed,
+                                     "printTimeLeft": max(0.0, fake.job_time - elapsed)},
+                        "state": state,
+                    })
+                elif path == "/webcam/":
+                    self._send(200, fake.snapshot, "image/jpeg")
+                else:
+                    self._send(404, {"error": "Not found"})
+
+            def do_POST(self):
+                if not self._begin():
+                    return
+                path = urlsplit(self.path).path
+                if path == "/api/printer/command":
+                    try:
+                        data = json.loads(self._body() or b"{}")
+                    except ValueError:
+                        self._send(400, {"error": "Malformed JSON body"})
+                        return
+                    commands = data.get("commands") or ([data["command"]] if "command" in data else [])
+                    if not commands:
+                        self._send(400, {"error": "No command"})
+                        return
+                    if fake._printer_state() == "Closed":
+                        self._send(409, {"error": "Printer is not operational"})
+                        return
+                    fake._count("command_requests")
+                    fake._count("commands", len(commands))
+                    self._send(204)
+                elif path == "/api/connection":
+                    data = json.loads(self._body() or b"{}")
+                    fake.connected = data.get("command") != "disconnect"
+                    self._send(204)
+                elif path.startswith("/api/files/"):
+                    self._upload(path.rsplit("/", 1)[-1])
+                else:
+                    self._body()
+                    self._send(404, {"error": "Not found"})
+
+            def do_DELETE(self):
+                if not self._begin():
+                    return
+                path = urlsplit(self.path).path
+                if path.startswith("/api/files/"):
+                    self._send(204)
+                else:
+                    self._send(404, {"error": "Not found"})
+
+            def _upload(self, location):
+                # Lecture par blocs : le corps multipart peut peser plusieurs centaines de Mo
+                remaining = int(self.headers.get("Content-Length") or 0)
+                received, head = 0, b""
+                while remaining:
+                    chunk = self.rfile.read(min(remaining, 1 << 16))
+                    if not chunk:
+                        break
+                    if len(head) < 4096:
+                        head += chunk[:4096 - len(head)]
+                    remaining -= len(chunk)
+                    received += len(chunk)
+                fake._count("uploaded_bytes", received)
+                name = "upload.gcode"
+                marker = head.find(b'filename="')
+                if marker >= 0:
+                    name = head[marker + 10:head.find(b'"', marker + 10)].decode("utf-8", "replace")
+                if b'name="print"' in head and b"true" in head.split(b'name="print"', 1)[1][:64]:
+                    fake.job = {"name": name, "size": received, "started": time.monotonic()}
+                self._send(201, {"done": True, "files": {location: {"name": name, "origin": location}}})
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Faux serveur OctoPrint pour les tests et benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.0, help="Délai par requête (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Gigue maximale (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--reset-rate", type=float, default=0.0)
+    parser.add_argument("--job-time", type=float, default=0.0, help="Durée simulée d'une impression (s)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    fake = FakeOctoPrint(args.host, args.port, args.latency, args.jitter, args.error_rate,
+                         args.error_status, args.reset_rate, args.job_time, seed=args.seed)
+    print(f"Faux OctoPrint à l'écoute sur {fake.url}")
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        fake.stop()
@@ -0,0 +1,178 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import api
+import print_job
+from api import HTTP_CONFIG, STATE_CONFIG, OctoPrintClient
+from settings import CONFIG
+
+
+class ThreadPoolOctoPrintClient:
+    """
+    Interface asyncio d'une imprimante OctoPrint, adossée à un pool de threads.
+    Ce n'est pas un client HTTP asynchrone : chaque opération exécute le code
+    synchrone de api.py (requests, OctoPrintClient dédié) dans un thread d'un
+    ThreadPoolExecutor borné, et occupe ce thread jusqu'à sa réponse. Le nombre
+    d'opérations simultanées est donc limité par les threads du pool (et par
+    un sémaphore par imprimante), pas par les sockets.
+    """
+
+    def __init__(self, name, url, api_key, max_concurrency=2, executor=None, **http):
+        """
+        :param name: Nom de l'imprimante.
+        :param url: URL de base d'OctoPrint.
+        :param api_key: Clé API OctoPrint.
+        :param max_concurrency: Nombre maximal de requêtes simultanées vers cette imprimante.
+        :param executor: ThreadPoolExecutor partagé ; par défaut un pool propre de
+                         max_concurrency threads, fermé avec le client.
+        :param http: Paramètres transmis à OctoPrintClient (timeout, retries...).
+        """
+        self.name = name
+        self.client = OctoPrintClient(url, api_key, pool_size=max_concurrency, **http)
+        self.max_concurrency = max_concurrency
+        self._own_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix=name)
+        self._semaphore = None
+
+    async def _call(self, func, *args, **kwargs):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            call = functools.partial(func, *args, client=self.client, **kwargs)
+            return await loop.run_in_executor(self.executor, call)
+
+    async def connect(self):
+        await self._call(api.connect_printer)
+        return await self._call(api.is_printer_connected)
+
+    async def state(self):
+        return await self._call(api.get_printer_state)
+
+    async def command(self, command):
+        return await self._call(api.send_gcode_command, command)
+
+    async def commands(self, commands):
+        return await self._call(api.send_gcode_commands, commands)
+
+    async def upload(self, filepath, print_after=True):
+        return await self._call(print_job.upload_and_print, filepath, print_after)
+
+    async def wait_job(self, **kwargs):
+        # Occupe un thread du pool pendant tout le travail (interrogations espacées)
+        return await self._call(print_job.wait_for_job, **kwargs)
+
+    async def snapshot(self, save_path):
+        # Import local : OpenCV n'est chargé que si une capture est demandée
+        from camera_analysis import capture_image
+        return await self._call(capture_image, save_path)
+
+    def close(self):
+        self.client.close()
+        if self._own_executor:
+            self.executor.shutdown(wait=False)
+
+
+class PrinterFleet:
+    """
+    Parc d'imprimantes piloté en parallèle avec asyncio, chaque imprimante
+    passant par le pool de threads partagé (voir ThreadPoolOctoPrintClient).
+    """
+
+    def __init__(self, printers, executor=None):
+        """
+        :param printers: Liste d'ThreadPoolOctoPrintClient.
+        :param executor: ThreadPoolExecutor partagé par les clients, fermé avec le parc ;
+                         sa taille (somme des max_concurrency) borne les opérations simultanées.
+        """
+        self.printers = {printer.name: printer for printer in printers}
+        self.executor = executor
+
+    @classmethod
+    def from_config(cls, config=None):
+        """
+        Construit le parc depuis la section "printers" de la configuration :
+        [{"name", "url", "api_key", "max_concurrency"}, ...].
+        :param config: Configuration (dict), config.json par défaut.
+        :return: PrinterFleet
+        """
+        config = config or CONFIG
+        entries = config.get("printers", [])
+        workers = sum(entry.get("max_concurrency", 2) for entry in entries) or 1
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fleet")
+        printers = [
+            ThreadPoolOctoPrintClient(
+                entry["name"], entry["url"], entry["api_key"],
+                max_concurrency=entry.get("max_concurrency", 2),
+                executor=executor,
+                timeout=HTTP_CONFIG.get("timeout", 10),
+                retries=HTTP_CONFIG.get("retries", 3),
+                backoff=HTTP_CONFIG.get("backoff", 0.3),
+                state_ttl=STATE_CONFIG.get("ttl", 1.0)
+            )
+            for entry in entries
+        ]
+        return cls(printers, executor)
+
+    def select(self, names=None):
+        """
+        :param names: Noms des imprimantes (toutes par défaut).
+        :return: Liste d'ThreadPoolOctoPrintClient.
+        """
+        if names is None:
+            return list(self.printers.values())
+        return [self.printers[name] for name in names]
+
+    async def broadcast(self, operation, *args, names=None):
+        """
+        Lance la même opération sur plusieurs imprimantes en parallèle.
+        :param operation: Nom de la méthode d'ThreadPoolOctoPrintClient (ex. "command").
+        :param names: Noms des imprimantes visées (toutes par défaut).
+        :return: Dictionnaire {nom: résultat ou exception}.
+        """
+        printers = self.select(names)
+        results = await asyncio.gather(
+            *(getattr(printer, operation)(*args) for printer in printers),
+            return_exceptions=True
+        )
+        return {printer.name: result for printer, result in zip(printers, results)}
+
+    async def fan_out(self, tasks):
+        """
+        Lance des opérations différentes par imprimante en parallèle.
+        :param tasks: Dictionnaire {nom: (opération, args...)}.
+        :return: Dictionnaire {nom: résultat ou exception}.
+        """
+        names = list(tasks)
+        results = await asyncio.gather(
+            *(getattr(self.printers[name], tasks[name][0])(*tasks[name][1:]) for name in names),
+            return_exceptions=True
+        )
+        return dict(zip(names, results))
+
+    async def connect_all(self, names=None):
+        return await self.broadcast("connect", names=names)
+
+    async def states(self, names=None):
+        return await self.broadcast("state", names=names)
+
+    async def command_all(self, command, names=None):
+        return await self.broadcast("command", command, names=names)
+
+    async def snapshot_all(self, folder="img", names=None):
+        """
+        Capture une image sur chaque imprimante (img/<nom>_snapshot.jpg).
+        """
+        tasks = {
+            printer.name: ("snapshot", os.path.join(folder, f"{printer.name}_snapshot.jpg"))
+            for printer in self.select(names)
+        }
+        return await self.fan_out(tasks)
+
+    def close(self):
+        for printer in self.printers.values():
+            printer.close()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
@@ -0,0 +1,88 @@
+from functools import cached_property
+
+import cv2
+import numpy as np
+
+
+class Frame:
+    """
+    Image capturée et plans dérivés (niveaux de gris, égalisation, flous, contours),
+    calculés à la première demande puis mémorisés pour tous les détecteurs.
+    """
+
+    def __init__(self, image):
+        """
+        :param image: Image BGR (numpy.ndarray).
+        """
+        self.image = image
+        self._planes = {}
+
+    @classmethod
+    def load(cls, source):
+        """
+        Construit un Frame depuis un chemin, une image décodée ou un Frame existant.
+        :param source: Chemin (str), image BGR (numpy.ndarray) ou Frame.
+        :return: Frame, ou None si l'image ne peut pas être chargée.
+        """
+        if isinstance(source, cls):
+            return source
+        if isinstance(source, np.ndarray):
+            return cls(source)
+        image = cv2.imread(source)
+        return cls(image) if image is not None else None
+
+    @property
+    def shape(self):
+        return self.image.shape
+
+    @cached_property
+    def gray(self):
+        return cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
+
+    @cached_property
+    def equalized(self):
+        # Contraste augmenté par égalisation d'histogramme
+        return cv2.equalizeHist(self.gray)
+
+    def _plane(self, key, compute):
+        plane = self._planes.get(key)
+        if plane is None:
+            plane = self._planes[key] = compute()
+        return plane
+
+    def pyramid(self, level=1):
+        """
+        Image égalisée réduite level fois de moitié (passe grossière de détection).
+        """
+        if level <= 0:
+            return self.equalized
+        return self._plane(("pyramid", level), lambda: cv2.pyrDown(self.pyramid(level - 1)))
+
+    def thumbnail(self, width=64):
+        """
+        Miniature en niveaux de gris de largeur donnée, au format de l'image (empreinte du cache de vision).
+        """
+        height, full_width = self.gray.shape[:2]
+        size = (width, max(1, round(width * height / full_width)))
+        return self._plane(("thumbnail", width), lambda: cv2.resize(self.gray, size, interpolation=cv2.INTER_AREA))
+
+    def median(self, ksize=5):
+        """
+        Flou médian de l'image égalisée (détection des vis).
+        """
+        return self._plane(("median", ksize), lambda: cv2.medianBlur(self.equalized, ksize))
+
+    def gaussian(self, ksize=5):
+        """
+        Flou gaussien des niveaux de gris (détection des contours).
+        """
+        return self._plane(("gaussian", ksize), lambda: cv2.GaussianBlur(self.gray, (ksize, ksize), 0))
+
+    def edges(self, threshold1=50, threshold2=150, ksize=5):
+        """
+        Contours de Canny sur l'image floutée.
+        """
+        return self._plane(
+            ("edges", threshold1, threshold2, ksize),
+            lambda: cv2.Canny(self.gaussian(ksize), threshold1, threshold2)
+        )
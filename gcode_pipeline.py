@@ -0,0 +1,402 @@
+import math
+import re
+
+# Un mot G-code : une lettre suivie d'un nombre (ex. X12.5, F3000)
+WORD_PATTERN = re.compile(r"([A-Za-z])\s*([-+]?(?:\d+\.?\d*|\.\d+))")
+LINE_PATTERN = re.compile(r"(?:\s*[A-Za-z]\s*[-+]?(?:\d+\.?\d*|\.\d+))+\s*")
+
+AXES = ("X", "Y", "Z")
+# Codes G sans déplacement, ou dont l'effet est suivi par MachineState ; tout autre
+# code G (G29, G30, G10...) peut déplacer la machine : position et vitesse deviennent inconnues
+MODELED_CODES = frozenset({"G0", "G1", "G2", "G3", "G4", "G17", "G18", "G19", "G21", "G28", "G90", "G91", "G92"})
+
+
+def parse_words(line):
+    """
+    Découpe une ligne G-code en mots.
+    :param line: Ligne sans commentaire (str)
+    :return: Liste de tuples (lettre, valeur texte), ou None si la ligne contient
+             autre chose que des mots (ex. M117 avec un message).
+    """
+    if not LINE_PATTERN.fullmatch(line):
+        return None
+    return [(letter.upper(), value) for letter, value in WORD_PATTERN.findall(line)]
+
+
+def format_number(value):
+    """
+    Écrit un nombre sous sa forme la plus courte (10.500 -> 10.5, -0.0 -> 0).
+    :param value: Valeur (float ou str)
+    :return: Texte (str)
+    """
+    if not isinstance(value, str):
+        value = f"{value:.5f}"
+    value = value.lstrip("+")
+    if "." in value:
+        value = value.rstrip("0").rstrip(".")
+    if value in ("", "-", "-0"):
+        value = "0"
+    return value
+
+
+def command_code(words):
+    """
+    Retourne le code normalisé de la commande (ex. "G1" pour "G01"), ou None.
+    """
+    if not words:
+        return None
+    letter, value = words[0]
+    if letter not in ("G", "M", "T"):
+        return None
+    try:
+        return letter + str(int(float(value)))
+    except ValueError:
+        return None
+
+
+class MachineState:
+    """
+    Suivi des modes et de la position de la machine au fil des lignes G-code.
+    Les positions inconnues (avant G28/G92 ou premier déplacement absolu) valent None,
+    de même que la position et la vitesse après une commande de déplacement non modélisée.
+    """
+
+    def __init__(self):
+        self.absolute = True
+        self.e_absolute = True
+        self.position = {"X": None, "Y": None, "Z": None, "E": None}
+        self.feedrate = None
+
+    def apply(self, code, values):
+        """
+        Applique une commande à l'état.
+        :param code: Code de la commande (ex. "G1")
+        :param values: Dictionnaire {lettre: float} des paramètres
+        :return: Position de départ (dict) pour un déplacement G0/G1/G2/G3, sinon None.
+        """
+        # Arcs G2/G3 : seul le point d'arrivée compte pour la suite (I, J, R ignorés)
+        if code in ("G0", "G1", "G2", "G3"):
+            start = dict(self.position)
+            for axis in ("X", "Y", "Z", "E"):
+                if axis not in values:
+                    continue
+                absolute = self.e_absolute if axis == "E" else self.absolute
+                if absolute:
+                    self.position[axis] = values[axis]
+                elif self.position[axis] is not None:
+                    self.position[axis] += values[axis]
+            if "F" in values:
+                self.feedrate = values["F"]
+            return start
+        if code == "G90":
+            self.absolute = True
+            self.e_absolute = True
+        elif code == "G91":
+            self.absolute = False
+            self.e_absolute = False
+        elif code == "M82":
+            self.e_absolute = True
+        elif code == "M83":
+            self.e_absolute = False
+        elif code == "G92":
+            if not values:
+                values = {axis: 0.0 for axis in self.position}
+            for axis, value in values.items():
+                if axis in self.position:
+                    self.position[axis] = value
+        elif code == "G28":
+            # La position après prise d'origine dépend du firmware : inconnue
+            homed = [axis for axis in AXES if axis in values] or list(AXES)
+            for axis in homed:
+                self.position[axis] = None
+        elif code.startswith("G") and code not in MODELED_CODES:
+            # Déplacement non modélisé : aucun mouvement suivant ne doit être jugé redondant
+            self.position = dict.fromkeys(self.position)
+            self.feedrate = None
+        return None
+
+
+def _values(words):
+    return {letter: float(value) for letter, value in words[1:]}
+
+
+def strip_comments(lines):
+    """
+    Supprime les commentaires ';' et les lignes vides.
+    """
+    for line in lines:
+        line = line.split(";", 1)[0].strip()
+        if line:
+            yield line
+
+
+def normalize_whitespace(lines):
+    """
+    Réécrit chaque ligne en mots séparés par un seul espace, en majuscules,
+    avec des nombres sans zéros superflus.
+    """
+    for line in lines:
+        words = parse_words(line)
+        if words is None:
+            yield " ".join(line.split())
+        else:
+            yield " ".join(letter + format_number(value) for letter, value in words)
+
+
+def drop_redundant_modal(lines):
+    """
+    Retire des G0/G1 les valeurs F déjà actives et les axes absolus inchangés ;
+    un déplacement qui ne contient plus rien est supprimé.
+    """
+    state = MachineState()
+    for line in lines:
+        words = parse_words(line)
+        code = command_code(words)
+        if code not in ("G0", "G1"):
+            if code is not None:
+                state.apply(code, _values(words))
+            yield line
+            continue
+
+        kept = [words[0]]
+        for letter, value in words[1:]:
+            number = float(value)
+            if letter == "F" and number == state.feedrate:
+                continue
+            if letter in AXES and state.absolute and number == state.position[letter]:
+                continue
+            if letter == "E" and (
+                number == 0 and not state.e_absolute
+                or state.e_absolute and number == state.position["E"]
+            ):
+                continue
+            kept.append((letter, value))
+        state.apply(code, _values(words))
+
+        if len(kept) > 1:
+            yield line if len(kept) == len(words) else " ".join(l + v for l, v in kept)
+
+
+class _Move:
+    """
+    Déplacement G1 en attente de fusion.
+    """
+
+    def __init__(self, line, start, end, e_delta, feedrate, has_feed):
+        self.line = line
+        self.start = start
+        self.end = end
+        self.e_delta = e_delta
+        self.feedrate = feedrate
+        self.has_feed = has_feed
+        self.merged = False
+
+    def length(self):
+        return math.dist(_point(self.start), _point(self.end))
+
+
+def _point(position):
+    # Un axe jamais utilisé (None au départ et à l'arrivée) ne bouge pas
+    return [position[a] or 0.0 for a in AXES]
+
+
+def _mergeable(first, second, tolerance, e_tolerance):
+    if first.feedrate != second.feedrate or second.has_feed:
+        return False
+    if (first.e_delta > 0) != (second.e_delta > 0):
+        return False
+    p0 = _point(first.start)
+    p1 = _point(first.end)
+    p2 = _point(second.end)
+    chord = [b - a for a, b in zip(p0, p2)]
+    chord_length = math.hypot(*chord)
+    if chord_length == 0:
+        return False
+    # Le point intermédiaire doit être entre les extrémités et proche de la corde
+    t = sum((b - a) * c for a, b, c in zip(p0, p1, chord)) / chord_length ** 2
+    if not 0 < t < 1:
+        return False
+    deviation = math.dist(p1, [a + t * c for a, c in zip(p0, chord)])
+    if deviation > tolerance:
+        return False
+    if first.e_delta > 0:
+        first_rate = first.e_delta / max(first.length(), 1e-9)
+        second_rate = second.e_delta / max(second.length(), 1e-9)
+        if abs(first_rate - second_rate) > e_tolerance * max(first_rate, second_rate):
+            return False
+    return True
+
+
+def _render(move, e_absolute):
+    if not move.merged:
+        return move.line
+    words = ["G1"]
+    for axis in AXES:
+        if move.end[axis] != move.start[axis]:
+            words.append(axis + format_number(move.end[axis]))
+    if move.e_delta:
+        words.append("E" + format_number(move.end["E"] if e_absolute else move.e_delta))
+    if move.has_feed:
+        words.append("F" + format_number(move.feedrate))
+    return " ".join(words)
+
+
+def merge_collinear(lines, tolerance=0.01, e_tolerance=0.01):
+    """
+    Fusionne les G1 consécutifs alignés (à tolerance mm près) de même vitesse
+    et de même débit d'extrusion. Seuls les déplacements absolus à position
+    connue sont fusionnés ; un seul déplacement est gardé en mémoire.
+    :param tolerance: Écart maximal (mm) du point intermédiaire à la droite fusionnée.
+    :param e_tolerance: Écart relatif maximal entre débits d'extrusion (mm de E par mm).
+    """
+    state = MachineState()
+    pending = None
+    for line in lines:
+        words = parse_words(line)
+        code = command_code(words)
+        values = _values(words) if code is not None else {}
+        e_absolute = state.e_absolute
+        start = state.apply(code, values) if code is not None else None
+
+        move = None
+        if code == "G1" and state.absolute and all(
+            (state.position[a] is None) == (start[a] is None) for a in AXES
+        ):
+            if not e_absolute or "E" not in values:
+                e_delta = values.get("E", 0.0)
+            elif start["E"] is not None and state.position["E"] is not None:
+                e_delta = state.position["E"] - start["E"]
+            else:
+                e_delta = -1.0
+            if e_delta >= 0:
+                move = _Move(line, start, dict(state.position), e_delta, state.feedrate, "F" in values)
+
+        if move is not None and pending is not None \
+                and _mergeable(pending, move, tolerance, e_tolerance):
+            pending.end = move.end
+            pending.e_delta += move.e_delta
+            pending.merged = True
+            continue
+
+        if pending is not None:
+            yield _render(pending, e_absolute)
+            pending = None
+        if move is not None:
+            pending = move
+        else:
+            yield line
+
+    if pending is not None:
+        yield _render(pending, state.e_absolute)
+
+
+def add_checksums(lines, start=1):
+    """
+    Ajoute les numéros de ligne et sommes de contrôle du protocole série
+    (N<n> <commande>*<xor>), précédés d'un M110 de réinitialisation.
+    """
+    number = start - 1
+    yield f"M110 N{number}"
+    for line in lines:
+        number += 1
+        body = f"N{number} {line}"
+        checksum = 0
+        for byte in body.encode("ascii", "replace"):
+            checksum ^= byte
+        yield f"{body}*{checksum}"
+
+
+class StageStats:
+    """
+    Compteurs de lignes et d'octets (G-code ASCII) en sortie d'une étape.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.lines = 0
+        self.bytes = 0
+
+    def count(self, lines):
+        for line in lines:
+            self.lines += 1
+            self.bytes += len(line) + 1
+            yield line
+
+
+class GcodePipeline:
+    """
+    Chaîne de générateurs appliquée ligne à ligne : la mémoire utilisée ne
+    dépend pas de la taille du fichier.
+    """
+
+    def __init__(self, stages):
+        """
+        :param stages: Liste de tuples (nom, fonction) ; chaque fonction prend et
+                       retourne un itérable de lignes.
+        """
+        self.stages = stages
+        self.stats = []
+
+    def process(self, lines):
+        """
+        :param lines: Itérable de lignes brutes (ex. objet fichier).
+        :return: Générateur des lignes traitées.
+        """
+        source = StageStats("input")
+        self.stats = [source]
+        stream = source.count(lines)
+        for name, stage in self.stages:
+            stats = StageStats(name)
+            self.stats.append(stats)
+            stream = stats.count(stage(stream))
+        return stream
+
+    def report(self):
+        """
+        Affiche les lignes et octets retirés par chaque étape.
+        """
+        for previous, stats in zip(self.stats, self.stats[1:]):
+            print(
+                f"{stats.name:<22} removed {previous.lines - stats.lines:>8} lines, "
+                f"{previous.bytes - stats.bytes:>10} bytes"
+            )
+        if len(self.stats) > 1:
+            first, last = self.stats[0], self.stats[-1]
+            print(f"{'total':<22} {first.lines} -> {last.lines} lines, {first.bytes} -> {last.bytes} bytes")
+
+
+def default_pipeline(merge_tolerance=None, checksums=False):
+    """
+    Construit la chaîne standard, sans perte : commentaires, espaces, mots modaux
+    redondants ; en option, fusion des segments alignés (avec perte, bornée par
+    merge_tolerance) et numéros de ligne/checksums.
+    :param merge_tolerance: Tolérance (mm) de fusion ; None (défaut) pour ne pas fusionner.
+    :param checksums: Ajouter N<n> et *<checksum> à chaque ligne (bool)
+    :return: GcodePipeline
+    """
+    stages = [
+        ("strip_comments", strip_comments),
+        ("normalize_whitespace", normalize_whitespace),
+        ("drop_redundant_modal", drop_redundant_modal),
+    ]
+    if merge_tolerance is not None:
+        stages.append(("merge_collinear", lambda lines: merge_collinear(lines, merge_tolerance)))
+    if checksums:
+        stages.append(("add_checksums", add_checksums))
+    return GcodePipeline(stages)
+
+
+def process_file(source_path, destination_path, pipeline=None):
+    """
+    Écrit une version prétraitée d'un fichier G-code (ex. avant téléversement).
+    :param source_path: Fichier d'entrée.
+    :param destination_path: Fichier de sortie.
+    :param pipeline: GcodePipeline à appliquer (chaîne standard par défaut).
+    :return: Le GcodePipeline utilisé, avec ses statistiques.
+    """
+    pipeline = pipeline or default_pipeline()
+    with open(source_path, "r") as source, open(destination_path, "w") as destination:
+        for line in pipeline.process(source):
+            destination.write(line + "\n")
+    return pipeline
+
@@ -0,0 +1,375 @@
+import sys
+
+import numpy as np
+
+# Lettres G-code conservées après l'analyse lexicale
+LETTERS = "GMXYZEFIJRPS"
+
+# Taille des blocs de texte analysés en une passe (borne la mémoire utilisée)
+CHUNK_SIZE = 1 << 22
+
+
+class Kinematics:
+    """
+    Paramètres du planificateur de mouvements (unités : mm, s).
+    """
+
+    def __init__(self, max_feedrate=None, max_acceleration=None, acceleration=500.0,
+                 junction_deviation=0.013, default_feedrate=1500.0):
+        """
+        :param max_feedrate: Vitesse maximale par axe {X, Y, Z, E} (mm/s).
+        :param max_acceleration: Accélération maximale par axe {X, Y, Z, E} (mm/s²).
+        :param acceleration: Accélération des déplacements (mm/s², M204).
+        :param junction_deviation: Déviation de jonction (mm) utilisée aux angles.
+        :param default_feedrate: Vitesse (mm/min) avant le premier mot F.
+        """
+        self.max_feedrate = {"X": 500.0, "Y": 500.0, "Z": 5.0, "E": 25.0}
+        self.max_feedrate.update(max_feedrate or {})
+        self.max_acceleration = {"X": 3000.0, "Y": 3000.0, "Z": 100.0, "E": 10000.0}
+        self.max_acceleration.update(max_acceleration or {})
+        self.acceleration = acceleration
+        self.junction_deviation = junction_deviation
+        self.default_feedrate = default_feedrate
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        :param config: Section "kinematics" de la configuration (dict).
+        :return: Kinematics
+        """
+        return cls(**config)
+
+
+class SimulationResult:
+    """
+    Résultat d'une simulation : temps par mouvement, totaux et extrusion.
+    """
+
+    def __init__(self, lines, times, lengths, extrusion, dwell_time):
+        """
+        :param lines: Numéro de ligne (à partir de 1) de chaque mouvement.
+        :param times: Durée estimée de chaque mouvement (s).
+        :param lengths: Longueur de chaque mouvement (mm).
+        :param extrusion: Variation de E de chaque mouvement (mm).
+        :param dwell_time: Somme des pauses G4 (s).
+        """
+        self.lines = lines
+        self.times = times
+        self.lengths = lengths
+        self.extrusion = extrusion
+        self.dwell_time = dwell_time
+
+    @property
+    def total_time(self):
+        return float(self.times.sum()) + self.dwell_time
+
+    @property
+    def moves(self):
+        return int(self.times.size)
+
+    @property
+    def distance(self):
+        return float(self.lengths.sum())
+
+    @property
+    def extruded(self):
+        return float(self.extrusion[self.extrusion > 0].sum())
+
+    @property
+    def retracted(self):
+        return float(np.abs(self.extrusion[self.extrusion < 0]).sum())
+
+    def summary(self):
+        """
+        Affiche les totaux de la simulation.
+        """
+        minutes, seconds = divmod(self.total_time, 60)
+        print(f"Mouvements : {self.moves}")
+        print(f"Distance parcourue : {self.distance:.1f} mm")
+        print(f"Extrusion : {self.extruded:.2f} mm (rétraction : {self.retracted:.2f} mm)")
+        print(f"Temps estimé : {int(minutes)} min {seconds:.1f} s (dont pauses : {self.dwell_time:.1f} s)")
+
+
+def _tokenize(text):
+    """
+    Analyse lexicale vectorisée d'un bloc de G-code.
+    :param text: Contenu (bytes), découpé sur une fin de ligne.
+    :return: (ligne de chaque mot, lettre, valeur, nombre de lignes)
+    """
+    buf = np.frombuffer(text, dtype=np.uint8)
+    positions = np.arange(buf.size, dtype=np.int64)
+    newline = buf == 10
+
+    # Commentaires : de ';' jusqu'à la fin de la ligne
+    last_newline = np.maximum.accumulate(np.where(newline, positions, -1))
+    last_semicolon = np.maximum.accumulate(np.where(buf == 59, positions, -1))
+    in_comment = last_semicolon > last_newline
+
+    upper = np.where((buf >= 97) & (buf <= 122), buf - 32, buf)
+    is_letter = (upper >= 65) & (upper <= 90) & ~in_comment
+    is_digit = (buf >= 48) & (buf <= 57)
+    is_dot = buf == 46
+    is_minus = buf == 45
+    numeric = is_digit | is_dot | is_minus | (buf == 43)
+    is_space = (buf == 32) | (buf == 9) | (buf == 13)
+
+    letter_positions = np.flatnonzero(is_letter)
+    count = letter_positions.size
+    token = np.cumsum(is_letter) - 1
+
+    # Un caractère appartient au nombre d'un mot s'il n'y a aucun séparateur
+    # (autre lettre, '*', fin de ligne...) entre la lettre et lui
+    breaker = ~(numeric | is_space) | in_comment
+    breaks = np.cumsum(breaker)
+    valid = numeric & ~in_comment & (token >= 0)
+    valid[valid] = breaks[valid] == breaks[letter_positions[token[valid]]]
+
+    digit_positions = np.flatnonzero(valid & is_digit)
+    digit_tokens = token[digit_positions]
+    values = np.full(count, np.nan)
+    if digit_positions.size:
+        ends = np.append(np.flatnonzero(np.diff(digit_tokens)), digit_positions.size - 1)
+        starts = np.append(0, ends[:-1] + 1)
+        owners = digit_tokens[ends]
+
+        # Position de la virgule : point explicite, sinon après le dernier chiffre
+        point = np.full(count, -1, dtype=np.int64)
+        point[owners] = digit_positions[ends] + 1
+        dots = np.flatnonzero(valid & is_dot)
+        point[token[dots]] = dots
+
+        exponent = point[digit_tokens] - digit_positions
+        exponent = np.where(exponent > 0, exponent - 1, exponent)
+        contributions = (buf[digit_positions] - 48) * np.power(10.0, exponent)
+        values[owners] = np.add.reduceat(contributions, starts)
+
+        minus = np.flatnonzero(valid & is_minus)
+        values[token[minus]] *= -1
+
+    lines = np.cumsum(newline)[letter_positions] if count else np.zeros(0, dtype=np.int64)
+    return lines, upper[letter_positions], values, int(newline.sum()) + 1
+
+
+def _parse(text):
+    """
+    Construit le tableau des mots par ligne.
+    :param text: Programme G-code (bytes)
+    :return: (dictionnaire {lettre: tableau par ligne, NaN si absente}, nombre de lignes)
+    """
+    parts = []
+    offset = 0
+    start = 0
+    while start < len(text):
+        end = text.find(b"\n", start + CHUNK_SIZE)
+        end = len(text) if end < 0 else end + 1
+        lines, letters, values, count = _tokenize(text[start:end])
+        parts.append((lines + offset, letters, values))
+        offset += count - 1
+        start = end
+    line_count = offset + 1
+
+    columns = {letter: np.full(line_count, np.nan) for letter in LETTERS}
+    for lines, letters, values in parts:
+        for letter in LETTERS:
+            selected = letters == ord(letter)
+            columns[letter][lines[selected]] = values[selected]
+    return columns, line_count
+
+
+def _forward_fill(events, default):
+    """
+    Propage la dernière valeur non NaN vers les lignes suivantes.
+    """
+    indices = np.arange(events.size)
+    last = np.maximum.accumulate(np.where(np.isnan(events), -1, indices))
+    return np.where(last >= 0, events[last], default)
+
+
+def _positions(columns, line_count):
+    """
+    Position machine (X, Y, Z, E) après chaque ligne, en tenant compte des modes
+    G90/G91, M82/M83 et des G92/G28.
+    :return: Tableau (lignes, 4)
+    """
+    g = columns["G"]
+    m = columns["M"]
+    motion = np.isin(g, (0, 1, 2, 3))
+    is_g92 = g == 92
+    is_g28 = g == 28
+
+    absolute = _forward_fill(np.where(g == 90, 1.0, np.where(g == 91, 0.0, np.nan)), 1.0) > 0
+    e_events = np.where((g == 90) | (m == 82), 1.0, np.where((g == 91) | (m == 83), 0.0, np.nan))
+    e_absolute = _forward_fill(e_events, 1.0) > 0
+
+    present = {axis: ~np.isnan(columns[axis]) for axis in "XYZE"}
+    no_axis = ~(present["X"] | present["Y"] | present["Z"] | present["E"])
+
+    indices = np.arange(line_count)
+    result = np.empty((line_count, 4))
+    for column, axis in enumerate("XYZE"):
+        value = np.nan_to_num(columns[axis])
+        axis_absolute = e_absolute if axis == "E" else absolute
+
+        delta = np.where(motion & present[axis] & ~axis_absolute, value, 0.0)
+        is_set = (motion & present[axis] & axis_absolute) | (is_g92 & (present[axis] | no_axis))
+        if axis != "E":
+            # G28 sans axe : prise d'origine de X, Y et Z (origine supposée à 0)
+            homed = is_g28 & (present[axis] | ~(present["X"] | present["Y"] | present["Z"]))
+            is_set |= homed
+            value = np.where(homed, 0.0, value)
+
+        travelled = np.cumsum(delta)
+        offsets = value - travelled
+        last = np.maximum.accumulate(np.where(is_set, indices, -1))
+        result[:, column] = travelled + np.where(last >= 0, offsets[last], 0.0)
+    return result
+
+
+def _trapezoid_time(length, v_entry, v_exit, v_max, acceleration):
+    """
+    Durée d'un profil de vitesse trapézoïdal (ou triangulaire si la vitesse
+    nominale n'est pas atteinte).
+    """
+    accel_distance = (v_max ** 2 - v_entry ** 2) / (2 * acceleration)
+    decel_distance = (v_max ** 2 - v_exit ** 2) / (2 * acceleration)
+    cruise = length - accel_distance - decel_distance
+
+    trapezoid = (v_max - v_entry) / acceleration + (v_max - v_exit) / acceleration \
+        + np.maximum(cruise, 0) / v_max
+    v_peak = np.sqrt(np.maximum((2 * acceleration * length + v_entry ** 2 + v_exit ** 2) / 2, 0))
+    v_peak = np.minimum(v_peak, v_max)
+    triangle = (v_peak - v_entry) / acceleration + (v_peak - v_exit) / acceleration
+    return np.where(cruise >= 0, trapezoid, triangle)
+
+
+def simulate(source, kinematics=None):
+    """
+    Simule l'exécution d'un programme G-code par le planificateur de mouvements.
+    :param source: Chemin d'un fichier (str), contenu (bytes) ou liste de commandes.
+    :param kinematics: Paramètres Kinematics (valeurs par défaut de Marlin sinon).
+    :return: SimulationResult
+    """
+    kinematics = kinematics or Kinematics()
+    if isinstance(source, bytes):
+        text = source
+    elif isinstance(source, str):
+        with open(source, "rb") as file:
+            text = file.read()
+    else:
+        text = "\n".join(source).encode("utf-8")
+
+    columns, line_count = _parse(text)
+    positions = _positions(columns, line_count)
+    g = columns["G"]
+    if not np.isin(g, (0, 1, 2, 3)).any():
+        empty = np.zeros(0)
+        return SimulationResult(np.zeros(0, dtype=np.int64), empty, empty, empty, 0.0)
+
+    # Pauses G4 : P en millisecondes, S en secondes
+    dwell = g == 4
+    dwell_time = float(np.nansum(columns["P"][dwell]) / 1000 + np.nansum(columns["S"][dwell]))
+
+    move_lines = np.flatnonzero(np.isin(g, (0, 1, 2, 3)))
+    starts = np.vstack([np.zeros((1, 4)), positions])[move_lines]
+    ends = positions[move_lines]
+    delta = ends - starts
+    xyz_length = np.linalg.norm(delta[:, :3], axis=1)
+
+    # Arcs G2/G3 : longueur et tangentes d'entrée/sortie
+    arc = np.isin(g[move_lines], (2, 3))
+    clockwise = g[move_lines] == 2
+    offset = np.nan_to_num(np.column_stack([columns["I"], columns["J"]])[move_lines])
+
+    # Format R : centre calculé depuis la corde (même convention que Grbl/Marlin)
+    r = columns["R"][move_lines]
+    with_radius = arc & ~np.isnan(r)
+    chord = delta[:, :2]
+    chord_length = np.linalg.norm(chord, axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        h = -np.sqrt(np.maximum(4 * r ** 2 - chord_length ** 2, 0)) / chord_length
+    h = np.where(clockwise, h, -h)
+    h = np.where(r < 0, -h, h)
+    radius_offset = 0.5 * np.column_stack([chord[:, 0] - chord[:, 1] * h, chord[:, 1] + chord[:, 0] * h])
+    offset = np.where(with_radius[:, None], np.nan_to_num(radius_offset), offset)
+    center = starts[:, :2] + offset
+    radius_start = starts[:, :2] - center
+    radius_end = ends[:, :2] - center
+    radius = np.linalg.norm(radius_start, axis=1)
+    sweep = np.arctan2(radius_end[:, 1], radius_end[:, 0]) - np.arctan2(radius_start[:, 1], radius_start[:, 0])
+    sweep = np.where(clockwise, -sweep, sweep) % (2 * np.pi)
+    sweep = np.where(sweep == 0, 2 * np.pi, sweep)
+    arc_length = np.hypot(radius * sweep, delta[:, 2])
+    xyz_length = np.where(arc, arc_length, xyz_length)
+
+    # Mouvements nuls (G1 F1500 seul, position inchangée) ignorés
+    moving = (xyz_length > 0) | (delta[:, 3] != 0)
+    move_lines, delta, xyz_length = move_lines[moving], delta[moving], xyz_length[moving]
+    arc, clockwise, radius = arc[moving], clockwise[moving], radius[moving]
+    radius_start, radius_end = radius_start[moving], radius_end[moving]
+
+    # Longueur de référence : trajet XYZ, ou |E| pour un mouvement d'extrudeur seul
+    length = np.where(xyz_length > 0, xyz_length, np.abs(delta[:, 3]))
+    fractions = np.abs(delta) / length[:, None]
+    fractions[arc, :2] = 1.0
+
+    feedrate = _forward_fill(columns["F"], kinematics.default_feedrate)[move_lines] / 60
+    v_max = feedrate
+    acceleration = np.full(length.size, float(kinematics.acceleration))
+    with np.errstate(divide="ignore"):
+        for column, axis in enumerate("XYZE"):
+            v_max = np.minimum(v_max, kinematics.max_feedrate[axis] / fractions[:, column])
+            acceleration = np.minimum(acceleration, kinematics.max_acceleration[axis] / fractions[:, column])
+    # Sur un arc, l'accélération centripète limite la vitesse
+    v_max = np.where(arc, np.minimum(v_max, np.sqrt(acceleration * radius)), v_max)
+
+    # Directions d'entrée et de sortie de chaque mouvement
+    with np.errstate(invalid="ignore", divide="ignore"):
+        direction = np.nan_to_num(delta[:, :3] / xyz_length[:, None])
+        sign = np.where(clockwise, -1.0, 1.0)[:, None]
+        tangent_in = np.column_stack([-radius_start[:, 1], radius_start[:, 0], np.zeros(length.size)]) * sign
+        tangent_out = np.column_stack([-radius_end[:, 1], radius_end[:, 0], np.zeros(length.size)]) * sign
+        tangent_in = np.nan_to_num(tangent_in / np.linalg.norm(tangent_in, axis=1)[:, None])
+        tangent_out = np.nan_to_num(tangent_out / np.linalg.norm(tangent_out, axis=1)[:, None])
+    entry_direction = np.where(arc[:, None], tangent_in, direction)
+    exit_direction = np.where(arc[:, None], tangent_out, direction)
+
+    # Vitesse de jonction (déviation de jonction, comme Marlin/Grbl), en v²
+    cos_theta = -np.einsum("ij,ij->i", exit_direction[:-1], entry_direction[1:])
+    cos_theta = np.clip(cos_theta, -1.0, 1.0)
+    sin_half = np.sqrt((1 - cos_theta) / 2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        junction = acceleration[1:] * kinematics.junction_deviation * sin_half / (1 - sin_half)
+    junction = np.where(cos_theta <= -0.999999, np.inf, junction)
+    stopped = (xyz_length[:-1] == 0) | (xyz_length[1:] == 0)
+    junction = np.where(stopped, 0.0, junction)
+    junction = np.minimum(junction, np.minimum(v_max[:-1], v_max[1:]) ** 2)
+
+    # Limite d'entrée de chaque mouvement (arrêt au début et à la fin)
+    entry_limit = np.concatenate([[0.0], junction, [0.0]])
+    gain = 2 * acceleration * length
+    reach = np.concatenate([[0.0], np.cumsum(gain)])
+
+    # Passe arrière : w[i] = min(limite[i], w[i+1] + gain[i]),
+    # soit min sur k >= i de (limite[k] + reach[k]) - reach[i]
+    backward = np.minimum.accumulate((entry_limit + reach)[::-1])[::-1] - reach
+    # Passe avant : w[i] = min(backward[i], w[i-1] + gain[i-1])
+    forward = reach + np.minimum.accumulate(backward - reach)
+    speeds = np.sqrt(np.maximum(forward, 0))
+
+    times = _trapezoid_time(length, speeds[:-1], speeds[1:], v_max, acceleration)
+    return SimulationResult(move_lines + 1, times, xyz_length, delta[:, 3], dwell_time)
+
+
+def estimate_time(source, kinematics=None):
+    """
+    Durée estimée (s) d'un programme G-code ou d'une liste de commandes.
+    """
+    return simulate(source, kinematics).total_time
+
+
+if __name__ == "__main__":
+    from settings import CONFIG
+
+    for path in sys.argv[1:]:
+        print(f"=== {path}")
+        simulate(path, Kinematics.from_config(CONFIG.get("kinematics", {}))).summary()
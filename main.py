@@ -1,134 +1,160 @@
 import os
-import numpy as np
-import json
 import time
 
 from api import *
+from calibration import get_calibration
 from camera_analysis import *
+from frame import Frame
+from gcode_sim import Kinematics, simulate
+from mjpeg_stream import MJPEGStreamReader
 from pe import *
+from print_job import *
+from settings import CONFIG, GCODE_FOLDER, SCREWS_REAL_COORDS
 from tools import *
+from toolpath import contour_toolpath
 
-# Charger la configuration
-with open("config/config.json", "r") as config_file:
-    CONFIG = json.load(config_file)
-
-def analyze_object_and_move():
+def capture_and_calibrate(object_name="l'objet"):
     """
-    Déplace la buse, demande à l'utilisateur de poser l'objet, capture l'image,
-    analyse sa position et déplace la buse.
+    Déplace la buse, demande à l'utilisateur de poser les pièces, capture l'image
+    et calcule la transformation pixel -> mm.
+    :param object_name: Désignation des pièces dans les messages.
+    :return: (Frame de l'image capturée, matrice pixel -> mm) ou None en cas d'échec.
     """
     # Positionner la buse à l'origine (G28) et déplacer à Y250
     print("Initialisation de la position de la buse...")
     g28 = input("Appuyer sur 0 pour G28 & M83 ? : ")
-    wait_time = 4
     if(g28 == "0"):
-        wait_time = 16
         send_gcode_command("G28")  # Home all axes
         send_gcode_command("M92 E4000 T0") # Set E steps per mm
         send_gcode_command("M83")  # Set E to relative mode
     send_gcode_command("G1 X250 Y250 Z50 F10000")  # Déplacement à Y250
 
-    # Attendre quelques secondes avant de revérifier
-    time.sleep(wait_time)
+    # Attendre la fin du déplacement : ne pas faire poser l'objet sous une buse en mouvement
+    if not wait_for_idle(timeout=60):
+        print("Déplacement non terminé : capture abandonnée.")
+        return None
 
-    print("Buse positionnée à X250 Y250. Veuillez placer l'objet sur le plateau.")
+    print(f"Buse positionnée à X250 Y250. Veuillez placer {object_name} sur le plateau.")
 
     # Demander une confirmation à l'utilisateur avant de capturer l'image
-    input("Appuyez sur Entrée une fois que l'objet est correctement positionné.")
+    input(f"Appuyez sur Entrée une fois que {object_name} est correctement positionné.")
 
-    # Capture une image
-    image_path = capture_image("img/snapshot.jpg")
-    if not image_path:
+    # Capture une image postérieure au placement, décodée en mémoire
+    # (copie sur disque pour l'audit)
+    image = grab_frame("img/snapshot.jpg" if DEBUG_IMAGES else None, STREAM_READER, after=time.monotonic())
+    if image is None:
         print("Échec de la capture d'image.")
-        return
-
-    # Détecter les vis pour ajuster les coordonnées
-    screws_image_coords = detect_screws(image_path, "screws_detected.jpg")
-    if not screws_image_coords or len(screws_image_coords) < 4:
-        print("Échec de la détection des vis ou vis insuffisantes détectées.")
-        return
-
-    # Ordonner les vis détectées
-    screws_image_coords = order_screws(screws_image_coords)
-    print(f"Vis détectées et ordonnées : {screws_image_coords}\n")
-
-    # Coordonnées réelles des vis (en mm, à calibrer pour ton imprimante)
-    screws_real_coords = [
-        (238, 38),  # Top left
-        (71.5, 38),   # Top right
-        (238, 210), # Bottom left
-        (71, 208)   # Bottom right
-    ]
+        return None
+    # Plans dérivés (gris, flous...) calculés une fois pour tous les détecteurs
+    frame = Frame(image)
+
+    # Calibration pixel -> mm mémorisée, redétection des vis seulement en cas de dérive
+    calibration = get_calibration(
+        frame, SCREWS_REAL_COORDS, annotated_path="screws_detected.jpg" if DEBUG_IMAGES else None
+    )
+    if calibration is None:
+        print("Échec de la calibration pixel -> mm.")
+        return None
+    print(f"Vis ordonnées : {calibration.screws}\n")
 
     test_screw = input("Tester les coordonnées réelles des vis appuyer sur '0' pour continuer : ")
     if(test_screw == "0"):
-        for screw in screws_real_coords:
+        for screw in SCREWS_REAL_COORDS:
             print(f"Vis réelles : {screw}")
             send_gcode_command(f"G1 X{screw[0]} Y{screw[1]} Z10 F10000")
             input("Appuyez sur Entrée pour continuer.")
 
-    # Calculer la transformation pixel -> mm
-    transform_matrix = compute_pixel_to_mm_transformation(screws_image_coords, screws_real_coords)
+    return frame, calibration.matrix
 
-    # Détecter les coins de l'objet (en pixels)
-    corners_image_coords = analyze_image(image_path, "annotated_image.jpg")
-    if not corners_image_coords:
-        print("Échec de l'analyse de l'image pour détecter les coins.")
+def analyze_object_and_move():
+    """
+    Déplace la buse, demande à l'utilisateur de poser l'objet, capture l'image,
+    analyse sa position et déplace la buse.
+    """
+    captured = capture_and_calibrate()
+    if captured is None:
         return
+    frame, transform_matrix = captured
 
-    print(f"Coins détectés (pixels) : {corners_image_coords}")
+    # Détecter le contour complet de l'objet (en pixels), courbes comprises
+    outline_image_coords = detect_outline(frame, "img/outline_detected.jpg" if DEBUG_IMAGES else None)
+    if not outline_image_coords:
+        print("Échec de l'analyse de l'image pour détecter le contour.")
+        return
 
-    # Transformer les coins de l'objet en mm
-    corners_real_coords = transform_coordinates(corners_image_coords, transform_matrix)
-    print(f"Coins de l'objet (mm) : {corners_real_coords}")
+    # Transformer le contour en mm
+    outline_real_coords = transform_coordinates(outline_image_coords, transform_matrix)
 
-    # Ajuster les coins pour aller à l'intérieur de l'objet
-    adjusted_corners = adjust_corners_for_interior(corners_real_coords, offset=2)
-    print(f"Coins ajustés (mm) : {adjusted_corners}\n")
+    # Tracé décalé vers l'intérieur, en arcs et segments (toolpath.offset, toolpath.tolerance)
+    commands = contour_toolpath(outline_real_coords)
+    if commands is None:
+        return
+    print(f"Tracé : {len(outline_image_coords)} points de contour -> {len(commands)} commandes\n")
 
-    # Aller rapidement au-dessus du premier coin ajusté
-    x_first, y_first = adjusted_corners[0]
-    send_gcode_command(f"G1 X{x_first:.2f} Y{y_first:.2f} Z10 F1000")  # Déplacement rapide
+    # Aller rapidement au-dessus du point de départ du tracé
+    if not send_gcode_commands(commands[:1]):
+        print("Déplacement vers le point de départ refusé : tracé abandonné.")
+        return
 
-    input("Appuyez sur Entrée pour continuer et déplacer la buse aux coins de l'objet.")
+    input("Appuyez sur Entrée pour continuer et tracer le contour de l'objet.")
 
-    # Déplacer la buse aux coins ajustés de l'objet
-    extrusion_percentage = 75  # Pourcentage du trajet où E4 est activé
-    send_gcode_command(f"G1 E0.5") # Arnarque
-    time.sleep(0.5)
+    # Descente, amorçage et tracé complet envoyés en un seul lot : un refus n'en trace aucune partie
+    if not send_gcode_commands(commands[1:]):
+        print("Tracé refusé par OctoPrint : tracé abandonné.")
+        return
 
-    for idx in range(len(adjusted_corners)):
-        if(idx==3):
-            continue
-        if(idx%2==0):
-            E_value = 2
-        else:
-            E_value = 1
-        # Point de départ
-        x_start, y_start = adjusted_corners[idx]
-        # Point d'arrivée (prochain coin ou retour au premier coin)
-        x_end, y_end = adjusted_corners[(idx + 1) % len(adjusted_corners)]
+    if not wait_for_idle(timeout=120):
+        print("Tracé non terminé : retour et capture finale abandonnés.")
+        return
+    send_gcode_command("G1 X250 Y250 Z50 F10000") # Retour à la position initiale
+    if not wait_for_idle(timeout=60):
+        print("Retour non terminé : capture finale abandonnée.")
+        return
+    grab_frame("img/end.jpg", STREAM_READER, after=time.monotonic())
 
-        print(f"Déplacement avec extrusion de {x_start:.2f}, {y_start:.2f} vers {x_end:.2f}, {y_end:.2f}")
+def analyze_tray_and_print():
+    """
+    Détecte toutes les pièces posées sur le plateau en une seule capture et les
+    trace en un seul job, dans l'ordre minimisant les déplacements à vide.
+    """
+    captured = capture_and_calibrate("les pièces")
+    if captured is None:
+        return
+    frame, transform_matrix = captured
 
-        # Calculer le point où l'extrusion doit s'arrêter
-        x_extrude = x_start + (x_end - x_start) * (extrusion_percentage / 100)
-        y_extrude = y_start + (y_end - y_start) * (extrusion_percentage / 100)
+    # Toutes les pièces de l'image, transformées en mm en une seule opération
+    parts_image_coords = detect_parts(frame, annotated_path="img/parts_detected.jpg" if DEBUG_IMAGES else None)
+    if not parts_image_coords:
+        print("Aucune pièce détectée.")
+        return
+    parts = [
+        adjust_corners_for_interior(corners, offset=2)
+        for corners in transform_parts(parts_image_coords, transform_matrix)
+    ]
 
-        # Déplacement avec extrusion (E3 activé)
-        send_gcode_command(f"G1 X{x_extrude:.2f} Y{y_extrude:.2f} Z6 F400 E{E_value}")
-        print(f"Extrusion active jusqu'à : X={x_extrude:.2f}, Y={y_extrude:.2f}")
+    order, travel = plan_part_order(parts, origin=(250, 250))
+    print(f"Ordre de passage : {[index + 1 for index in order]} ({travel:.0f} mm de déplacements à vide)")
 
-        # Compléter le déplacement sans extrusion
-        send_gcode_command(f"G1 X{x_end:.2f} Y{y_end:.2f} Z6 F400")
-        print(f"Déplacement sans extrusion jusqu'à : X={x_end:.2f}, Y={y_end:.2f}")
+    input(f"Appuyez sur Entrée pour tracer les {len(parts)} pièces.")
+    if not send_gcode_commands(tray_toolpath(parts, order, extrusion_percentage=75)):
+        print("Tracé des pièces refusé par OctoPrint : tracé abandonné.")
+        return
 
-    time.sleep(2)
+    if not wait_for_idle(timeout=60 + 60 * len(parts)):
+        print("Tracé non terminé : retour et capture finale abandonnés.")
+        return
     send_gcode_command("G1 X250 Y250 Z50 F10000") # Retour à la position initiale
-    time.sleep(5)
-    capture_image("img/end.jpg")
+    if not wait_for_idle(timeout=60):
+        print("Retour non terminé : capture finale abandonnée.")
+        return
+    grab_frame("img/end.jpg", STREAM_READER, after=time.monotonic())
 
-GCODE_FOLDER = CONFIG["gcode_folder"]
+KINEMATICS = Kinematics.from_config(CONFIG.get("kinematics", {}))
+# Images annotées et captures sur disque (débogage uniquement)
+DEBUG_IMAGES = CONFIG.get("debug_images", True)
+CAMERA_CONFIG = CONFIG.get("camera", {})
+# Lecteur du flux MJPEG, démarré au lancement si "camera.stream" est activé
+STREAM_READER = None
 
 if __name__ == "__main__":
     print("Bienvenue dans l'application OctoPrint G-code Sender!")
@@ -145,6 +171,15 @@ if __name__ == "__main__":
     if not is_printer_connected():
         print("Impossible de se connecter à l'imprimante. Vérifiez l'état de l'imprimante et d'OctoPrint.")
 
+    # Suivi de l'état par le socket push d'OctoPrint plutôt que par requêtes
+    if CONFIG.get("state", {}).get("push", False):
+        start_push_listener()
+
+    # Lecture continue du flux caméra plutôt qu'une requête par capture
+    if CAMERA_CONFIG.get("stream", False):
+        STREAM_READER = MJPEGStreamReader(CLIENT, buffer_size=CAMERA_CONFIG.get("buffer_size", 4))
+        STREAM_READER.start()
+
     # Keep the main menu running
     while True:
         print("====================================")
@@ -152,9 +187,10 @@ if __name__ == "__main__":
         print("2. Envoyer un fichier G-code")
         print("3. Analyser l'objet et déplacer la buse")
         print("4. Séquence de PE")
+        print("5. Analyser un plateau de pièces et les tracer")
         print("====================================")
         
-        choice = input("Sélectionnez une option (1/2/3/4) : ")
+        choice = input("Sélectionnez une option (1/2/3/4/5) : ")
         print("\n")
         
         # Process the user choice
@@ -175,7 +211,13 @@ if __name__ == "__main__":
                     file_index = int(file_choice) - 1
                     if 0 <= file_index < len(files):
                         filepath = os.path.join(GCODE_FOLDER, files[file_index])
-                        send_gcode_file(filepath)
+                        simulate(filepath, KINEMATICS).summary()
+                        mode = input("Mode d'envoi : 1. Flux de commandes  2. Téléverser et imprimer (1/2) : ")
+                        if mode == "2":
+                            if upload_and_print(filepath):
+                                wait_for_job()
+                        else:
+                            send_gcode_file(filepath)
                     else:
                         print("Choix invalide.")
                 except ValueError:
@@ -183,7 +225,13 @@ if __name__ == "__main__":
         if choice == "3":
             analyze_object_and_move()
         if choice == "4":
-            pe()
+            mode = input("Mode : 1. Programme compilé (téléversé)  2. Séquence interactive (1/2) : ")
+            if mode == "2":
+                pe()
+            elif pe_program() is not None:
+                wait_for_job()
+        if choice == "5":
+            analyze_tray_and_print()
         if(choice == "9"):
             print("Fermeture de l'application.")
             break
@@ -0,0 +1,220 @@
+import atexit
+import bisect
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+from settings import CONFIG
+
+METRICS_CONFIG = CONFIG.get("metrics", {})
+
+# Bornes (s) des histogrammes de latence, au format Prometheus
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Journal des messages de détail (ex. chaque commande envoyée), niveau réglé par logging.level
+LOGGER = logging.getLogger("octoprint")
+
+
+class _NullSpan:
+    # Span partagé quand les métriques sont désactivées : aucune allocation, aucune mesure
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("metrics", "name", "labels", "start", "wall")
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.wall = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        duration = time.perf_counter() - self.start
+        self.metrics.observe(f"{self.name}_seconds", duration, **self.labels)
+        if exc_type is not None:
+            self.metrics.count(f"{self.name}_errors_total", **self.labels)
+        self.metrics.trace(self.name, self.wall, duration, self.labels, exc_type)
+        return False
+
+
+class Metrics:
+    """
+    Registre de compteurs et d'histogrammes de latence, avec spans (gestionnaire
+    de contexte) et trace JSON lines optionnelle. Désactivé, chaque appel se
+    réduit à un test de l'attribut enabled.
+    """
+
+    def __init__(self, enabled=False, trace_path=None, prometheus_path=None):
+        """
+        :param enabled: Activer la collecte.
+        :param trace_path: Fichier JSON lines recevant un événement par span (None : pas de trace).
+        :param prometheus_path: Fichier où écrire les métriques au format texte Prometheus
+                                à la fin du programme (None : pas d'export automatique).
+        """
+        self.enabled = enabled
+        self.prometheus_path = prometheus_path
+        self.counters = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+        self._trace = open(trace_path, "a", buffering=1 << 16) if enabled and trace_path else None
+
+    def span(self, name, **labels):
+        """
+        Mesure la durée d'un bloc : histogramme <name>_seconds, compteur
+        <name>_errors_total si une exception le traverse, événement de trace.
+        :param name: Nom de l'étape (ex. "octoprint_http_request").
+        :param labels: Étiquettes de la mesure.
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, labels)
+
+    def count(self, name, value=1, **labels):
+        """
+        Incrémente un compteur.
+        """
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """
+        Ajoute une mesure (s) à un histogramme.
+        """
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+            histogram[0][bisect.bisect_left(BUCKETS, value)] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def trace(self, name, start, duration, labels, error=None):
+        if self._trace is None:
+            return
+        event = {"name": name, "start": start, "duration": duration, "thread": threading.current_thread().name}
+        if labels:
+            event["labels"] = labels
+        if error is not None:
+            event["error"] = error.__name__
+        line = json.dumps(event) + "\n"
+        with self._lock:
+            self._trace.write(line)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def prometheus(self):
+        """
+        :return: Métriques au format texte d'exposition Prometheus (str).
+        """
+        lines = []
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((key, ([*buckets], total, number))
+                                for key, (buckets, total, number) in self.histograms.items())
+        declared = set()
+        for (name, labels), value in counters:
+            if name not in declared:
+                lines.append(f"# TYPE {name} counter")
+                declared.add(name)
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        for (name, labels), (buckets, total, number) in histograms:
+            if name not in declared:
+                lines.append(f"# TYPE {name} histogram")
+                declared.add(name)
+            cumulative = 0
+            for bound, bucket in zip((*BUCKETS, "+Inf"), buckets):
+                cumulative += bucket
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {number}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path=None):
+        """
+        Écrit les métriques au format Prometheus (remplacement atomique du fichier,
+        compatible avec le collecteur textfile de node_exporter).
+        :param path: Fichier de destination (par défaut prometheus_path).
+        """
+        path = path or self.prometheus_path
+        if not path or not self.enabled:
+            return
+        temporary = f"{path}.tmp"
+        with open(temporary, "w") as file:
+            file.write(self.prometheus())
+        os.replace(temporary, path)
+
+    def close(self):
+        """
+        Vide la trace et écrit l'export Prometheus configuré.
+        """
+        self.write_prometheus()
+        if self._trace is not None:
+            with self._lock:
+                self._trace.close()
+                self._trace = None
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def timed(name, **labels):
+    """
+    Décorateur : chaque appel de la fonction est mesuré dans un span.
+    Désactivé, le coût se limite à un appel de fonction supplémentaire.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not METRICS.enabled:
+                return function(*args, **kwargs)
+            with _Span(METRICS, name, labels):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+METRICS = Metrics(
+    enabled=METRICS_CONFIG.get("enabled", False),
+    trace_path=METRICS_CONFIG.get("trace"),
+    prometheus_path=METRICS_CONFIG.get("prometheus")
+)
+atexit.register(METRICS.close)
+
+LOGGER.setLevel(CONFIG.get("logging", {}).get("level", "WARNING"))
+if not LOGGER.handlers:
+    # Sortie standard, comme les print() qu'il remplace
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    LOGGER.addHandler(_handler)
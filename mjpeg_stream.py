@@ -0,0 +1,177 @@
+import collections
+import threading
+import time
+from functools import cached_property
+
+import cv2
+import numpy as np
+import requests
+
+STREAM_PATH = "/webcam/?action=stream"
+
+
+class StreamFrame:
+    """
+    Image JPEG reçue sur le flux, décodée à la première demande.
+    """
+
+    def __init__(self, timestamp, data):
+        """
+        :param timestamp: Instant (time.monotonic) de début de réception de l'image.
+        :param data: Contenu JPEG (bytes).
+        """
+        self.timestamp = timestamp
+        self.data = data
+
+    @cached_property
+    def image(self):
+        return cv2.imdecode(np.frombuffer(self.data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+class MJPEGStreamReader:
+    """
+    Lit en continu le flux MJPEG (multipart/x-mixed-replace) de mjpg-streamer dans
+    un thread d'arrière-plan et garde les dernières images dans un tampon circulaire.
+    """
+
+    def __init__(self, client, path=STREAM_PATH, buffer_size=4, decode=False,
+                 reconnect_delay=1.0, max_reconnect_delay=30.0):
+        """
+        :param client: OctoPrintClient utilisé pour ouvrir le flux.
+        :param path: Chemin (ou URL absolue) du flux MJPEG.
+        :param buffer_size: Nombre d'images conservées.
+        :param decode: Décoder chaque image dès sa réception (sinon à la demande).
+        :param reconnect_delay: Délai initial (s) avant reconnexion.
+        :param max_reconnect_delay: Délai maximal (s) entre deux reconnexions.
+        """
+        self.client = client
+        self.path = path
+        self.decode = decode
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.frames = collections.deque(maxlen=buffer_size)
+        self.connected = False
+        self._new_frame = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+        self._response = None
+
+    def start(self):
+        """
+        Démarre la lecture du flux.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="mjpeg-stream", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Arrête la lecture du flux.
+        """
+        self._stop.set()
+        if self._response is not None:
+            self._response.close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.connected = False
+
+    def latest(self, timeout=None):
+        """
+        Retourne la dernière image reçue.
+        :param timeout: Attente maximale (s) si aucune image n'est encore disponible.
+        :return: StreamFrame ou None.
+        """
+        with self._new_frame:
+            if not self.frames and timeout:
+                self._new_frame.wait_for(lambda: self.frames, timeout)
+            return self.frames[-1] if self.frames else None
+
+    def frame_after(self, timestamp, timeout=5.0):
+        """
+        Retourne la première image dont la réception a commencé après timestamp.
+        :param timestamp: Instant de référence (time.monotonic), ex. fin d'un mouvement.
+        :param timeout: Attente maximale (s).
+        :return: StreamFrame ou None si aucune image n'arrive à temps.
+        """
+        def find():
+            for frame in self.frames:
+                if frame.timestamp > timestamp:
+                    return frame
+            return None
+
+        with self._new_frame:
+            self._new_frame.wait_for(find, timeout)
+            return find()
+
+    def _run(self):
+        delay = self.reconnect_delay
+        while not self._stop.is_set():
+            try:
+                self._read_stream()
+                delay = self.reconnect_delay
+            except (requests.RequestException, ValueError) as e:
+                if not self._stop.is_set():
+                    print(f"Erreur du flux MJPEG : {e}")
+            self.connected = False
+            if self._stop.wait(delay):
+                break
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def _read_stream(self):
+        response = self.client.get(self.path, stream=True, timeout=(self.client.timeout, 10))
+        self._response = response
+        with response:
+            if response.status_code != 200:
+                raise ValueError(f"statut inattendu {response.status_code}")
+            content_type = response.headers.get("Content-Type", "")
+            if "boundary=" not in content_type:
+                raise ValueError(f"flux non multipart : {content_type}")
+            boundary = content_type.split("boundary=", 1)[1].split(";")[0].strip().strip('"')
+            delimiter = b"--" + boundary.lstrip("-").encode("ascii")
+            self.connected = True
+            self._read_parts(response.raw, delimiter)
+
+    def _read_parts(self, raw, delimiter):
+        buffer = bytearray()
+
+        def fill():
+            # read1 rend la main dès que des octets arrivent (read attendrait 16 Kio)
+            chunk = raw.read1(16384)
+            if not chunk:
+                raise ValueError("flux interrompu")
+            buffer.extend(chunk)
+
+        while not self._stop.is_set():
+            # En-têtes de la partie : jusqu'à la première ligne vide
+            while (end := buffer.find(b"\r\n\r\n")) < 0:
+                fill()
+            started = time.monotonic()
+            headers = {}
+            for line in bytes(buffer[:end]).split(b"\r\n"):
+                name, _, value = line.partition(b":")
+                if value:
+                    headers[name.strip().lower()] = value.strip()
+            del buffer[:end + 4]
+
+            length = headers.get(b"content-length")
+            if length is not None:
+                length = int(length)
+                while len(buffer) < length:
+                    fill()
+            else:
+                # Pas de Content-Length : l'image s'arrête au prochain séparateur
+                while (length := buffer.find(b"\r\n" + delimiter)) < 0:
+                    fill()
+            data = bytes(buffer[:length])
+            del buffer[:length]
+            if not data:
+                continue
+
+            frame = StreamFrame(started, data)
+            if self.decode:
+                frame.image
+            with self._new_frame:
+                self.frames.append(frame)
+                self._new_frame.notify_all()
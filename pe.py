@@ -1,5 +1,6 @@
 from api import *
-import time
+from doe import build_design, check_work_area, pattern_moves, run_experiment
+from metrics import timed
 
 # GLOBAL VAR
 
@@ -26,6 +27,11 @@ sequences = [
     [1,1,1],
 ]
 
+# Facteurs de la PE pour le moteur de plans d'expérience (doe.py) ;
+# le plan complet en ordre standard reproduit la table sequences
+PE_FACTORS = {"feedrate": V_x, "extrusion": e_X, "z": h}
+
+@timed("pe")
 def pe():
     """
     Fonction principale pour lancer le Pattern Experiment (PE).
@@ -39,7 +45,10 @@ def pe():
     send_gcode_command("M92 E4000 T0") # Set E steps per mm
     send_gcode_command("M83")  # Set E to relative mode
 
-    time.sleep(8)
+    # Attendre la fin de la prise d'origine
+    if not wait_for_idle(timeout=120):
+        print("Prise d'origine non terminée : PE interrompue.")
+        return False
 
     for i, s in enumerate(sequences):
         print("====================================")
@@ -49,40 +58,41 @@ def pe():
         print("h (", str(s[2]).replace("0","-1"), ") : ", h[s[2]])
         input("Press Enter to continue...")
         print("====================================")
-        pe_pos(x_start, y_start, h[s[2]])
+        futures = [pe_pos(x_start, y_start, h[s[2]])]
         E = e_X[s[1]] * X
-        pe_col(x_start, y_start, h[s[2]], V_x[s[0]], E, X)
+        futures += pe_col(x_start, y_start, h[s[2]], V_x[s[0]], E, X)
+        # Les commandes partent en arrière-plan : vérifier qu'OctoPrint les a acceptées
+        if not accepted(futures):
+            print("Colonne refusée par OctoPrint : PE interrompue.")
+            return False
 
         x_start += x_pas
         y_start += y_pas
+    return True
 
 def pe_verif():
     """
-    Vérifie si les paramètres de départ sont corrects.
-    :return: True si les paramètres sont valides, False sinon. 
+    Vérifie que tous les mouvements de la PE (positions de départ successives,
+    colonne extrudée, dégagement) restent dans la zone de travail, avec les mêmes
+    bornes que le programme compilé (doe.check_work_area).
+    :return: True si les paramètres sont valides, False sinon.
     """
-    if(x_start < 50):
-        print("Position de départ inférieure à 50mm en X => En dehors de la zone de travail")
-        return False
-    if(y_start <= 10):
-        print("Position de départ inférieure à 10mm en Y => En dehors de la zone de travail")
-        return False
-    if(x_start >= 250 or y_start >= 250):
-        print("Position de départ supérieure à 250mm => En dehors de la zone de travail")
-        return False
-    if(x_start + (X*2) >= 250):
-        print("Dépassement de la zone de travail en X")
-        return False
+    runs = build_design(PE_FACTORS, randomize=False)
+    positions, _ = pattern_moves(runs, (x_start, y_start), (x_pas, y_pas), defaults={"length": X})
+    return check_work_area(positions)
 
+@timed("move", kind="position")
 def pe_pos(x, y, z):
     """
     Déplace la tête d'impression à la position spécifiée.
     :param x: Coordonnée X
     :param y: Coordonnée Y
     :param z: Coordonnée Z
+    :return: Future de la commande (True une fois acceptée par OctoPrint).
     """
-    send_gcode_command("G1 X" + str(x) + " Y" + str(y) + " Z" + str(z) + " F2000")
+    return send_gcode_command("G1 X" + str(x) + " Y" + str(y) + " Z" + str(z) + " F2000", wait=False)
 
+@timed("move", kind="column")
 def pe_col(x, y, z, v, e, X):
     """
     Réalise une colonne de Pattern Experiment (PE). 
@@ -91,7 +101,35 @@ def pe_col(x, y, z, v, e, X):
     :param z: Coordonnée Z de départ
     :param v: Vitesse de déplacement
     :param e: Distance de déplacement en E
+    :return: Liste des Future des commandes (True une fois acceptées par OctoPrint).
+    """
+    return [
+        send_gcode_command("G1 X" + str(x + X) + " Y" + str(y) + " Z" + str(z) + " E" + str(e) + " F" + str(v), wait=False),
+        send_gcode_command("G1 X" + str(x + (X *2)) + " Y" + str(y) + " Z" + str(z) + " F" + str(v), wait=False),
+        send_gcode_command("G1 X" + str(x + (X *2)) + " Y" + str(y) + " Z7" + " F2000", wait=False)
+    ]
+
+def accepted(futures):
+    """
+    Attend le verdict d'OctoPrint sur des commandes confiées à la file asynchrone.
+    :param futures: Liste des Future renvoyées par send_gcode_command(..., wait=False).
+    :return: True si toutes les commandes ont été acceptées, False si l'une a été refusée ou annulée.
+    """
+    return all(not future.cancelled() and future.result() for future in futures)
+
+@timed("pe")
+def pe_program(mode="upload", pause=True, randomize=False, replicates=1, seed=None):
+    """
+    Lance la PE compilée : tout le plan est généré en un seul programme G-code,
+    vérifié contre la zone de travail puis envoyé d'un bloc.
+    :param mode: "upload" (téléversement puis impression), "stream" ou "dry".
+    :param pause: Pause entre deux colonnes (True : M0, durée en s : G4, None : aucune).
+    :param randomize: Tirer l'ordre des essais au hasard.
+    :param replicates: Nombre de répétitions de chaque essai.
+    :param seed: Graine du tirage.
+    :return: Essais exécutés (liste) ou None en cas d'échec.
     """
-    send_gcode_command("G1 X" + str(x + X) + " Y" + str(y) + " Z" + str(z) + " E" + str(e) + " F" + str(v))
-    send_gcode_command("G1 X" + str(x + (X *2)) + " Y" + str(y) + " Z" + str(z) + " F" + str(v))
-    send_gcode_command("G1 X" + str(x + (X *2)) + " Y" + str(y) + " Z7" + " F2000")
+    return run_experiment(
+        PE_FACTORS, replicates=replicates, randomize=randomize, seed=seed, mode=mode,
+        start=(x_start, y_start), step=(x_pas, y_pas), pause=pause, defaults={"length": X}
+    )
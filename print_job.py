@@ -0,0 +1,184 @@
+import os
+import time
+import uuid
+
+import requests
+
+from api import CLIENT
+from settings import GCODE_FOLDER
+
+# États /api/job pendant lesquels un travail est encore en cours
+ACTIVE_JOB_STATES = ("Printing", "Starting", "Pausing", "Paused", "Resuming", "Finishing", "Cancelling")
+
+
+class MultipartFileStream:
+    """
+    Corps multipart/form-data lu à la demande : le fichier n'est jamais chargé
+    entièrement en mémoire, il est transmis par blocs pendant l'envoi.
+    """
+
+    def __init__(self, filepath, fields=None, field_name="file"):
+        """
+        :param filepath: Chemin du fichier à envoyer.
+        :param fields: Champs de formulaire supplémentaires {nom: valeur}.
+        :param field_name: Nom du champ contenant le fichier.
+        """
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+
+        head = b""
+        for name, value in (fields or {}).items():
+            head += (
+                f"--{self.boundary}\r\n"
+                f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+                f"{value}\r\n"
+            ).encode("utf-8")
+        filename = os.path.basename(filepath)
+        head += (
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="{field_name}"; filename="{filename}"\r\n'
+            f"Content-Type: application/octet-stream\r\n\r\n"
+        ).encode("utf-8")
+        tail = f"\r\n--{self.boundary}--\r\n".encode("utf-8")
+
+        self._file = open(filepath, "rb")
+        self._length = len(head) + os.path.getsize(filepath) + len(tail)
+        self._parts = [head, self._file, tail]
+
+    def __len__(self):
+        return self._length
+
+    def read(self, size=-1):
+        """
+        Lit au plus size octets du corps (tout le reste si size < 0).
+        """
+        chunks = []
+        while self._parts and (size < 0 or size > 0):
+            part = self._parts[0]
+            if isinstance(part, bytes):
+                data = part if size < 0 else part[:size]
+                rest = part[len(data):]
+                if rest:
+                    self._parts[0] = rest
+                else:
+                    self._parts.pop(0)
+            else:
+                data = part.read(size)
+                if not data or size < 0 or len(data) < size:
+                    part.close()
+                    self._parts.pop(0)
+            chunks.append(data)
+            if size > 0:
+                size -= len(data)
+        return b"".join(chunks)
+
+    def close(self):
+        self._file.close()
+
+
+def list_gcode_files():
+    """
+    Liste les fichiers G-code disponibles dans le dossier défini.
+    :return: Liste des fichiers G-code (list)
+    """
+    try:
+        return [f for f in os.listdir(GCODE_FOLDER) if f.endswith(".gcode")]
+    except FileNotFoundError:
+        print(f"G-code folder not found: {GCODE_FOLDER}")
+        return []
+
+
+def upload_and_print(filepath, print_after=True, location="local", client=None):
+    """
+    Téléverse un fichier G-code sur OctoPrint et lance l'impression.
+    :param filepath: Chemin vers le fichier G-code (str)
+    :param print_after: Lancer l'impression dès la fin du téléversement (bool)
+    :param location: Emplacement de stockage OctoPrint ("local" ou "sdcard")
+    :param client: OctoPrintClient à utiliser (client global par défaut).
+    :return: True si OctoPrint a accepté le fichier, False sinon.
+    """
+    client = client or CLIENT
+    if not os.path.isfile(filepath):
+        print(f"File not found: {filepath}")
+        return False
+
+    fields = {"select": "true", "print": "true" if print_after else "false"}
+    body = MultipartFileStream(filepath, fields)
+    try:
+        start = time.perf_counter()
+        response = client.post(
+            f"/api/files/{location}", data=body, headers={"Content-Type": body.content_type}
+        )
+        if response.status_code == 201:
+            elapsed = time.perf_counter() - start
+            print(f"Uploaded {filepath} ({len(body)} bytes) in {elapsed:.2f}s.")
+            return True
+        print(f"Failed to upload file. Status code: {response.status_code}, Response: {response.text}")
+        return False
+    except requests.RequestException as e:
+        print(f"Error during upload request: {e}")
+        return False
+    finally:
+        body.close()
+
+
+def get_job(client=None):
+    """
+    Récupère l'état du travail d'impression courant.
+    :param client: OctoPrintClient à utiliser (client global par défaut).
+    :return: Réponse JSON de /api/job (dict) ou None en cas d'erreur.
+    """
+    try:
+        response = (client or CLIENT).get("/api/job")
+        if response.status_code == 200:
+            return response.json()
+        print(f"Failed to fetch job state. Status code: {response.status_code}")
+        return None
+    except requests.RequestException as e:
+        print(f"Error during job request: {e}")
+        return None
+
+
+def wait_for_job(min_interval=1.0, max_interval=30.0, start_timeout=30.0, client=None):
+    """
+    Suit la progression du travail d'impression jusqu'à sa fin.
+    L'intervalle d'interrogation s'adapte au temps restant estimé par OctoPrint
+    et s'allonge tant que la progression ne change pas.
+    :param min_interval: Intervalle minimal entre deux interrogations (s)
+    :param max_interval: Intervalle maximal entre deux interrogations (s)
+    :param start_timeout: Délai maximal (s) pour voir le travail démarrer.
+    :param client: OctoPrintClient à utiliser (client global par défaut).
+    :return: Dernier état connu du travail (dict) ou None.
+    """
+    interval = min_interval
+    last_completion = None
+    started = False
+    deadline = time.monotonic() + start_timeout
+    job = None
+
+    while True:
+        job = get_job(client) or job
+        state = job.get("state", "Unknown") if job else "Unknown"
+        progress = (job or {}).get("progress") or {}
+        completion = progress.get("completion")
+        time_left = progress.get("printTimeLeft")
+
+        if state.startswith(ACTIVE_JOB_STATES):
+            started = True
+        elif started or time.monotonic() > deadline:
+            print(f"Job finished. State: {state}")
+            return job
+
+        if completion is not None and completion != last_completion:
+            print(f"Job {state}: {completion:.1f}% (time left: {time_left if time_left is not None else '?'} s)")
+            last_completion = completion
+            # Progression visible : on resserre l'intervalle
+            interval = max(min_interval, interval / 2)
+        else:
+            interval = min(max_interval, interval * 1.5)
+
+        if time_left:
+            # Pas la peine d'interroger plus de 10 fois sur le temps restant
+            interval = min(interval, max(min_interval, time_left / 10))
+
+        time.sleep(interval)
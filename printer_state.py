@@ -0,0 +1,232 @@
+import json
+import random
+import re
+import threading
+import time
+import uuid
+
+import requests
+
+# Réponse de M114 telle qu'elle apparaît dans le terminal OctoPrint
+POSITION_PATTERN = re.compile(
+    r"X:\s*(-?\d+(?:\.\d+)?)\s+Y:\s*(-?\d+(?:\.\d+)?)\s+Z:\s*(-?\d+(?:\.\d+)?)\s+E:\s*(-?\d+(?:\.\d+)?)"
+)
+
+
+class PrinterStateCache:
+    """
+    Cache de l'état de l'imprimante.
+    Sans écouteur push, l'état est relu via la fonction fetch au plus une fois par TTL.
+    Avec un écouteur push connecté, l'état poussé par OctoPrint fait foi.
+    """
+
+    def __init__(self, fetch, ttl=1.0):
+        """
+        :param fetch: Fonction sans argument retournant l'état (str) via l'API REST.
+        :param ttl: Durée de validité (s) d'un état lu par requête.
+        """
+        self.fetch = fetch
+        self.ttl = ttl
+        self.listener = None
+        self.state = None
+        self.state_time = 0.0
+        self.temperatures = {}
+        self.position = None
+        self.position_time = 0.0
+        self.busy_time = None
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    def get(self):
+        """
+        Retourne l'état courant de l'imprimante en évitant les requêtes inutiles.
+        :return: État de l'imprimante (str)
+        """
+        with self._lock:
+            if self.state is not None:
+                if self.listener is not None and self.listener.connected:
+                    return self.state
+                if time.monotonic() - self.state_time < self.ttl:
+                    return self.state
+
+        state = self.fetch()
+        # Une erreur de lecture ne doit pas être mise en cache
+        if state != "Unknown":
+            self.update(state=state)
+        return state
+
+    def update(self, state=None, temperatures=None, position=None, busy=False):
+        """
+        Met à jour le cache (appelé par l'écouteur push ou après une lecture REST).
+        :param state: Texte de l'état (str)
+        :param temperatures: Dictionnaire des températures {outil: {"actual", "target"}}
+        :param position: Tuple (X, Y, Z, E) issu d'un rapport M114
+        :param busy: Le firmware a signalé qu'il exécute encore des mouvements (busy: processing)
+        """
+        with self._changed:
+            now = time.monotonic()
+            if state is not None:
+                self.state = state
+                self.state_time = now
+            if temperatures:
+                self.temperatures = temperatures
+            if position is not None:
+                self.position = position
+                self.position_time = now
+            if busy:
+                self.busy_time = now
+            self._changed.notify_all()
+
+    def is_busy(self, hold=2.0):
+        """
+        :param hold: Durée (s) de validité d'un message busy (Marlin le répète toutes les 2 s).
+        :return: True si le firmware s'est déclaré occupé récemment.
+        """
+        busy_time = self.busy_time
+        return busy_time is not None and time.monotonic() - busy_time < hold
+
+    def invalidate(self):
+        """
+        Force la relecture de l'état à la prochaine consultation.
+        """
+        with self._lock:
+            self.state_time = 0.0
+            if self.listener is None or not self.listener.connected:
+                self.state = None
+
+    def wait_for_update(self, timeout):
+        """
+        Bloque jusqu'à la prochaine mise à jour du cache ou l'expiration du délai.
+        :param timeout: Délai maximal (s)
+        """
+        with self._changed:
+            self._changed.wait(timeout)
+
+
+class PushListener:
+    """
+    Écoute le socket push d'OctoPrint (/sockjs, transport xhr_streaming) dans un
+    thread d'arrière-plan et tient à jour un PrinterStateCache.
+    """
+
+    def __init__(self, client, cache, reconnect_delay=1.0, max_reconnect_delay=30.0):
+        """
+        :param client: OctoPrintClient utilisé pour les requêtes.
+        :param cache: PrinterStateCache à alimenter.
+        :param reconnect_delay: Délai initial (s) avant reconnexion.
+        :param max_reconnect_delay: Délai maximal (s) entre deux reconnexions.
+        """
+        self.client = client
+        self.cache = cache
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.connected = False
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._response = None
+        self._base = None
+
+    def start(self):
+        """
+        Démarre le thread d'écoute et s'enregistre auprès du cache.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self.cache.listener = self
+        self._thread = threading.Thread(target=self._run, name="octoprint-push", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Arrête le thread d'écoute.
+        """
+        self._stop.set()
+        self.connected = False
+        if self._response is not None:
+            self._response.close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if self.cache.listener is self:
+            self.cache.listener = None
+
+    def _run(self):
+        delay = self.reconnect_delay
+        while not self._stop.is_set():
+            try:
+                self._listen()
+                delay = self.reconnect_delay
+            except (requests.RequestException, ValueError) as e:
+                self.last_error = e
+                if not self._stop.is_set():
+                    print(f"Push socket error: {e}")
+            self.connected = False
+            # L'état poussé n'est plus garanti : retour au mode TTL
+            self.cache.invalidate()
+            if self._stop.wait(delay):
+                break
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def _listen(self):
+        server = f"{random.randint(0, 999):03d}"
+        session = uuid.uuid4().hex
+        self._base = f"/sockjs/{server}/{session}"
+
+        # Les heartbeats SockJS arrivent toutes les 25 s
+        response = self.client.post(
+            self._base + "/xhr_streaming", stream=True, timeout=(self.client.timeout, 60)
+        )
+        self._response = response
+        with response:
+            if response.status_code != 200:
+                raise ValueError(f"unexpected status {response.status_code}")
+            for line in response.iter_lines(chunk_size=None):
+                if self._stop.is_set():
+                    return
+                self._handle_frame(line.decode("utf-8"))
+
+    def _handle_frame(self, frame):
+        if not frame or frame[0] == "h":
+            return
+        if frame[0] == "o":
+            self._authenticate()
+            self.last_error = None
+            self.connected = True
+        elif frame[0] == "a":
+            for message in json.loads(frame[1:]):
+                self._handle_message(json.loads(message))
+        elif frame[0] == "c":
+            raise ValueError(f"socket closed by server: {frame[1:]}")
+
+    def _authenticate(self):
+        # Depuis OctoPrint 1.3.10, le socket n'envoie les données qu'après authentification
+        response = self.client.post("/api/login", json={"passive": True})
+        if response.status_code != 200:
+            raise ValueError(f"login failed with status {response.status_code}")
+        user = response.json()
+        auth = {"auth": f"{user.get('name')}:{user.get('session')}"}
+        self.client.post(self._base + "/xhr_send", data=json.dumps([json.dumps(auth)]))
+
+    def _handle_message(self, message):
+        payload = message.get("current") or message.get("history")
+        if not payload:
+            return
+
+        state = payload.get("state", {}).get("text")
+
+        temperatures = None
+        temps = payload.get("temps") or []
+        if temps:
+            temperatures = {k: v for k, v in temps[-1].items() if k != "time"}
+
+        logs = payload.get("logs") or []
+        busy = any("busy:" in log for log in logs)
+        position = None
+        for log in reversed(logs):
+            match = POSITION_PATTERN.search(log)
+            if match:
+                position = tuple(float(v) for v in match.groups())
+                break
+
+        self.cache.update(state=state, temperatures=temperatures, position=position, busy=busy)
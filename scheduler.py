@@ -0,0 +1,214 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+import doe
+from fleet import PrinterFleet
+from gcode_sim import Kinematics, simulate
+from settings import CONFIG
+
+KINEMATICS = Kinematics.from_config(CONFIG.get("kinematics", {}))
+
+
+def run_durations(runs, positions, params):
+    """
+    Durée estimée de chaque essai, en une seule simulation du programme complet.
+    :return: (durées (s) par essai, instant de début estimé (s) de chaque essai)
+    """
+    commands = doe.experiment_program(runs, positions, params, header=False)
+    result = simulate(commands, KINEMATICS)
+    # Première ligne de chaque essai : son commentaire ;RUN
+    markers = np.array([i + 1 for i, command in enumerate(commands) if command.startswith(";RUN")])
+    owner = np.searchsorted(markers, result.lines, side="right") - 1
+    durations = np.bincount(owner, weights=result.times, minlength=len(runs))
+    return durations, np.concatenate([[0.0], np.cumsum(durations)[:-1]])
+
+
+def printer_capacity(area, start, step, extent, limit):
+    """
+    Nombre d'essais que la zone libre d'une imprimante peut recevoir : couloirs
+    successifs start + i * step dont le motif (extent en X) reste dans la zone.
+    :param area: Zone libre {"x": [min, max], "y": ..., "z": ...}.
+    :param extent: Longueur du motif en X (mm).
+    :param limit: Nombre maximal d'essais à considérer.
+    """
+    index = np.arange(limit)
+    x = start[0] + index * step[0]
+    y = start[1] + index * step[1]
+    # Bornes exclues, comme dans doe.check_work_area
+    inside = (x > area["x"][0]) & (x + extent < area["x"][1]) & (y > area["y"][0]) & (y < area["y"][1])
+    # Couloirs contigus depuis le premier
+    return int(np.argmin(inside)) if not inside.all() else limit
+
+
+def assign_runs(durations, printers):
+    """
+    Répartit les essais entre les imprimantes : le plus long d'abord, sur l'imprimante
+    qui finirait le plus tôt parmi celles qui ont encore de la place (LPT).
+    :param durations: Durée estimée de chaque essai (s).
+    :param printers: Liste de {"name", "capacity", "speed"} ; speed multiplie la vitesse estimée.
+    :return: Dictionnaire {nom: [indices des essais]}, ou None si la place manque.
+    """
+    if sum(printer["capacity"] for printer in printers) < len(durations):
+        return None
+    load = {printer["name"]: 0.0 for printer in printers}
+    assigned = {printer["name"]: [] for printer in printers}
+    for index in np.argsort(-np.asarray(durations), kind="stable"):
+        candidates = [p for p in printers if len(assigned[p["name"]]) < p["capacity"]]
+        best = min(candidates, key=lambda p: load[p["name"]] + durations[index] / p.get("speed", 1.0))
+        load[best["name"]] += durations[index] / best.get("speed", 1.0)
+        assigned[best["name"]].append(int(index))
+    # Chaque imprimante garde l'ordre d'exécution (éventuellement aléatoire) du plan
+    return {name: sorted(indices) for name, indices in assigned.items()}
+
+
+def plan_printers(runs, entries, start=(100, 15), step=(0, 10), travel_z=7, defaults=None):
+    """
+    Calcule la place et la durée des essais, puis les répartit entre les imprimantes.
+    :param entries: Entrées "printers" de la configuration ; "work_area", "start"
+                    et "speed" facultatifs décrivent la zone libre et la vitesse relative.
+    :return: (répartition {nom: [indices]}, durées estimées par essai) ; répartition None si la place manque.
+    """
+    positions, params = doe.pattern_moves(runs, start, step, travel_z, defaults)
+    durations, _ = run_durations(runs, positions, params)
+    extent = float(np.nanmax(2 * params["length"]))
+    printers = [
+        {
+            "name": entry["name"],
+            "speed": entry.get("speed", 1.0),
+            "capacity": printer_capacity(
+                {**doe.WORK_AREA, **entry.get("work_area", {})}, entry.get("start", start), step, extent, len(runs)
+            ),
+        }
+        for entry in entries
+    ]
+    for printer in printers:
+        print(f"{printer['name']} : place pour {printer['capacity']} essais")
+    return assign_runs(durations, printers), durations
+
+
+async def _run_on_printer(printer, entry, runs, start, step, travel_z, pause, defaults, folder):
+    # Programme propre à l'imprimante : essais disposés dans sa zone libre
+    area = {**doe.WORK_AREA, **entry.get("work_area", {})}
+    positions, params = doe.pattern_moves(runs, entry.get("start", start), step, travel_z, defaults)
+    if not doe.check_work_area(positions, area):
+        return {"printer": printer.name, "error": "work area"}
+    _, offsets = run_durations(runs, positions, params)
+    offsets = offsets / entry.get("speed", 1.0)
+    commands = doe.experiment_program(runs, positions, params, pause=pause)
+    path = doe.write_program(commands, os.path.join(folder, f"pe_doe_{printer.name}.gcode"))
+
+    started = time.time()
+    if not await printer.upload(path):
+        return {"printer": printer.name, "error": "upload"}
+    job = await printer.wait_job()
+    finished = time.time()
+    return {
+        "printer": printer.name,
+        "started": started,
+        "finished": finished,
+        "state": (job or {}).get("state", "Unknown"),
+        "positions": positions,
+        "offsets": offsets,
+    }
+
+
+def _timestamp(seconds):
+    return datetime.fromtimestamp(seconds, timezone.utc).isoformat(timespec="seconds")
+
+
+async def run_distributed(fleet, factors, generators=None, replicates=1, randomize=True, seed=None,
+                          start=(100, 15), step=(0, 10), travel_z=7, pause=None, defaults=None,
+                          entries=None, folder="gcode"):
+    """
+    Exécute un plan d'expérience réparti sur un parc d'imprimantes, en parallèle.
+    :param fleet: PrinterFleet.
+    :param factors: Dictionnaire {nom: [niveaux]} (voir doe.run_experiment).
+    :param pause: Pause G4 (s) entre deux essais d'une même imprimante.
+    :param entries: Entrées "printers" de la configuration (config.json par défaut).
+    :param folder: Dossier des programmes générés (un par imprimante).
+    :return: Table des résultats, un dictionnaire par essai trié par numéro d'essai,
+             ou None si les imprimantes n'ont pas la place nécessaire.
+    """
+    entries = [entry for entry in (entries or CONFIG.get("printers", [])) if entry["name"] in fleet.printers]
+    runs = doe.build_design(factors, generators, replicates, randomize, seed)
+    if not runs:
+        print("Aucun essai à réaliser.")
+        return []
+    assignment, durations = plan_printers(runs, entries, start, step, travel_z, defaults)
+    if assignment is None:
+        print(f"Place insuffisante sur le parc pour {len(runs)} essais.")
+        return None
+
+    busy = [entry for entry in entries if assignment[entry["name"]]]
+    serial = float(durations.sum())
+    makespan = max(
+        (sum(durations[i] for i in assignment[entry["name"]]) / entry.get("speed", 1.0) for entry in busy),
+        default=0.0
+    )
+    print(f"{len(runs)} essais sur {len(busy)} imprimantes : {makespan / 60:.1f} min estimées "
+          f"(contre {serial / 60:.1f} min sur une seule)")
+
+    outcomes = await asyncio.gather(
+        *(
+            _run_on_printer(fleet.printers[entry["name"]], entry, [runs[i] for i in assignment[entry["name"]]],
+                            start, step, travel_z, pause, defaults, folder)
+            for entry in busy
+        ),
+        return_exceptions=True
+    )
+
+    # Fusion des résultats par essai
+    table = []
+    for entry, outcome in zip(busy, outcomes):
+        if isinstance(outcome, Exception):
+            outcome = {"printer": entry["name"], "error": repr(outcome)}
+        for k, index in enumerate(assignment[entry["name"]]):
+            row = {**runs[index], "printer": entry["name"], "estimated_s": float(durations[index])}
+            if "error" in outcome:
+                row["error"] = outcome["error"]
+            else:
+                row["x"], row["y"] = (float(v) for v in outcome["positions"][k, 0, :2])
+                row["estimated_start"] = _timestamp(outcome["started"] + outcome["offsets"][k])
+                row["job_started"] = _timestamp(outcome["started"])
+                row["job_finished"] = _timestamp(outcome["finished"])
+                row["job_state"] = outcome["state"]
+            table.append(row)
+    return sorted(table, key=lambda row: row["run"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plan d'expérience réparti sur le parc d'imprimantes")
+    parser.add_argument("factors", help='Facteurs en JSON, ex. \'{"feedrate": [200, 600], "z": [0.1, 1]}\'')
+    parser.add_argument("--generators", help="Générateurs d'un plan fractionnaire (JSON)")
+    parser.add_argument("--replicates", type=int, default=1)
+    parser.add_argument("--no-randomize", action="store_true")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--pause", type=float, default=None, help="Pause G4 entre deux essais (s)")
+    parser.add_argument("--printers", help="Noms des imprimantes, séparés par des virgules (toutes par défaut)")
+    parser.add_argument("--output", default="pe_results.json", help="Table des résultats (JSON)")
+    args = parser.parse_args()
+
+    async def main():
+        fleet = PrinterFleet.from_config()
+        if args.printers:
+            names = args.printers.split(",")
+            fleet.printers = {name: fleet.printers[name] for name in names}
+        try:
+            return await run_distributed(
+                fleet, json.loads(args.factors), json.loads(args.generators) if args.generators else None,
+                args.replicates, not args.no_randomize, args.seed, pause=args.pause
+            )
+        finally:
+            fleet.close()
+
+    table = asyncio.run(main())
+    if table:
+        with open(args.output, "w") as output_file:
+            json.dump(table, output_file, indent=4)
+        print(f"Résultats enregistrés dans {args.output}")
@@ -0,0 +1,32 @@
+import functools
+import json
+import os
+
+# Fichier de configuration, remplaçable par la variable d'environnement OCTOPRINT_CONFIG
+CONFIG_PATH = os.environ.get("OCTOPRINT_CONFIG", "config/config.json")
+
+
+@functools.lru_cache(maxsize=None)
+def load_config(path=CONFIG_PATH):
+    """
+    Lit et analyse le fichier de configuration une seule fois par processus.
+    :param path: Chemin du fichier JSON.
+    :return: Configuration (dict), partagée par tous les modules.
+    """
+    with open(path, "r") as config_file:
+        return json.load(config_file)
+
+
+# Configuration commune : les modules importent CONFIG plutôt que de relire le fichier
+CONFIG = load_config()
+
+GCODE_FOLDER = CONFIG.get("gcode_folder", "gcode")
+
+# Coordonnées réelles des vis (en mm, à calibrer pour ton imprimante), dans l'ordre de
+# order_screws ; remplaçables par screws.real_coords dans la configuration
+SCREWS_REAL_COORDS = [tuple(point) for point in CONFIG.get("screws", {}).get("real_coords", [
+    (238, 38),  # Top left
+    (71.5, 38),   # Top right
+    (238, 210), # Bottom left
+    (71, 208)   # Bottom right
+])]
@@ -0,0 +1,238 @@
+import math
+
+import numpy as np
+
+from gcode_pipeline import format_number
+from metrics import timed
+from settings import CONFIG
+
+TOOLPATH_CONFIG = CONFIG.get("toolpath", {})
+
+
+def signed_area(points):
+    """
+    Aire signée d'un polygone (positive si les sommets tournent dans le sens trigonométrique).
+    """
+    x, y = np.asarray(points, dtype=np.float64).T
+    return 0.5 * float(np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y))
+
+
+def _clean(points, tolerance):
+    # Sommets consécutifs confondus retirés (contour fermé : le dernier rejoint le premier)
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    keep = np.linalg.norm(points - np.roll(points, -1, axis=0), axis=1) > tolerance
+    return points[keep]
+
+
+def offset_polygon(points, distance, miter_limit=4.0):
+    """
+    Décale un polygone fermé vers l'intérieur : chaque côté est déplacé de distance
+    le long de sa normale intérieure et les sommets sont les intersections des côtés
+    décalés. Les côtés qui disparaissent (retournés par le décalage) sont supprimés.
+    :param points: Sommets (x, y) en mm, dans un sens quelconque.
+    :param distance: Décalage vers l'intérieur (mm).
+    :param miter_limit: Déplacement maximal d'un sommet, en multiples de distance (angles aigus).
+    :return: Sommets décalés (numpy.ndarray), ou None si le polygone disparaît.
+    """
+    points = _clean(points, 1e-9)
+    if distance == 0 or len(points) < 3:
+        return points if len(points) >= 3 else None
+    # Normale intérieure : à gauche pour un polygone trigonométrique, à droite sinon
+    side = 1.0 if signed_area(points) > 0 else -1.0
+    while len(points) >= 3:
+        edges = np.roll(points, -1, axis=0) - points
+        lengths = np.linalg.norm(edges, axis=1)
+        normals = side * np.column_stack([-edges[:, 1], edges[:, 0]]) / lengths[:, None]
+        previous = np.roll(normals, 1, axis=0)
+        # Sommet k : intersection des côtés k-1 et k décalés (bissectrice du coin)
+        cosine = np.einsum("ij,ij->i", previous, normals)
+        scale = np.minimum(1.0 / np.maximum(1.0 + cosine, 1e-12), miter_limit ** 2 / 2)
+        offset = points + distance * (previous + normals) * scale[:, None]
+        # Côté retourné : sa direction décalée s'oppose à l'originale
+        reversed_edges = np.einsum("ij,ij->i", np.roll(offset, -1, axis=0) - offset, edges) <= 0
+        if not reversed_edges.any():
+            return offset
+        # Le côté disparaît : on retire son sommet d'arrivée et on recommence
+        points = np.delete(points, (np.flatnonzero(reversed_edges) + 1) % len(points), axis=0)
+    return None
+
+
+def _circle(points):
+    # Cercle passant exactement par les extrémités et au plus près (moindres carrés) des
+    # autres sommets : centre cherché sur la médiatrice de la corde. (centre, rayon) ou None.
+    start, end = points[0], points[-1]
+    chord = end - start
+    length = np.linalg.norm(chord)
+    if length == 0:
+        return None
+    middle = (start + end) / 2
+    normal = np.array([-chord[1], chord[0]]) / length
+    # |p - c|² - |start - c|² est linéaire en t pour c = middle + t * normal
+    delta = points[1:-1] - start
+    a = 2 * delta @ normal
+    b = np.einsum("ij,ij->i", points[1:-1], points[1:-1]) - start @ start - 2 * delta @ middle
+    if a @ a < 1e-12:
+        return None
+    center = middle + (a @ b) / (a @ a) * normal
+    return center, float(np.linalg.norm(start - center))
+
+
+def _line_fits(points, i, j, tolerance):
+    # Sommets intermédiaires à moins de tolerance de la corde, dans l'ordre de parcours
+    start, end = points[i], points[j]
+    chord = end - start
+    length = np.linalg.norm(chord)
+    if length == 0:
+        return False
+    inner = points[i + 1:j] - start
+    along = inner @ chord / length
+    across = np.abs(inner[:, 0] * chord[1] - inner[:, 1] * chord[0]) / length
+    return bool(np.all(across <= tolerance) and np.all(np.diff(np.concatenate([[0], along, [length]])) >= 0))
+
+
+def _arc_fits(points, i, j, tolerance, max_radius, max_step):
+    # Arc de cercle passant par les extrémités, suivi par toute la polyligne
+    circle = _circle(points[i:j + 1])
+    if circle is None:
+        return None
+    center, radius = circle
+    if radius > max_radius:
+        return None
+    run = points[i:j + 1]
+    # Sommets et milieux des segments (flèche) à moins de tolerance du cercle
+    checks = np.concatenate([run, (run[:-1] + run[1:]) / 2])
+    if np.any(np.abs(np.linalg.norm(checks - center, axis=1) - radius) > tolerance):
+        return None
+    # Rotation de même sens et faible à chaque segment, moins d'un tour au total
+    vectors = run - center
+    steps = np.arctan2(vectors[:-1, 0] * vectors[1:, 1] - vectors[:-1, 1] * vectors[1:, 0],
+                       np.einsum("ij,ij->i", vectors[:-1], vectors[1:]))
+    if not (np.all(steps > 0) or np.all(steps < 0)):
+        return None
+    if np.max(np.abs(steps)) > max_step or abs(steps.sum()) >= 2 * math.pi - 1e-6:
+        return None
+    return center, radius, float(steps.sum())
+
+
+def _extend(fits, first, last):
+    # Plus grand j de [first, last] tel que fits(j) : progression exponentielle puis dichotomie
+    if first > last or not fits(first):
+        return None
+    good, step = first, 1
+    while True:
+        j = first + step
+        if j > last or not fits(j):
+            break
+        good, step = j, step * 2
+    low, high = good + 1, min(j, last + 1)
+    while low < high:
+        middle = (low + high) // 2
+        if fits(middle):
+            good, low = middle, middle + 1
+        else:
+            high = middle
+    return good
+
+
+def fit_path(points, tolerance=0.25, closed=True, min_arc_points=4, max_radius=500.0, max_step=math.radians(30)):
+    """
+    Découpe une polyligne en arcs de cercle et en segments droits : à partir de chaque
+    sommet, le plus long arc tenant dans la tolérance est retenu s'il couvre au moins
+    min_arc_points sommets, sinon le plus long segment (fusion des côtés quasi alignés).
+    :param points: Sommets (x, y) en mm.
+    :param tolerance: Écart maximal (mm) entre le tracé émis et la polyligne.
+    :param closed: La polyligne revient à son premier sommet.
+    :param min_arc_points: Nombre minimal de sommets couverts par un arc.
+    :param max_radius: Rayon au-delà duquel un arc est traité comme une droite (mm).
+    :param max_step: Angle maximal (rad) couvert par un segment d'arc : les coins francs
+                     ne sont pas pris pour des arcs.
+    :return: (point de départ, liste de ("line", fin) ou ("arc", fin, centre, sens trigonométrique))
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if closed:
+        points = np.vstack([points, points[:1]])
+    last = len(points) - 1
+    segments, i = [], 0
+    while i < last:
+        arc_end = _extend(
+            lambda j: _arc_fits(points, i, j, tolerance, max_radius, max_step) is not None,
+            i + min_arc_points - 1, last
+        )
+        if arc_end is not None:
+            center, _, sweep = _arc_fits(points, i, arc_end, tolerance, max_radius, max_step)
+            segments.append(("arc", points[arc_end], center, sweep > 0))
+            i = arc_end
+            continue
+        line_end = _extend(lambda j: _line_fits(points, i, j, tolerance), i + 1, last)
+        segments.append(("line", points[line_end]))
+        i = line_end
+    return points[0], segments
+
+
+def _segment_length(start, segment):
+    if segment[0] == "line":
+        return float(np.linalg.norm(segment[1] - start))
+    _, end, center, counterclockwise = segment
+    a, b = start - center, end - center
+    sweep = math.atan2(a[0] * b[1] - a[1] * b[0], a @ b)
+    if counterclockwise and sweep <= 0:
+        sweep += 2 * math.pi
+    elif not counterclockwise and sweep >= 0:
+        sweep -= 2 * math.pi
+    return abs(sweep) * float(np.linalg.norm(a))
+
+
+@timed("contour_toolpath")
+def contour_toolpath(points, offset=None, z=None, feedrate=None, extrusion=None, tolerance=None,
+                     travel_z=10, travel_feedrate=1000, prime=0.5):
+    """
+    Tracé G-code d'un contour quelconque : décalage intérieur, arcs G2/G3 et segments
+    fusionnés, extrusion proportionnelle à la longueur parcourue (mode relatif M83).
+    :param points: Contour de la pièce en mm (polygone ou contour brut), fermé implicitement.
+    :param offset: Décalage vers l'intérieur (mm) ; par défaut toolpath.offset.
+    :param z: Hauteur de tracé (mm).
+    :param feedrate: Vitesse de tracé (mm/min).
+    :param extrusion: Filament extrudé par mm de tracé (mm/mm).
+    :param tolerance: Écart maximal (mm) toléré pour les arcs et les fusions, de l'ordre
+                      d'un pixel de la caméra (bruit du contour détecté).
+    :param travel_z: Hauteur des déplacements à vide (mm).
+    :param travel_feedrate: Vitesse des déplacements à vide (mm/min).
+    :param prime: Amorçage (mm de filament) avant le tracé.
+    :return: Liste de commandes G-code, la première étant le déplacement au-dessus du départ ;
+             None si la pièce est trop petite pour le décalage.
+    """
+    offset = TOOLPATH_CONFIG.get("offset", 2.0) if offset is None else offset
+    z = TOOLPATH_CONFIG.get("z", 6) if z is None else z
+    feedrate = TOOLPATH_CONFIG.get("feedrate", 400) if feedrate is None else feedrate
+    extrusion = TOOLPATH_CONFIG.get("extrusion", 0.02) if extrusion is None else extrusion
+    tolerance = TOOLPATH_CONFIG.get("tolerance", 0.25) if tolerance is None else tolerance
+
+    contour = offset_polygon(points, offset)
+    if contour is None:
+        print(f"Contour trop petit pour un décalage de {offset} mm.")
+        return None
+    start, segments = fit_path(contour, tolerance)
+
+    def number(value):
+        return format_number(round(float(value), 3))
+
+    commands = [f"G1 X{number(start[0])} Y{number(start[1])} Z{travel_z} F{travel_feedrate}",
+                f"G1 Z{number(z)}"]
+    if prime:
+        commands.append(f"G1 E{number(prime)}")
+    position = start
+    for segment in segments:
+        end = segment[1]
+        e = number(_segment_length(position, segment) * extrusion)
+        if segment[0] == "line":
+            commands.append(f"G1 X{number(end[0])} Y{number(end[1])} E{e}")
+        else:
+            _, _, center, counterclockwise = segment
+            i, j = center - position
+            commands.append(f"{'G3' if counterclockwise else 'G2'} X{number(end[0])} Y{number(end[1])} "
+                            f"I{number(i)} J{number(j)} E{e}")
+        position = end
+    # Vitesse donnée une fois, sur le premier mouvement du tracé : le mot F est modal
+    commands[len(commands) - len(segments)] += f" F{feedrate}"
+    commands.append(f"G1 Z{travel_z} F{travel_feedrate}")
+    return commands
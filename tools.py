@@ -1,12 +1,9 @@
 import cv2
-import json
 import numpy as np
 
+from metrics import timed
 
-# Charger la configuration
-with open("config/config.json", "r") as config_file:
-    CONFIG = json.load(config_file)
-
+@timed("compute_transformation")
 def compute_pixel_to_mm_transformation(image_coords, real_coords):
     """
     Calcule la transformation linéaire pour convertir les pixels en mm.
@@ -22,6 +19,7 @@ def compute_pixel_to_mm_transformation(image_coords, real_coords):
     transform_matrix = cv2.getPerspectiveTransform(image_matrix, real_matrix)
     return transform_matrix
 
+@timed("transform_coordinates")
 def transform_coordinates(coords, transform_matrix):
     """
     Transforme des coordonnées à l'aide de la matrice de transformation.
@@ -35,6 +33,7 @@ def transform_coordinates(coords, transform_matrix):
     transformed_coords /= transformed_coords[2]  # Normaliser
     return transformed_coords[:2].T
 
+@timed("order_screws")
 def order_screws(screws_image_coords):
     """
     Ordonne les vis détectées dans l'image en suivant l'ordre :
@@ -74,13 +73,107 @@ def adjust_corners_for_interior(corners, offset=2.5):
 
     return adjusted_corners
 
-def list_gcode_files():
+@timed("transform_parts")
+def transform_parts(parts, transform_matrix):
+    """
+    Transforme les coins de toutes les pièces en une seule opération matricielle.
+    :param parts: Liste des pièces, chacune étant une liste de coins en pixels.
+    :param transform_matrix: Matrice de transformation (pixels -> mm).
+    :return: Liste des pièces, chacune étant une liste de coins (x, y) en mm.
+    """
+    if not parts:
+        return []
+    lengths = [len(part) for part in parts]
+    transformed = transform_coordinates(np.concatenate([np.asarray(part) for part in parts]), transform_matrix)
+    return [[tuple(map(float, point)) for point in part]
+            for part in np.split(transformed, np.cumsum(lengths)[:-1])]
+
+def part_toolpath(corners, extrusion_percentage=75, z=6, feedrate=400):
+    """
+    Commandes G-code du tracé d'une pièce : chaque côté est extrudé sur une partie
+    de sa longueur, le dernier côté (retour au premier coin) n'est pas tracé.
+    :param corners: Coins ajustés de la pièce en mm, le tracé part du premier.
+    :param extrusion_percentage: Pourcentage du trajet où l'extrusion est activée.
+    :param z: Hauteur de tracé (mm).
+    :param feedrate: Vitesse de tracé (mm/min).
+    :return: Liste de commandes G-code.
+    """
+    commands = []
+    for idx in range(len(corners) - 1):
+        E_value = 2 if idx % 2 == 0 else 1
+        x_start, y_start = corners[idx]
+        x_end, y_end = corners[idx + 1]
+
+        # Point où l'extrusion doit s'arrêter
+        x_extrude = x_start + (x_end - x_start) * (extrusion_percentage / 100)
+        y_extrude = y_start + (y_end - y_start) * (extrusion_percentage / 100)
+
+        commands.append(f"G1 X{x_extrude:.2f} Y{y_extrude:.2f} Z{z} F{feedrate} E{E_value}")
+        # Compléter le déplacement sans extrusion
+        commands.append(f"G1 X{x_end:.2f} Y{y_end:.2f} Z{z} F{feedrate}")
+    return commands
+
+@timed("plan_part_order")
+def plan_part_order(parts, origin=(250, 250)):
+    """
+    Ordre de passage des pièces minimisant les déplacements à vide : plus proche
+    voisin puis amélioration 2-opt. Chaque pièce est tracée de son premier à son
+    dernier coin, le coût d'un trajet va donc de la fin d'une pièce au début de la suivante.
+    :param parts: Liste des pièces (coins en mm).
+    :param origin: Position de la buse avant la première pièce.
+    :return: (ordre des indices des pièces, longueur des déplacements en mm)
+    """
+    if not parts:
+        return [], 0.0
+    starts = np.array([part[0] for part in parts], dtype=np.float64)
+    ends = np.array([part[-1] for part in parts], dtype=np.float64)
+    # distances[i, j] : fin de la pièce i -> début de la pièce j
+    distances = np.linalg.norm(ends[:, None, :] - starts[None, :, :], axis=2)
+    from_origin = np.linalg.norm(starts - np.asarray(origin, dtype=np.float64), axis=1)
+
+    def travel(order):
+        return from_origin[order[0]] + distances[order[:-1], order[1:]].sum()
+
+    # Plus proche voisin
+    remaining = np.ones(len(parts), dtype=bool)
+    order = [int(np.argmin(from_origin))]
+    remaining[order[0]] = False
+    while remaining.any():
+        costs = np.where(remaining, distances[order[-1]], np.inf)
+        order.append(int(np.argmin(costs)))
+        remaining[order[-1]] = False
+    order = np.array(order)
+
+    # 2-opt : inverser un segment de l'ordre de passage tant que cela raccourcit le trajet
+    best = travel(order)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(len(order) - 1):
+            for j in range(i + 1, len(order)):
+                candidate = np.concatenate([order[:i], order[i:j + 1][::-1], order[j + 1:]])
+                cost = travel(candidate)
+                if cost < best - 1e-9:
+                    order, best, improved = candidate, cost, True
+    return order.tolist(), float(best)
+
+def tray_toolpath(parts, order, travel_z=10, travel_feedrate=1000, prime=0.5, **part_options):
     """
-    Liste les fichiers G-code disponibles dans le dossier défini.
-    :return: Liste des fichiers G-code (list)
+    Job unique traçant toutes les pièces dans l'ordre donné.
+    :param parts: Liste des pièces (coins ajustés en mm).
+    :param order: Ordre de passage (voir plan_part_order).
+    :param travel_z: Hauteur des déplacements entre pièces (mm).
+    :param travel_feedrate: Vitesse des déplacements entre pièces (mm/min).
+    :param prime: Amorce d'extrusion avant chaque pièce (mm de filament).
+    :param part_options: Options transmises à part_toolpath.
+    :return: Liste de commandes G-code.
     """
-    try:
-        return [f for f in os.listdir(GCODE_FOLDER) if f.endswith(".gcode")]
-    except FileNotFoundError:
-        print(f"G-code folder not found: {GCODE_FOLDER}")
-        return []
\ No newline at end of file
+    commands = []
+    for index in order:
+        x_first, y_first = parts[index][0]
+        commands.append(f"G1 Z{travel_z} F{travel_feedrate}")
+        commands.append(f"G1 X{x_first:.2f} Y{y_first:.2f} Z{travel_z} F{travel_feedrate}")
+        commands.append(f"G1 E{prime}")  # Amorce
+        commands.extend(part_toolpath(parts[index], **part_options))
+    commands.append(f"G1 Z{travel_z} F{travel_feedrate}")
+    return commands
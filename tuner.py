@@ -0,0 +1,276 @@
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import random
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+import camera_analysis
+from frame import Frame
+from settings import CONFIG_PATH
+from vision_cache import VISION_CACHE
+
+
+# Espaces de recherche (les valeurs actuelles de camera_analysis y figurent)
+SCREW_SPACE = {
+    "ksize": [3, 5, 7],
+    "dp": [1.0, 1.2, 1.5],
+    "minDist": [100, 200],
+    "param1": [40, 60, 90, 120],
+    "param2": [10, 13, 16, 20, 25],
+    "minRadius": [3, 4, 6],
+    "maxRadius": [8, 10, 14],
+}
+CORNER_SPACE = {
+    "ksize": [3, 5, 7],
+    "threshold1": [30, 50, 80, 110],
+    "threshold2": [100, 150, 200, 250],
+    "epsilon": [0.01, 0.02, 0.03, 0.05],
+}
+
+# Images partagées par les processus de calcul (remplies par _attach)
+_SHARED = None
+_IMAGES = {}
+
+
+# Chaque jeu de paramètres doit être réellement évalué : pas de résultats mémorisés
+def _detect_screws(frame, params, mode):
+    with VISION_CACHE.scope(enabled=False):
+        return camera_analysis.detect_screws(frame, None, mode=mode, params=params)
+
+
+def _detect_corners(frame, params, mode):
+    with VISION_CACHE.scope(enabled=False):
+        return camera_analysis.analyze_image(frame, None, params=params)
+
+
+# Détecteur réglable : (section de la configuration, espace de recherche, fonction de détection)
+DETECTORS = {
+    "screws": ("screws", SCREW_SPACE, camera_analysis.SCREW_PARAMS, _detect_screws),
+    "corners": ("corners", CORNER_SPACE, camera_analysis.CORNER_PARAMS, _detect_corners),
+}
+
+
+def load_dataset(labels_path):
+    """
+    Charge les images annotées décrites par un fichier de vérité terrain :
+    {"image.jpg": {"screws": [[x, y], ...], "corners": [[x, y], ...]}, ...}
+    Les chemins des images sont relatifs au dossier du fichier.
+    :param labels_path: Chemin du fichier JSON des annotations.
+    :return: (images {nom: image BGR}, annotations {nom: {détecteur: points}})
+    """
+    with open(labels_path, "r") as labels_file:
+        labels = json.load(labels_file)
+    folder = os.path.dirname(labels_path)
+    images = {}
+    for name in labels:
+        image = cv2.imread(os.path.join(folder, name))
+        if image is None:
+            print(f"Image illisible ignorée : {name}")
+            continue
+        images[name] = image
+    return images, {name: labels[name] for name in images}
+
+
+def share_images(images):
+    """
+    Copie les images décodées dans un bloc de mémoire partagée.
+    :return: (bloc SharedMemory, disposition [(nom, décalage, forme)])
+    """
+    layout, offset = [], 0
+    for name, image in images.items():
+        layout.append((name, offset, image.shape))
+        offset += image.nbytes
+    block = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for (name, start, shape), image in zip(layout, images.values()):
+        np.ndarray(shape, dtype=np.uint8, buffer=block.buf, offset=start)[...] = image
+    return block, layout
+
+
+def _attach(block_name, layout):
+    # Initialisation d'un processus de calcul : vues en lecture seule sur le bloc partagé
+    global _SHARED
+    cv2.setNumThreads(1)
+    _SHARED = shared_memory.SharedMemory(name=block_name)
+    for name, start, shape in layout:
+        image = np.ndarray(shape, dtype=np.uint8, buffer=_SHARED.buf, offset=start)
+        image.flags.writeable = False
+        _IMAGES[name] = image
+
+
+def match_points(detected, truth, tolerance):
+    """
+    Appariement glouton des points détectés aux points attendus (plus proches d'abord).
+    :return: Liste des distances (pixels) des paires appariées.
+    """
+    if not detected or not truth:
+        return []
+    detected = np.asarray(detected, dtype=np.float64)
+    truth = np.asarray(truth, dtype=np.float64)
+    distances = np.linalg.norm(detected[:, None, :] - truth[None, :, :], axis=2)
+    matched, used_detected, used_truth = [], set(), set()
+    for flat in np.argsort(distances, axis=None):
+        i, j = np.unravel_index(flat, distances.shape)
+        if distances[i, j] > tolerance:
+            break
+        if i in used_detected or j in used_truth:
+            continue
+        used_detected.add(i)
+        used_truth.add(j)
+        matched.append(float(distances[i, j]))
+    return matched
+
+
+def evaluate(task):
+    """
+    Évalue un jeu de paramètres sur toutes les images partagées.
+    :param task: (détecteur, paramètres, annotations, tolérance, répétitions, mode)
+    :return: Résultat {"params", "accuracy", "error", "latency"}
+    """
+    detector, params, labels, tolerance, repeat, mode = task
+    detect = DETECTORS[detector][3]
+    scores, errors, latencies = [], [], []
+    for name, image in _IMAGES.items():
+        truth = labels[name].get(detector, [])
+        for _ in range(repeat):
+            # Frame neuf : chaque appel paie tous ses plans dérivés
+            frame = Frame(image)
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                detected = detect(frame, params, mode) or []
+                latencies.append(time.perf_counter() - start)
+        matched = match_points(detected, truth, tolerance)
+        # F1 : pénalise autant les vis manquées que les fausses détections
+        total = len(detected) + len(truth)
+        scores.append(2 * len(matched) / total if total else 1.0)
+        errors.extend(matched)
+    return {
+        "params": params,
+        "accuracy": statistics.fmean(scores),
+        "error": statistics.fmean(errors) if errors else None,
+        "latency": statistics.median(latencies) * 1000,
+    }
+
+
+def candidates(space, baseline, search="random", samples=200, seed=0):
+    """
+    Jeux de paramètres à évaluer, réglages actuels compris.
+    :param space: Espace de recherche {paramètre: [valeurs]}.
+    :param baseline: Réglages actuels.
+    :param search: "grid" (toutes les combinaisons) ou "random" (tirage sans remise).
+    :param samples: Nombre de tirages en recherche aléatoire.
+    :return: Liste de dictionnaires de paramètres.
+    """
+    names = list(space)
+    grid = itertools.product(*(space[name] for name in names))
+    if search == "random":
+        rng = random.Random(seed)
+        combinations = list(grid)
+        grid = rng.sample(combinations, min(samples, len(combinations)))
+    params = [dict(zip(names, values)) for values in grid]
+    base = {name: baseline[name] for name in names}
+    if base not in params:
+        params.insert(0, base)
+    return params
+
+
+def pareto_front(results):
+    """
+    Réglages non dominés : aucun autre n'est à la fois plus précis et plus rapide.
+    :return: Résultats du front, du plus rapide au plus précis.
+    """
+    front, best = [], -1.0
+    for result in sorted(results, key=lambda r: (r["latency"], -r["accuracy"])):
+        if result["accuracy"] > best:
+            front.append(result)
+            best = result["accuracy"]
+    return front
+
+
+def tune(detector, images, labels, search="random", samples=200, tolerance=6.0, repeat=3,
+         workers=None, mode="full", seed=0):
+    """
+    Recherche des paramètres d'un détecteur sur un pool de processus.
+    :param detector: "screws" ou "corners".
+    :param images: Images décodées {nom: image}.
+    :param labels: Annotations {nom: {détecteur: points}}.
+    :param tolerance: Distance maximale (pixels) pour qu'une détection compte.
+    :param repeat: Appels par image pour mesurer la latence.
+    :param workers: Nombre de processus (par défaut : nombre de cœurs).
+    :param mode: Mode de détection des vis ("full" ou "fast").
+    :return: (tous les résultats, front de Pareto)
+    """
+    _, space, baseline, _ = DETECTORS[detector]
+    params = candidates(space, baseline, search, samples, seed)
+    tasks = [(detector, p, labels, tolerance, repeat, mode) for p in params]
+    print(f"{detector} : {len(tasks)} réglages sur {len(images)} images")
+
+    block, layout = share_images(images)
+    try:
+        with ProcessPoolExecutor(workers, initializer=_attach, initargs=(block.name, layout)) as pool:
+            chunksize = max(1, len(tasks) // (4 * (workers or os.cpu_count() or 1)))
+            results = list(pool.map(evaluate, tasks, chunksize=chunksize))
+    finally:
+        block.close()
+        block.unlink()
+    return results, pareto_front(results)
+
+
+def write_params(section, params, config_path=CONFIG_PATH):
+    """
+    Enregistre les paramètres retenus dans la section du fichier de configuration.
+    """
+    with open(config_path, "r") as config_file:
+        config = json.load(config_file)
+    config.setdefault(section, {})["params"] = params
+    with open(config_path, "w") as config_file:
+        json.dump(config, config_file, indent=4)
+        config_file.write("\n")
+    print(f"Paramètres {section} enregistrés dans {config_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Réglage automatique des détecteurs de vis et de coins")
+    parser.add_argument("labels", help="Fichier JSON des annotations (vérité terrain)")
+    parser.add_argument("--detector", choices=["screws", "corners", "all"], default="all")
+    parser.add_argument("--search", choices=["grid", "random"], default="random")
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--tolerance", type=float, default=6.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--mode", choices=["full", "fast"], default="full")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--report", help="Fichier JSON où écrire tous les résultats")
+    parser.add_argument("--write", action="store_true", help="Enregistrer les meilleurs réglages")
+    parser.add_argument("--config", default=CONFIG_PATH)
+    args = parser.parse_args()
+
+    images, labels = load_dataset(args.labels)
+    detectors = ["screws", "corners"] if args.detector == "all" else [args.detector]
+    report = {}
+    for detector in detectors:
+        results, front = tune(
+            detector, images, labels, args.search, args.samples, args.tolerance,
+            args.repeat, args.workers, args.mode, args.seed
+        )
+        print(f"Front de Pareto ({detector}) :")
+        for result in front:
+            error = "-" if result["error"] is None else f"{result['error']:.2f} px"
+            print(f"  précision {result['accuracy']:.3f}  erreur {error}  "
+                  f"latence {result['latency']:.2f} ms  {result['params']}")
+        report[detector] = {"results": results, "pareto": front}
+        if args.write:
+            # Le plus précis du front (donc le plus rapide à précision égale)
+            write_params(DETECTORS[detector][0], front[-1]["params"], args.config)
+
+    if args.report:
+        with open(args.report, "w") as report_file:
+            json.dump(report, report_file, indent=4)
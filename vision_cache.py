@@ -0,0 +1,197 @@
+import collections
+import contextlib
+import copy
+import functools
+import inspect
+import threading
+import time
+
+import numpy as np
+
+from frame import Frame
+from metrics import METRICS
+from settings import CONFIG
+
+VISION_CACHE_CONFIG = CONFIG.get("vision_cache", {})
+
+
+class VisionCache:
+    """
+    Résultats de détection (vis, coins, homographie...) mémorisés par image.
+    Une image est identifiée par une empreinte perceptuelle, sa miniature en
+    niveaux de gris : deux images dont les miniatures ne diffèrent nulle part de
+    plus de threshold niveaux de gris sont considérées comme la même scène (bruit
+    du capteur, compression JPEG). La comparaison pixel à pixel, plutôt qu'un hachage
+    binaire global, détecte aussi une pièce déplacée d'un pixel ou posée sur un fond clair.
+    Les entrées sont évincées par ancienneté d'utilisation (LRU) au-delà de
+    max_entries, et ignorées au-delà de max_age secondes.
+    Le cache peut être activé ou coupé le temps d'un bloc (scope), pour le seul
+    thread appelant, sans modifier le réglage global enabled.
+    """
+
+    def __init__(self, max_entries=32, max_age=300.0, threshold=6, hash_size=64, enabled=True):
+        """
+        :param max_entries: Nombre maximal de résultats mémorisés.
+        :param max_age: Durée de validité (s) d'un résultat.
+        :param threshold: Écart maximal (niveaux de gris) entre deux miniatures d'une même scène.
+        :param hash_size: Largeur (pixels) de la miniature ; la hauteur suit le format de l'image.
+        :param enabled: Cache actif (sinon chaque appel refait l'analyse).
+        """
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.threshold = threshold
+        self.hash_size = hash_size
+        self.enabled = enabled
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def is_enabled(self):
+        """
+        :return: True si le cache est actif pour le thread courant (scope en cours, sinon enabled).
+        """
+        enabled = getattr(self._local, "enabled", None)
+        return self.enabled if enabled is None else enabled
+
+    @contextlib.contextmanager
+    def scope(self, enabled):
+        """
+        Active ou coupe le cache pour les analyses du thread courant, le temps du bloc with.
+        :param enabled: Cache actif dans le bloc.
+        """
+        previous = getattr(self._local, "enabled", None)
+        self._local.enabled = enabled
+        try:
+            yield self
+        finally:
+            self._local.enabled = previous
+
+    def signature(self, frame):
+        """
+        Empreinte de l'image : miniature en niveaux de gris (moyenne par zone,
+        insensible au bruit de chaque pixel).
+        :param frame: Frame de l'image.
+        :return: Miniature (numpy.ndarray, int16 pour les différences).
+        """
+        return frame.thumbnail(self.hash_size).astype(np.int16)
+
+    def get(self, kind, key, signature):
+        """
+        Cherche le résultat d'une analyse sur une image assez proche.
+        :param kind: Type de résultat ("screws", "corners"...).
+        :param key: Paramètres de l'analyse (hachable).
+        :param signature: Empreinte de l'image (voir signature).
+        :return: (trouvé, résultat)
+        """
+        now = time.monotonic()
+        with self._lock:
+            best, best_distance = None, self.threshold + 1
+            for entry_key, (entry_signature, result, created) in list(self._entries.items()):
+                if now - created > self.max_age:
+                    del self._entries[entry_key]
+                    continue
+                if entry_key[:2] != (kind, key) or entry_signature.shape != signature.shape:
+                    continue
+                distance = int(np.abs(entry_signature - signature).max())
+                if distance < best_distance:
+                    best, best_distance = entry_key, distance
+            if best is None:
+                return False, None
+            self._entries.move_to_end(best)
+            return True, copy.deepcopy(self._entries[best][1])
+
+    def put(self, kind, key, signature, result):
+        """
+        Mémorise le résultat d'une analyse, en évinçant le moins récemment utilisé si nécessaire.
+        """
+        with self._lock:
+            entry_key = (kind, key, signature.tobytes())
+            self._entries[entry_key] = (signature, copy.deepcopy(result), time.monotonic())
+            self._entries.move_to_end(entry_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _read_annotation(path):
+    # Image annotée que l'analyse vient d'écrire, mémorisée telle quelle (octets du fichier)
+    try:
+        with open(path, "rb") as file:
+            return file.read()
+    except OSError:
+        return None
+
+
+def _write_annotation(path, data):
+    try:
+        with open(path, "wb") as file:
+            file.write(data)
+        print(f"Image annotée mémorisée sauvegardée sous : {path}")
+        return True
+    except OSError as e:
+        print(f"Erreur lors de l'écriture de l'image annotée {path} : {e}")
+        return False
+
+
+def memoize(kind, bypass=None, annotated="annotated_path"):
+    """
+    Décorateur : le résultat d'une analyse dont le premier argument est l'image
+    (chemin, image décodée ou Frame) est repris du cache si la scène n'a pas changé
+    et si les autres arguments sont identiques. Les échecs (None) ne sont pas mémorisés.
+    L'image annotée écrite par l'analyse est mémorisée avec le résultat : un appel
+    repris du cache l'écrit au chemin demandé. Si le résultat a été mémorisé sans
+    image annotée, l'analyse est refaite une fois pour la produire.
+    :param kind: Type de résultat, pour les métriques et les messages.
+    :param bypass: Nom d'un argument qui, vrai, force l'analyse (ex. "force").
+    :param annotated: Nom de l'argument chemin de l'image annotée, exclu de la clé
+                      (None : l'analyse n'écrit pas d'image à reproduire).
+    """
+    def decorator(function):
+        parameters = inspect.signature(function)
+
+        @functools.wraps(function)
+        def wrapper(image, *args, **kwargs):
+            if not VISION_CACHE.is_enabled():
+                return function(image, *args, **kwargs)
+            frame = Frame.load(image)
+            if frame is None:
+                return function(image, *args, **kwargs)
+            bound = parameters.bind(frame, *args, **kwargs)
+            bound.apply_defaults()
+            arguments = [(name, value) for name, value in list(bound.arguments.items())[1:] if name != annotated]
+            if bypass is not None and bound.arguments.get(bypass):
+                return function(frame, *args, **kwargs)
+            annotated_path = bound.arguments.get(annotated) if annotated is not None else None
+
+            # Les arguments (listes, dictionnaires) sont comparés par leur représentation
+            key = (frame.shape, repr(arguments))
+            signature = VISION_CACHE.signature(frame)
+            found, entry = VISION_CACHE.get(kind, key, signature)
+            METRICS.count("vision_cache_lookups_total", kind=kind, result="hit" if found else "miss")
+            if found:
+                result, annotation = entry
+                if not annotated_path or (annotation is not None and _write_annotation(annotated_path, annotation)):
+                    print(f"Image inchangée : résultat mémorisé réutilisé ({kind}).")
+                    return result
+            result = function(frame, *args, **kwargs)
+            if result is not None:
+                annotation = _read_annotation(annotated_path) if annotated_path else None
+                VISION_CACHE.put(kind, key, signature, (result, annotation))
+            return result
+        return wrapper
+    return decorator
+
+
+VISION_CACHE = VisionCache(
+    max_entries=VISION_CACHE_CONFIG.get("max_entries", 32),
+    max_age=VISION_CACHE_CONFIG.get("max_age", 300.0),
+    threshold=VISION_CACHE_CONFIG.get("threshold", 6),
+    hash_size=VISION_CACHE_CONFIG.get("hash_size", 64),
+    enabled=VISION_CACHE_CONFIG.get("enabled", True)
+)